@@ -0,0 +1,92 @@
+"""
+Throughput benchmark of the chunking stage against langchain's RecursiveCharacterTextSplitter on identical inputs.
+
+Pages come from a PDF when `--pdf` is given, otherwise from synthetic book-like text.
+
+Usage:
+    python benchmarks/bench_chunking.py [--pdf book.pdf] [--pages 2000] [--workers 4] [--tokenizer bert-base-uncased]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "data_ingestion"))
+
+from chunking import CharacterSplitter, TokenSplitter, chunk_pages, iter_pdf_pages
+
+
+def synthetic_pages(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = (
+        "the model learns a mapping from inputs to outputs by minimizing the expected loss over the training "
+        "distribution while regularization controls the variance of the estimator"
+    ).split()
+    pages = []
+    for number in range(1, n + 1):
+        paragraphs = []
+        for _ in range(rng.randint(3, 7)):
+            sentences = [
+                " ".join(rng.choice(words) for _ in range(rng.randint(8, 25))).capitalize() + "."
+                for _ in range(rng.randint(3, 8))
+            ]
+            paragraphs.append(" ".join(sentences))
+        pages.append(("synthetic.pdf", number, "\n\n".join(paragraphs)))
+    return pages
+
+
+def measure(label: str, fn, total_chars: int):
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34}{count:>8}{elapsed:>10.3f}{total_chars / elapsed / 1e6:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to chunk instead of synthetic pages")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--tokenizer", help="tokenizer.json path or Hub model name, enables the token splitter rows")
+    args = parser.parse_args()
+
+    pages = list(iter_pdf_pages(args.pdf)) if args.pdf else synthetic_pages(args.pages)
+    total_chars = sum(len(text) for _, _, text in pages)
+    print(f"{len(pages)} pages, {total_chars / 1e6:.1f}M characters")
+    print(f"{'splitter':<34}{'chunks':>8}{'seconds':>10}{'MChars/s':>12}")
+
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        lc = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+        measure(
+            "langchain recursive (1 proc)", lambda: sum(len(lc.split_text(text)) for _, _, text in pages), total_chars
+        )
+    except ImportError:
+        print("langchain-text-splitters is not installed, skipping the baseline")
+
+    splitter = CharacterSplitter(chunk_size=1000, chunk_overlap=150)
+    measure("character (1 proc)", lambda: sum(1 for _ in chunk_pages(pages, splitter, workers=1)), total_chars)
+    measure(
+        f"character ({args.workers} procs)",
+        lambda: sum(1 for _ in chunk_pages(pages, splitter, workers=args.workers, pages_per_task=32)),
+        total_chars,
+    )
+
+    if args.tokenizer:
+        token_splitter = TokenSplitter(args.tokenizer, chunk_tokens=256, overlap_tokens=32)
+        measure("token (1 proc)", lambda: sum(1 for _ in chunk_pages(pages, token_splitter, workers=1)), total_chars)
+        measure(
+            f"token ({args.workers} procs)",
+            lambda: sum(1 for _ in chunk_pages(pages, token_splitter, workers=args.workers, pages_per_task=32)),
+            total_chars,
+        )
+
+
+if __name__ == "__main__":
+    main()
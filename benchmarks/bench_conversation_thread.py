@@ -0,0 +1,106 @@
+"""
+Benchmark of conversation-thread building on synthetic threads with hundreds of follow-ups.
+
+Compares the previous `+=` concatenation with `ConversationThreadBuilder`, unbounded and with a token budget, and
+checks that the unbounded output is identical.
+
+Usage:
+    python benchmarks/bench_conversation_thread.py [--followups 500] [--max-tokens 4000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from thread_builder import ConversationThreadBuilder
+
+
+def legacy_create_conversation_thread(data: dict, include_followup: bool = True):
+    thread = {"uid": data["uid"], "conversation": ""}
+
+    conversation = f"""Title: {data["title"]}\n"""
+    conversation += f"Content: {data['content_text']}\n\n"
+
+    conversation += "Initial Answers:\n"
+    if data["answers"]["i_answer"]["text"]:
+        conversation += f"Instructor Answer: {data['answers']['i_answer']['text']}\n"
+    if data["answers"]["s_answer"]["text"]:
+        conversation += f"Student Answer: {data['answers']['s_answer']['text']}\n"
+    conversation += "\n"
+
+    if include_followup:
+        conversation += "Follow-ups and Feedback:\n"
+        for followup in data["answers"]["followup"]:
+            conversation += f"Follow-up: {followup['subject']}\n"
+            if followup["feedback"]:
+                conversation += "Feedback:\n"
+                for feedback in followup["feedback"]:
+                    conversation += f"- {feedback}\n"
+
+    thread["conversation"] = conversation
+    return thread
+
+
+def synthetic_post(followups: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    words = "gradient loss matrix kernel epoch bias variance regression tensor sample batch prior".split()
+
+    def sentence(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    return {
+        "post_id": 1,
+        "uid": "luz5g88xy27xx",
+        "title": "HMM parameter estimation",
+        "content_text": sentence(200),
+        "image_urls": [],
+        "answers": {
+            "i_answer": {"text": sentence(150), "img": []},
+            "s_answer": {"text": sentence(120), "img": []},
+            "followup": [
+                {"subject": sentence(60), "feedback": [sentence(30) for _ in range(rng.randint(0, 4))], "fid": str(i)}
+                for i in range(followups)
+            ],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--followups", type=int, default=500)
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    post = synthetic_post(args.followups)
+    unbounded = ConversationThreadBuilder()
+    bounded = ConversationThreadBuilder(max_tokens=args.max_tokens)
+
+    legacy = legacy_create_conversation_thread(post)["conversation"]
+    full = unbounded.build(post)
+    assert full["conversation"] == legacy, "Unbounded builder output differs from the legacy format"
+    limited = bounded.build(post)
+
+    cases = [
+        ("legacy +=", lambda: legacy_create_conversation_thread(post), legacy),
+        ("builder", lambda: unbounded.build(post), full["conversation"]),
+        (f"builder max_tokens={args.max_tokens}", lambda: bounded.build(post), limited["conversation"]),
+    ]
+
+    print(f"thread with {args.followups} follow-ups")
+    print(f"{'variant':<32}{'ms/thread':>12}{'chars':>12}{'~tokens':>10}")
+    for label, fn, text in cases:
+        elapsed = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+        print(f"{label:<32}{elapsed * 1000:>12.3f}{len(text):>12}{len(text) // 4:>10}")
+    print(f"follow-ups kept with budget: {sum(s['kind'] == 'followup' for s in limited['segments'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Exam-week load simulation of the whole bot: posts land on a synthetic Piazza course, `BotScheduler` polls the feed
+and fetches them through `PiazzaBot`, `AnswerOrchestrator` answers them with fake embedding, vector search, LLM and
+YouTube backends, and `AnswerPublisher` posts the answers back.
+
+Questions arrive over one simulated hour, a share of them in a spike around the peak minute, as before a deadline.
+Feed and post payloads are shaped like the `network.filter_feed` and `content.get` responses (see `fake_piazza`).
+Every backend call sleeps for a lognormal latency given by its median and p95. The hour is compressed into
+--hour-seconds of wall time and every latency is scaled accordingly; results are reported in simulated seconds.
+
+Reports, per worker count: answered posts, throughput, queue time (arrival to the start of answering, including the
+polling delay), answer latency (arrival to answer submitted), largest backlog and memory high-water mark.
+
+Usage:
+    python benchmarks/bench_exam_week.py [--questions 500] [--workers 2,4,8] [--hour-seconds 30] [--llm 4:12]
+"""
+
+import argparse
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from answer_post import AnswerPublisher
+from bench_lecture_warmup import TOPICS
+from fake_piazza import FakePiazza, make_child, make_post
+from orchestrator import AnswerOrchestrator
+from scheduler import BotScheduler
+from settings import configure_logging
+
+NETWORK_ID = "exam-week"
+ERRORS = [
+    "ValueError: shapes (3,4) and (3,) not aligned",
+    "IndexError: index 10 is out of bounds for axis 0 with size 10",
+    "RuntimeWarning: divide by zero encountered in log",
+    "AssertionError: probabilities do not sum to 1",
+]
+
+
+class Latency:
+    """
+    Lognormal latency in simulated seconds, given as "median:p95".
+    """
+
+    def __init__(self, spec: str):
+        median, p95 = (float(value) for value in spec.split(":"))
+        self.median = median
+        self.sigma = math.log(p95 / median) / 1.645 if p95 > median else 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        return self.median * math.exp(self.sigma * rng.gauss(0, 1))
+
+
+class SimClock:
+    def __init__(self, hour_seconds: float):
+        self.scale = hour_seconds / 3600
+        self.start = time.monotonic()
+
+    def now(self) -> float:
+        return (time.monotonic() - self.start) / self.scale
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds * self.scale)
+
+
+class FakeBackends:
+    """
+    Embedding, vector search, LLM and YouTube calls sleeping for their latency distribution.
+    """
+
+    def __init__(self, latencies: dict, clock: SimClock, seed: int = 0):
+        self.latencies = latencies
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {name: 0 for name in latencies}
+
+    def _wait(self, name: str):
+        with self.lock:
+            self.calls[name] += 1
+            seconds = self.latencies[name].sample(self.rng)
+        self.clock.sleep(seconds)
+
+    def retrieve(self, post: dict) -> list:
+        self._wait("embed")
+        self._wait("search")
+        return [{"text": f"Notes on {post['title']}", "score": 0.8}]
+
+    def generate(self, question: str, documents: list) -> str:
+        self._wait("llm")
+        return f"<p>{question.splitlines()[0]}: see {documents[0]['text']}.</p>"
+
+    # RelatedYouTubeVideos interface used by the orchestrator
+    def get_top_videos(self, query: str, max_results: int = 1) -> list:
+        self._wait("youtube")
+        return [{"videoId": "lecture001", "title": query, "link": ""}]
+
+    def generate_iframe(self, video: dict, start: int = None) -> str:
+        return f'<iframe src="https://www.youtube.com/embed/{video["videoId"]}"></iframe>'
+
+
+class SlowPiazza(FakePiazza):
+    """
+    `FakePiazza` whose RPC calls sleep for a latency distribution.
+    """
+
+    def __init__(self, latency: Latency, clock: SimClock, seed: int = 0):
+        super().__init__()
+        self.rpc_latency = latency
+        self.clock = clock
+        self.rng = random.Random(seed)
+
+    def record_call(self, method: str):
+        super().record_call(method)
+        with self.lock:
+            seconds = self.rpc_latency.sample(self.rng)
+        self.clock.sleep(seconds)
+
+
+def arrival_times(questions: int, spike_share: float, peak_minute: float, rng: random.Random) -> list:
+    """
+    Arrival times in simulated seconds over one hour: uniform background traffic plus a spike of `spike_share` of
+    the questions normally distributed around `peak_minute`.
+    """
+    times = []
+    for _ in range(questions):
+        if rng.random() < spike_share:
+            t = rng.gauss(peak_minute * 60, 240)
+        else:
+            t = rng.uniform(0, 3600)
+        times.append(min(3599.0, max(0.0, t)))
+    return sorted(times)
+
+
+def synthetic_post(nr: int, rng: random.Random) -> dict:
+    topic = rng.choice(TOPICS)
+    paragraphs = [f"<p>I am stuck on the {topic} part of the homework. How should I approach it?</p>"]
+    if rng.random() < 0.4:
+        paragraphs.append(f"<pre>Traceback (most recent call last):\n  ...\n{rng.choice(ERRORS)}</pre>")
+    if rng.random() < 0.3:
+        paragraphs.append("<p>" + " ".join(rng.choices(topic.split() + ["matrix", "loop", "test"], k=60)) + "</p>")
+    children = []
+    if rng.random() < 0.2:
+        children.append(make_child("followup", subject=f"Same problem with {topic} here"))
+    if rng.random() < 0.1:
+        children.append(make_child("s_answer", content="<p>I think you need to normalize first.</p>"))
+    return make_post(nr, f"Question about {topic} ({nr})", "".join(paragraphs), children=children)
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def simulate(workers: int, args, latencies: dict) -> dict:
+    rng = random.Random(args.seed)
+    clock = SimClock(args.hour_seconds)
+    piazza = SlowPiazza(latencies["piazza"], clock, seed=args.seed)
+    backends = FakeBackends(latencies, clock, seed=args.seed)
+    arrivals = arrival_times(args.questions, args.spike_share, args.peak_minute, rng)
+    posts = [synthetic_post(nr, rng) for nr in range(1, len(arrivals) + 1)]
+
+    orchestrator = AnswerOrchestrator(
+        retrieve=backends.retrieve,
+        generate=backends.generate,
+        youtube=backends,
+        retrieve_timeout=30 * clock.scale,
+        generate_timeout=120 * clock.scale,
+        video_timeout=30 * clock.scale,
+        max_workers=workers * 2,
+    )
+    publisher = AnswerPublisher(
+        piazza._rpc_api,
+        ledger_path=":memory:",
+        max_concurrency=2,
+        min_interval=0.5 * clock.scale,
+        answer_type="i_answer",
+        # Simulated time: space calls on the scaled clock rather than the real Piazza quota
+        quota=False,
+    )
+    arrived, started, submitted = {}, {}, {}
+
+    def handler(bot, post, conversation):
+        started[post["post_id"]] = clock.now()
+        result = orchestrator.answer_sync(post)
+        content = (result["answer"] or "") + (result["html"] or "")
+        publisher.submit(post["uid"], content, nid=bot.network_id)
+        submitted[post["post_id"]] = clock.now()
+
+    scheduler = BotScheduler(handler=handler, piazza=piazza, max_workers=workers)
+    piazza.network(NETWORK_ID)
+    scheduler.add_course(NETWORK_ID, poll_interval=args.poll_interval * clock.scale, max_queue_size=args.questions)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    clock.start = time.monotonic()
+    runner = threading.Thread(target=scheduler.run, daemon=True)
+    runner.start()
+
+    backlog = []
+    pending = list(zip(arrivals, posts))
+    deadline = 3600 + args.drain
+    while clock.now() < deadline and len(submitted) < len(posts):
+        now = clock.now()
+        while pending and pending[0][0] <= now:
+            t, post = pending.pop(0)
+            piazza.add_post(NETWORK_ID, post)
+            arrived[post["nr"]] = t
+        backlog.append(len(arrived) - len(submitted))
+        clock.sleep(1.0 if pending else 5.0)
+
+    scheduler.stop()
+    runner.join()
+    metrics = scheduler.metrics()[NETWORK_ID]
+    publisher.flush()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    orchestrator.close()
+    publisher.close()
+
+    queue_times = [started[nr] - arrived[nr] for nr in started]
+    latencies_ = [submitted[nr] - arrived[nr] for nr in submitted]
+    last = max(submitted.values()) if submitted else float("nan")
+    return {
+        "workers": workers,
+        "answered": len(submitted),
+        "arrived": len(arrived),
+        "per_hour": len(submitted) / max(last, 1.0) * 3600,
+        "queue_p50": statistics.median(queue_times) if queue_times else float("nan"),
+        "queue_p95": percentile(queue_times, 0.95),
+        "latency_p50": statistics.median(latencies_) if latencies_ else float("nan"),
+        "latency_p95": percentile(latencies_, 0.95),
+        "latency_max": max(latencies_, default=float("nan")),
+        "backlog_max": max(backlog, default=0),
+        "peak_mib": peak / 2**20,
+        "failed": metrics["failed"],
+        "published": publisher.stats()["published"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500, help="Questions arriving in the hour")
+    parser.add_argument("--spike-share", type=float, default=0.4, help="Share of the questions in the spike")
+    parser.add_argument("--peak-minute", type=float, default=40)
+    parser.add_argument("--workers", default="2,4,8", help="Comma-separated scheduler worker counts to compare")
+    parser.add_argument("--hour-seconds", type=float, default=30, help="Wall seconds of one simulated hour")
+    parser.add_argument("--poll-interval", type=float, default=30, help="Simulated seconds between feed polls")
+    parser.add_argument("--drain", type=float, default=1800, help="Simulated seconds allowed after the hour")
+    parser.add_argument("--piazza", default="0.3:1.0", help="Piazza RPC latency, median:p95 simulated seconds")
+    parser.add_argument("--embed", default="0.2:0.6")
+    parser.add_argument("--search", default="0.15:0.5")
+    parser.add_argument("--llm", default="4:12")
+    parser.add_argument("--youtube", default="0.5:2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    latencies = {name: Latency(getattr(args, name)) for name in ("piazza", "embed", "search", "llm", "youtube")}
+    print(
+        f"{args.questions} questions in one hour ({args.spike_share:.0%} around minute {args.peak_minute:g}), "
+        f"feed polled every {args.poll_interval:g}s, LLM {args.llm}s; times in simulated seconds"
+    )
+    print(
+        f"{'workers':>7}{'answered':>10}{'per hour':>10}{'queue p50':>11}{'queue p95':>11}{'lat p50':>9}"
+        f"{'lat p95':>9}{'lat max':>9}{'backlog':>9}{'peak MiB':>10}{'failed':>8}"
+    )
+    for workers in (int(w) for w in args.workers.split(",")):
+        r = simulate(workers, args, latencies)
+        print(
+            f"{r['workers']:>7}{r['answered']:>6}/{r['arrived']:<3}{r['per_hour']:>10.0f}{r['queue_p50']:>11.1f}"
+            f"{r['queue_p95']:>11.1f}{r['latency_p50']:>9.1f}{r['latency_p95']:>9.1f}{r['latency_max']:>9.1f}"
+            f"{r['backlog_max']:>9}{r['peak_mib']:>10.1f}{r['failed']:>8}"
+        )
+    print(f"process max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
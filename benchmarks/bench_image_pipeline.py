@@ -0,0 +1,75 @@
+"""
+Latency benchmark of the post image pipeline against a local HTTP stub and a fake vision summarizer.
+
+Compares sequential downloads (the naive loop), concurrent cold downloads and warm cache hits.
+
+Usage:
+    python benchmarks/bench_image_pipeline.py [--images 24] [--latency 0.08] [--summary-latency 0.3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from http_stub import LocalHTTPStub, make_png
+from images import ImageCache, PostImagePipeline, downsize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.08, help="Seconds per HTTP request")
+    parser.add_argument("--summary-latency", type=float, default=0.3, help="Seconds per vision model call")
+    args = parser.parse_args()
+
+    routes = {f"/redirect/s3/img{i}.png": make_png(seed=i) for i in range(args.images)}
+
+    def fake_summarizer(img_base64, prompt):
+        time.sleep(args.summary_latency)
+        return f"screenshot of {len(img_base64)} base64 chars"
+
+    with LocalHTTPStub(routes, latency=args.latency) as stub, tempfile.TemporaryDirectory() as cache_dir:
+        urls = [stub.url(path) for path in routes]
+
+        start = time.perf_counter()
+        for url in urls:
+            downsize(requests.get(url).content)
+            fake_summarizer("x", "")
+        sequential = time.perf_counter() - start
+
+        pipeline = PostImagePipeline(
+            summarizer=fake_summarizer, cache=ImageCache(cache_dir), download_workers=8, summarize_workers=4
+        )
+        start = time.perf_counter()
+        pipeline.summarize_urls(urls)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pipeline.summarize_urls(urls)
+        warm = time.perf_counter() - start
+        pipeline.close()
+
+        original = sum(len(body) for body in routes.values())
+        cached = sum(
+            os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir) if name.endswith(".jpg")
+        )
+
+    print(f"{args.images} images, {args.latency * 1000:.0f} ms HTTP, {args.summary_latency * 1000:.0f} ms summary")
+    print(f"{'mode':<28}{'seconds':>10}")
+    print(f"{'sequential, no cache':<28}{sequential:>10.3f}")
+    print(f"{'concurrent, cold cache':<28}{cold:>10.3f}")
+    print(f"{'concurrent, warm cache':<28}{warm:>10.3f}")
+    print(f"image bytes downloaded {original:,}, cached after downsizing {cached:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Import-time budget check for every entry point, based on `python -X importtime`.
+
+Each module is imported in a fresh interpreter from its own directory (the way the scripts are run) and the cumulative
+import time reported for it is compared with its budget. Exits non-zero when any module is over budget.
+
+Usage:
+    python benchmarks/bench_import_time.py [--repeat 3]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+DATA_INGESTION_DIR = os.path.join(REPO_DIR, "data_ingestion")
+AGENT_DIR = os.path.join(REPO_DIR, "virtual_ta", "agent")
+
+# (working directory, module, budget in milliseconds)
+ENTRY_POINTS = [
+    (DATA_INGESTION_DIR, "settings", 300),
+    (DATA_INGESTION_DIR, "db", 400),
+    (DATA_INGESTION_DIR, "embedding", 300),
+    (DATA_INGESTION_DIR, "utils", 300),
+    (DATA_INGESTION_DIR, "vector_search", 400),
+    (DATA_INGESTION_DIR, "vector_store", 400),
+    (AGENT_DIR, "settings", 300),
+    (AGENT_DIR, "piazza", 600),
+    (AGENT_DIR, "youtube", 600),
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)$")
+
+
+def measure(cwd: str, module: str) -> float:
+    """
+    Returns the cumulative import time of `module` in milliseconds.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.splitlines()[-1]}")
+
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # The top-level module is the only entry without indentation
+        if match and match.group(4) == module and not match.group(3):
+            return int(match.group(2)) / 1000
+    raise RuntimeError(f"No importtime entry found for {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per module, the best one is reported")
+    args = parser.parse_args()
+
+    over_budget = False
+    print(f"{'entry point':<36}{'best (ms)':>12}{'budget (ms)':>14}")
+    for cwd, module, budget in ENTRY_POINTS:
+        label = f"{os.path.relpath(cwd, REPO_DIR)}/{module}.py"
+        try:
+            best = min(measure(cwd, module) for _ in range(args.repeat))
+        except RuntimeError as e:
+            print(f"{label:<36}{'error':>12}{budget:>14}  {e}")
+            over_budget = True
+            continue
+
+        status = "" if best <= budget else "  OVER BUDGET"
+        over_budget |= best > budget
+        print(f"{label:<36}{best:>12.1f}{budget:>14}{status}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Warm vs cold latency of matching a question to a lecture segment, against a fake YouTube API and a fake embedding
+endpoint with fixed per-call latencies.
+
+    cold    `LectureWarmup.match_live`: YouTube search, transcript download and embedding of every caption window
+    warm    `LectureWarmup.match`: one question embedding and a search of the local index built by `warm`
+
+Usage:
+    python benchmarks/bench_lecture_warmup.py [--videos 12] [--minutes 75] [--questions 10]
+"""
+
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from lecture_index import LectureIndex, LectureWarmup
+from settings import configure_logging
+from transcript import Transcript
+from youtube import RelatedYouTubeVideos
+
+DIM = 256
+TOPICS = [
+    "hidden markov models",
+    "viterbi decoding",
+    "emission matrix",
+    "transition matrix",
+    "forward algorithm",
+    "baum welch",
+    "naive bayes",
+    "logistic regression",
+    "gradient descent",
+    "regularization",
+]
+
+
+def hashed_embedding(text: str) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    for token in text.lower().split():
+        seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), "little")
+        vector += np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class FakeEmbedding:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return hashed_embedding(text)
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [hashed_embedding(text) for text in texts]
+
+
+class FakeYouTube(RelatedYouTubeVideos):
+    def __init__(self, videos: int, minutes: int, search_latency: float, transcript_latency: float):
+        super().__init__(api_key="fake", quota=False)
+        self.credentials = None
+        self.minutes = minutes
+        self.search_latency = search_latency
+        self.transcript_latency = transcript_latency
+        self.videos = [
+            {"videoId": f"lecture{i:03d}", "title": f"Lecture {i}: {TOPICS[i % len(TOPICS)]}", "link": ""}
+            for i in range(videos)
+        ]
+
+    def get_playlist_videos(self, playlist_id, max_results=200):
+        time.sleep(self.search_latency)
+        return self.videos[:max_results]
+
+    def get_top_videos(self, query, max_results=3):
+        time.sleep(self.search_latency)
+        ranked = sorted(self.videos, key=lambda v: -float(hashed_embedding(v["title"]) @ hashed_embedding(query)))
+        return ranked[:max_results]
+
+    def download_and_parse_captions(self, video_id):
+        time.sleep(self.transcript_latency)
+        topic = TOPICS[int(video_id[-3:]) % len(TOPICS)]
+        captions, t = [], 0.0
+        while t < self.minutes * 60:
+            subject = topic if int(t) % 300 < 60 else TOPICS[int(t) % len(TOPICS)]
+            captions.append({"start": t, "duration": 4.2, "text": f"so now we look at {subject} step {int(t) % 17}"})
+            t += 4.2
+        return Transcript.from_captions(captions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=12)
+    parser.add_argument("--minutes", type=int, default=75, help="Length of each lecture")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--search-latency", type=float, default=0.25, help="Seconds per YouTube search")
+    parser.add_argument("--transcript-latency", type=float, default=0.4, help="Seconds per transcript download")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding request")
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    youtube = FakeYouTube(args.videos, args.minutes, args.search_latency, args.transcript_latency)
+    embedding = FakeEmbedding(args.embed_latency)
+    questions = [f"How does {TOPICS[i % len(TOPICS)]} work in the lecture example?" for i in range(args.questions)]
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        # Live search embeds every window of the result, so give it a large batch to keep it from looking worse than
+        # the request pattern allows
+        cold_warmup = LectureWarmup(youtube, index=LectureIndex(index_dir), embedding=embedding, embed_batch_size=250)
+        cold = []
+        for question in questions:
+            start = time.perf_counter()
+            cold_warmup.match_live(question, max_results=1)
+            cold.append(time.perf_counter() - start)
+
+        warmup = LectureWarmup(youtube, index=LectureIndex(index_dir), embedding=embedding, embed_batch_size=250)
+        stats = warmup.warm(playlist_id="course")
+        warm = []
+        for question in questions:
+            start = time.perf_counter()
+            html = warmup.answer_html(question)
+            warm.append(time.perf_counter() - start)
+
+        reloaded = time.perf_counter()
+        index = LectureIndex(index_dir)
+        reloaded = time.perf_counter() - reloaded
+
+    print(f"{args.videos} lectures of {args.minutes} min, {len(index)} caption windows indexed")
+    print(f"warmup: {stats}")
+    print(f"index reload from disk: {reloaded * 1000:.1f} ms")
+    print(f"{'mode':<8}{'p50 ms':>10}{'max ms':>10}")
+    print(f"{'cold':<8}{statistics.median(cold) * 1000:>10.1f}{max(cold) * 1000:>10.1f}")
+    print(f"{'warm':<8}{statistics.median(warm) * 1000:>10.1f}{max(warm) * 1000:>10.1f}")
+    print(f"last answer: {len(html)} bytes of embed HTML")
+
+
+if __name__ == "__main__":
+    main()
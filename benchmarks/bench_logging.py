@@ -0,0 +1,69 @@
+"""
+Benchmark of log-heavy loops under the different logging modes.
+
+Usage:
+    python benchmarks/bench_logging.py [--iterations 50000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from settings import configure_logging, get_logger
+
+
+def run_loop(logger: logging.Logger, iterations: int, level: int) -> float:
+    payload = {"post_id": 42, "title": "HMM transition matrix", "followups": list(range(10))}
+    start = time.perf_counter()
+    for i in range(iterations):
+        logger.log(level, "processed post %s: %s", i, payload)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50_000)
+    args = parser.parse_args()
+
+    # Send all handler output to the null device so we time the logging machinery, not the terminal
+    devnull = open(os.devnull, "w")
+    sys.stderr = devnull
+
+    modes = [
+        ("json", False, logging.INFO, "json  sync  enabled"),
+        ("json", True, logging.INFO, "json  queue enabled"),
+        ("json", False, logging.DEBUG, "json  sync  disabled"),
+        ("rich", False, logging.DEBUG, "rich  sync  disabled"),
+    ]
+
+    results = []
+    for fmt, use_queue, call_level, label in modes:
+        configure_logging(level="INFO", fmt=fmt, use_queue=use_queue, force=True)
+        logger = get_logger("bench")
+        elapsed = run_loop(logger, args.iterations, call_level)
+        results.append((label, elapsed))
+
+    # Many loggers requested for the same name must not multiply the handlers
+    for _ in range(100):
+        get_logger("PiazzaBot")
+    handler_count = len(logging.getLogger().handlers) + len(logging.getLogger("PiazzaBot").handlers)
+
+    configure_logging(level="INFO", fmt="json", use_queue=False, force=True)
+    sys.stderr = sys.__stderr__
+    devnull.close()
+
+    print(f"{'mode':<24}{'total (s)':>12}{'per call (us)':>16}")
+    for label, elapsed in results:
+        print(f"{label:<24}{elapsed:>12.4f}{elapsed / args.iterations * 1e6:>16.3f}")
+    print(f"handlers after 100 get_logger calls: {handler_count}")
+
+
+if __name__ == "__main__":
+    main()
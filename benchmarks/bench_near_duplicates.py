@@ -0,0 +1,118 @@
+"""
+Candidate lookup latency of the MinHash LSH `NearDuplicateIndex` as the number of indexed posts grows, against a
+brute-force scan comparing the query signature with every indexed one.
+
+Synthetic posts are random sentences over a course-like vocabulary. Each query is a planted near-duplicate of an
+indexed post (a few words replaced, a sentence appended). "found" is how often the original post is returned, "recall"
+the same relative to the scan, i.e. the matches lost to banding rather than to the similarity threshold.
+
+Usage:
+    python benchmarks/bench_near_duplicates.py [--posts 100000] [--queries 500] [--edits 3]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from dedup import NearDuplicateIndex
+
+WORDS = (
+    "the a my why how does do is in of for with when to gradient descent loss function matrix vector kernel "
+    "regression classifier neural network layer weights bias training test validation error accuracy overfitting "
+    "homework assignment question part lecture slide notes exam midterm final deadline submission autograder python "
+    "numpy array shape dimension broadcast import module pytorch tensor batch epoch learning rate optimizer adam "
+    "convergence derivative chain rule backpropagation activation relu sigmoid softmax probability distribution "
+    "bayes prior posterior likelihood sample variance mean expectation"
+).split()
+
+
+def random_post(rng: random.Random, i: int) -> dict:
+    title = " ".join(rng.choices(WORDS, k=rng.randint(4, 9)))
+    content = " ".join(rng.choices(WORDS, k=rng.randint(30, 80)))
+    return {"post_id": i, "uid": f"p{i}", "title": title, "content_text": content, "answers": {}}
+
+
+def near_duplicate(rng: random.Random, post: dict, edits: int) -> dict:
+    words = post["content_text"].split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    words += rng.choices(WORDS, k=4)
+    return {"post_id": -1, "uid": "query", "title": post["title"], "content_text": " ".join(words), "answers": {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--edits", type=int, default=3, help="Words replaced in each near-duplicate")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = NearDuplicateIndex(threshold=args.threshold)
+    checkpoints = sorted({n for n in (1_000, 10_000, args.posts) if n <= args.posts})
+
+    print(
+        f"{'posts':>8}{'build s':>9}{'lsh p50 us':>12}{'lsh p95 us':>12}"
+        f"{'scan p50 us':>13}{'matches':>9}{'found':>8}{'recall':>8}"
+    )
+    posts, build = [], 0.0
+    for n in checkpoints:
+        start = time.perf_counter()
+        for i in range(len(posts), n):
+            post = random_post(rng, i)
+            posts.append(post)
+            index.add_post(post)
+        build += time.perf_counter() - start
+
+        keys = list(index.signatures)
+        matrix = np.stack([index.signatures[key] for key in keys])
+        targets = rng.sample(posts, min(args.queries, n))
+        queries = [near_duplicate(rng, post, args.edits) for post in targets]
+        signatures = [index.hasher.signature(f"{q['title']}\n{q['content_text']}") for q in queries]
+
+        lsh, scan, candidates, found, scan_found = [], [], [], 0, 0
+        for target, signature in zip(targets, signatures):
+            start = time.perf_counter()
+            matches = index.query(signature=signature)
+            lsh.append(time.perf_counter() - start)
+            found += any(key == target["uid"] for key, _ in matches)
+            candidates.append(len(matches))
+
+            start = time.perf_counter()
+            similarity = (matrix == signature).mean(axis=1)
+            scan_matches = [keys[i] for i in np.flatnonzero(similarity >= args.threshold)]
+            scan.append(time.perf_counter() - start)
+            scan_found += target["uid"] in scan_matches
+
+        lsh_us = sorted(t * 1e6 for t in lsh)
+        print(
+            f"{n:>8}{build:>9.1f}{statistics.median(lsh_us):>12.0f}{lsh_us[int(0.95 * len(lsh_us))]:>12.0f}"
+            f"{statistics.median(scan) * 1e6:>13.0f}{statistics.mean(candidates):>9.2f}"
+            f"{found / len(targets):>8.1%}{found / max(1, scan_found):>8.1%}"
+        )
+
+    batch = [near_duplicate(rng, post, args.edits) for post in rng.sample(posts, 20)]
+    for i, post in enumerate(batch):
+        post["uid"] = f"batch{i}"
+    batch += [dict(post, uid=f"{post['uid']}-again") for post in batch[:10]]
+    start = time.perf_counter()
+    clusters = index.cluster(batch)
+    print(
+        f"batch of {len(batch)} posts (10 reposted twice) -> {len(clusters)} clusters in "
+        f"{(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
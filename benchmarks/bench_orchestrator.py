@@ -0,0 +1,99 @@
+"""
+End-to-end reply latency of `AnswerOrchestrator` against running the same steps one after the other, with fake
+knowledge-base, LLM, YouTube and embedding backends.
+
+Also runs a slow-YouTube scenario where the video branch hits its timeout and the reply goes out without a video.
+
+Usage:
+    python benchmarks/bench_orchestrator.py [--posts 5] [--retrieve 0.3] [--generate 1.2]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from bench_lecture_warmup import TOPICS, FakeEmbedding, FakeYouTube
+from lecture_index import LectureIndex, LectureWarmup
+from orchestrator import AnswerOrchestrator, question_text
+from settings import configure_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--retrieve", type=float, default=0.3, help="Seconds of knowledge-base retrieval")
+    parser.add_argument("--generate", type=float, default=1.2, help="Seconds of answer generation")
+    parser.add_argument("--search-latency", type=float, default=0.25, help="Seconds per YouTube search")
+    parser.add_argument("--transcript-latency", type=float, default=0.4, help="Seconds per transcript download")
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    def retrieve(post):
+        time.sleep(args.retrieve)
+        return [{"text": f"notes about {post['title']}"}]
+
+    def generate(question, documents):
+        time.sleep(args.generate)
+        return f"Answer based on {len(documents)} documents"
+
+    posts = [
+        {
+            "uid": f"cid{i}",
+            "title": TOPICS[i % len(TOPICS)],
+            "content_text": f"How does {TOPICS[i % len(TOPICS)]} work?",
+        }
+        for i in range(args.posts)
+    ]
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        youtube = FakeYouTube(10, 20, args.search_latency, args.transcript_latency)
+        lectures = LectureWarmup(youtube, index=LectureIndex(index_dir), embedding=FakeEmbedding(0.05))
+
+        sequential = []
+        for post in posts:
+            start = time.perf_counter()
+            documents = retrieve(post)
+            generate(question_text(post), documents)
+            match = lectures.match_live(question_text(post))[0]
+            youtube.generate_iframe(match["video"], start=match["start"])
+            sequential.append(time.perf_counter() - start)
+
+        orchestrator = AnswerOrchestrator(retrieve=retrieve, generate=generate, lectures=lectures)
+        results = [orchestrator.answer_sync(post) for post in posts]
+        orchestrator.close()
+        concurrent = [result["timings"]["total"] for result in results]
+
+        slow = FakeYouTube(10, 20, args.search_latency, 5.0)
+        slow_lectures = LectureWarmup(
+            slow, index=LectureIndex(os.path.join(index_dir, "slow")), embedding=FakeEmbedding(0.05)
+        )
+        orchestrator = AnswerOrchestrator(
+            retrieve=retrieve, generate=generate, lectures=slow_lectures, video_timeout=1.0
+        )
+        timed_out = orchestrator.answer_sync(posts[0])
+        orchestrator.close()
+
+    print(
+        f"{args.posts} posts, retrieve {args.retrieve}s, generate {args.generate}s, "
+        f"YouTube search {args.search_latency}s + transcript {args.transcript_latency}s"
+    )
+    print(f"{'mode':<12}{'p50 s':>8}{'max s':>8}")
+    print(f"{'sequential':<12}{statistics.median(sequential):>8.3f}{max(sequential):>8.3f}")
+    print(f"{'concurrent':<12}{statistics.median(concurrent):>8.3f}{max(concurrent):>8.3f}")
+    print("breakdown of the last reply:", {name: round(t, 3) for name, t in results[-1]["timings"].items()})
+    print(
+        f"slow YouTube: total {timed_out['timings']['total']:.3f}s, answer={timed_out['answer'] is not None}, "
+        f"html={timed_out['html'] is not None}, errors={timed_out['errors']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Cold vs warm page extraction through the PDF page cache (`pdf_cache.PdfPages`) on a large textbook.
+
+    no cache      `iter_pdf_pages(cache=False)`: pypdf parses and extracts every page, as on every run before
+    cold          empty cache: hash the file, extract every page and store it
+    warm          every page read back from the cache, as on a re-run or a re-chunking experiment
+    cold 10%      a random tenth of the pages with an empty cache, as in partial ingestion: only those are extracted
+    warm 10%      the same pages read back from the cache
+
+Uses `--pdf` when given, otherwise writes a synthetic textbook: pages of Helvetica text with a figure every tenth
+page, compressed like a real PDF.
+
+Usage:
+    python benchmarks/bench_pdf_cache.py [--pdf textbook.pdf] [--pages 800] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "data_ingestion"))
+
+from bench_chunking import synthetic_pages
+from chunking import iter_pdf_pages
+from pdf_cache import PageCache, PdfPages
+from settings import configure_logging
+
+
+def write_textbook(path: str, pages: int, lines_per_page: int = 55):
+    """
+    Writes a minimal PDF of `pages` text pages, every tenth one with an 8x8 figure.
+    """
+    objects = {}
+    # 1 catalog, 2 page tree, 3 font, 4 image; pages and their content streams follow
+    objects[3] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    pixels = zlib.compress(bytes(range(0, 256, 4)))
+    objects[4] = (
+        b"<< /Type /XObject /Subtype /Image /Width 8 /Height 8 /ColorSpace /DeviceGray /BitsPerComponent 8"
+        b" /Filter /FlateDecode /Length %d >>\nstream\n" % len(pixels) + pixels + b"\nendstream"
+    )
+    kids = []
+    for number, (_, _, text) in enumerate(synthetic_pages(pages), 1):
+        words, lines, line = text.split(), [], ""
+        for word in words:
+            if len(line) + len(word) > 90:
+                lines.append(line)
+                line = ""
+            line += word + " "
+        lines = (lines + [line])[:lines_per_page]
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        content = "BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(f"({line}) '" for line in escaped) + " ET"
+        if number % 10 == 0:
+            content += " q 200 0 0 200 200 100 cm /Im1 Do Q"
+        stream = zlib.compress(content.encode("latin-1"))
+        page_id, content_id = 5 + 2 * (number - 1), 6 + 2 * (number - 1)
+        resources = b"<< /Font << /F1 3 0 R >> /XObject << /Im1 4 0 R >> >>" if number % 10 == 0 else None
+        resources = resources or b"<< /Font << /F1 3 0 R >> >>"
+        objects[page_id] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources %s /Contents %d 0 R >>" % (
+            resources,
+            content_id,
+        )
+        objects[content_id] = b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        kids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids),
+        len(kids),
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def timed(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to extract instead of a synthetic textbook")
+    parser.add_argument("--pages", type=int, default=800, help="Pages of the synthetic textbook")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.pdf
+        if path is None:
+            path = os.path.join(directory, "textbook.pdf")
+            write_textbook(path, args.pages)
+
+        def cold(pages=None):
+            # A new cache file per run, so every run starts empty
+            cache_path = os.path.join(directory, f"cold-{time.perf_counter_ns()}.sqlite3")
+            cache = PageCache(cache_path)
+            for _ in PdfPages(path, cache=cache).iter_pages(pages):
+                pass
+            cache.close()
+            os.remove(cache_path)
+
+        warm_cache = PageCache(os.path.join(directory, "warm.sqlite3"))
+        pdf = PdfPages(path, cache=warm_cache)
+        count = len(pdf)
+        images = sum(len(content.images) for content in pdf.iter_pages())
+        sample = sorted(random.Random(0).sample(range(1, count + 1), max(1, count // 10)))
+
+        def warm(pages=None):
+            for _ in PdfPages(path, cache=warm_cache).iter_pages(pages):
+                pass
+
+        stats = warm_cache.stats()
+        print(
+            f"{count} pages, {images} images, PDF {os.path.getsize(path) / 2**20:.1f} MiB, "
+            f"cache {stats['bytes'] / 2**20:.1f} MiB"
+        )
+        print(f"{'run':<12}{'seconds':>10}{'ms/page':>10}{'speedup':>10}")
+        baseline = timed(lambda: sum(1 for _ in iter_pdf_pages(path, cache=False)), args.repeat)
+        rows = [
+            ("no cache", baseline, count),
+            ("cold", timed(cold, args.repeat), count),
+            ("warm", timed(warm, args.repeat), count),
+            ("cold 10%", timed(lambda: cold(sample), args.repeat), len(sample)),
+            ("warm 10%", timed(lambda: warm(sample), args.repeat), len(sample)),
+        ]
+        for name, seconds, pages in rows:
+            print(f"{name:<12}{seconds:>10.3f}{seconds / pages * 1000:>10.3f}{baseline / seconds:>9.1f}x")
+        warm_cache.close()
+
+
+if __name__ == "__main__":
+    main()
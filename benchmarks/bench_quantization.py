@@ -0,0 +1,84 @@
+"""
+Benchmark of quantized embedding storage: BSON bytes per chunk, search latency and recall@k against a float32
+brute-force baseline.
+
+Synthetic clustered 768-dimensional vectors stand in for gecko embeddings.
+
+Usage:
+    python benchmarks/bench_quantization.py [--n 20000] [--queries 200] [--k 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import bson
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "data_ingestion"))
+
+from quantization import ProductQuantizer, QuantizedIndex, normalize, pack_vector
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 50), dim)).astype(np.float32)
+    points = centers[rng.integers(0, len(centers), size=n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return normalize(points)
+
+
+def bson_bytes(vector: np.ndarray, dtype: str) -> int:
+    if dtype == "array":
+        doc = {"embedding": vector.astype(np.float64).tolist()}
+    else:
+        doc = pack_vector(vector, dtype=dtype)
+    return len(bson.encode(doc))
+
+
+def recall(results, truth, k):
+    return np.mean([len({i for i, _ in r} & set(t[:k])) / k for r, t in zip(results, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.n, args.dim)
+    queries = synthetic_embeddings(args.queries, args.dim, seed=1)
+    ids = list(range(args.n))
+    truth = [np.argsort(-(vectors @ q))[: args.k].tolist() for q in queries]
+
+    print("BSON bytes per chunk embedding")
+    for dtype in ("array", "float32", "float16", "int8"):
+        print(f"  {dtype:<10}{bson_bytes(vectors[0], dtype):>8}")
+
+    variants = [
+        ("float32", QuantizedIndex(dtype="float32"), True),
+        ("float16", QuantizedIndex(dtype="float16"), False),
+        ("float16+rescore", QuantizedIndex(dtype="float16"), True),
+        ("int8", QuantizedIndex(dtype="int8"), False),
+        ("int8+rescore", QuantizedIndex(dtype="int8"), True),
+        ("pq96", QuantizedIndex(product_quantizer=ProductQuantizer(m=96, iterations=8)), False),
+        ("pq96+rescore", QuantizedIndex(product_quantizer=ProductQuantizer(m=96, iterations=8)), True),
+    ]
+
+    print(f"\n{args.n} vectors, {args.queries} queries, k={args.k}")
+    print(f"{'index':<18}{'codes MB':>10}{'ms/query':>10}{'recall@k':>10}")
+    for label, index, rescore in variants:
+        index.add(ids, vectors)
+        start = time.perf_counter()
+        results = [index.search(q, k=args.k, rescore=rescore) for q in queries]
+        elapsed = (time.perf_counter() - start) / args.queries
+        print(f"{label:<18}{index.nbytes / 1e6:>10.2f}{elapsed * 1000:>10.2f}{recall(results, truth, args.k):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Latency benchmark of sub-query retrieval for long Piazza threads, against a fake embedding endpoint and a fake vector
+search with fixed per-request latencies.
+
+Compares:
+    single      the whole conversation embedded with `embed_query` and searched once
+    sequential  every sub-query embedded with its own `embed_query` call and searched one after the other
+    batched     `SubQueryRetriever`: one `embed_documents` call and concurrent searches, merged by rank fusion
+
+Usage:
+    python benchmarks/bench_query_prep.py [--posts 20] [--embed-latency 0.12] [--search-latency 0.05]
+"""
+
+import argparse
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "data_ingestion"))
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from query_prep import SubQueryRetriever, extract_subqueries
+from settings import configure_logging
+from thread_builder import ConversationThreadBuilder
+
+DIM = 256
+
+
+def hashed_embedding(text: str) -> np.ndarray:
+    """
+    Bag-of-words embedding with hashed random token vectors, enough for results to depend on the query.
+    """
+    vector = np.zeros(DIM, dtype=np.float32)
+    for token in text.lower().split():
+        seed = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), "little")
+        vector += np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class FakeEmbedding:
+    """
+    Mimics `EmbeddingClient`: one request per call of `embed_query`, one per batch of 5 texts in `embed_documents`.
+    """
+
+    def __init__(self, latency: float, batch_size: int = 5):
+        self.latency = latency
+        self.batch_size = batch_size
+        self.requests = 0
+
+    def embed_query(self, text):
+        self.requests += 1
+        time.sleep(self.latency)
+        return hashed_embedding(text)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        for _ in range(0, len(texts), self.batch_size):
+            self.requests += 1
+            time.sleep(self.latency)
+        return [hashed_embedding(text) for text in texts]
+
+
+class FakeSearch:
+    def __init__(self, corpus, latency: float):
+        self.corpus = corpus
+        self.matrix = np.stack([hashed_embedding(doc["text"]) for doc in corpus])
+        self.latency = latency
+
+    def __call__(self, vector, k, pre_filter=None):
+        time.sleep(self.latency)
+        scores = self.matrix @ np.asarray(vector, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        return [{**self.corpus[i], "score": float(scores[i])} for i in top]
+
+
+TOPICS = ["linear regression", "gradient descent", "numpy broadcasting", "overfitting", "cross validation"]
+ERRORS = [
+    "ValueError: operands could not be broadcast together with shapes (3,) (4,)",
+    "TypeError: unsupported operand type(s) for +: 'int' and 'str'",
+    "IndexError: index 5 is out of bounds for axis 0 with size 5",
+]
+
+
+def synthetic_post(i: int, followups: int = 8) -> dict:
+    topic, error = TOPICS[i % len(TOPICS)], ERRORS[i % len(ERRORS)]
+    content = (
+        f"I am working on homework {i % 7} about {topic}. I wrote the code below and it fails.\n"
+        + "\n".join(f"    x{j} = model.fit(X[:, {j}], y)" for j in range(10))
+        + f'\nTraceback (most recent call last):\n  File "hw.py", line 12, in <module>\n{error}\n'
+        + f"Why does {topic} fail here, and how should I reshape my inputs?"
+    )
+    return {
+        "uid": f"cid{i:08d}",
+        "title": f"HW{i % 7} {topic} error",
+        "content_text": content,
+        "answers": {
+            "i_answer": {"text": None, "img": []},
+            "s_answer": {"text": f"Check the shapes of your {topic} inputs.", "img": []},
+            "followup": [
+                {"subject": f"Still stuck on {topic}, tried reshaping {j} times.", "feedback": ["same here"] * 3}
+                for j in range(followups)
+            ],
+        },
+    }
+
+
+def corpus(n: int = 2000):
+    docs = []
+    for i in range(n):
+        topic = TOPICS[i % len(TOPICS)]
+        error = ERRORS[i % len(ERRORS)] if i % 4 == 0 else ""
+        docs.append({"_id": i, "text": f"Lecture notes {i} on {topic}. {error} Example {i % 13} of {topic}."})
+    return docs
+
+
+def summarize(name, latencies, requests):
+    p50 = statistics.median(latencies) * 1000
+    p95 = sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000
+    print(f"{name:<12}{p50:>10.1f}{p95:>10.1f}{requests / len(latencies):>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.12, help="Seconds per embedding request")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per vector search")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    search = FakeSearch(corpus(), args.search_latency)
+    builder = ConversationThreadBuilder(max_tokens=2000)
+    posts = [synthetic_post(i) for i in range(args.posts)]
+
+    print(
+        f"{args.posts} posts, {args.embed_latency * 1000:.0f} ms per embedding request, "
+        f"{args.search_latency * 1000:.0f} ms per search"
+    )
+    print(f"{'mode':<12}{'p50 ms':>10}{'p95 ms':>10}{'embed requests':>16}")
+
+    embedding = FakeEmbedding(args.embed_latency)
+    latencies = []
+    for post in posts:
+        start = time.perf_counter()
+        search(embedding.embed_query(builder.build(post)["conversation"]), args.k)
+        latencies.append(time.perf_counter() - start)
+    summarize("single", latencies, embedding.requests)
+
+    embedding = FakeEmbedding(args.embed_latency)
+    latencies = []
+    for post in posts:
+        start = time.perf_counter()
+        for subquery in extract_subqueries(post):
+            search(embedding.embed_query(subquery["text"]), args.k)
+        latencies.append(time.perf_counter() - start)
+    summarize("sequential", latencies, embedding.requests)
+
+    embedding = FakeEmbedding(args.embed_latency)
+    retriever = SubQueryRetriever(embedding=embedding, search=search, k=args.k)
+    latencies, prepare = [], []
+    for post in posts:
+        _, _, timings = retriever.retrieve_with_timings(post)
+        latencies.append(timings["total"])
+        prepare.append(timings["prepare"])
+    retriever.close()
+    summarize("batched", latencies, embedding.requests)
+    print(f"sub-query extraction p50 {statistics.median(prepare) * 1000:.2f} ms")
+
+    documents, subqueries, _ = SubQueryRetriever(embedding=embedding, search=search, k=5).retrieve_with_timings(
+        posts[0]
+    )
+    print("\nsub-queries of the first post:")
+    for subquery in subqueries:
+        print(f"  {subquery['kind']:<9}{subquery['text']}")
+    print("top merged documents:")
+    for doc in documents:
+        print(f"  {doc['fused_score']:.4f} {','.join(doc['matched']):<24}{doc['text'][:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Throughput of several processes sharing one rate-limited service, with and without the quota coordinator.
+
+A local HTTP server enforces a token bucket quota and answers 429 with Retry-After when it is exceeded. Worker
+processes call it as fast as their limiter allows:
+
+    independent   each process spaces its own calls at --per-process requests/s and sleeps on 429s, as the clients
+                  did before
+    coordinated   every process draws from one `QuotaCoordinator` bucket in a shared SQLite file
+
+Reports successful requests/s (against the quota), 429s and how much the per-second throughput swings.
+
+Usage:
+    python benchmarks/bench_quota.py [--quota 50] [--processes 3] [--per-process 20] [--seconds 8]
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from quota import Quota, QuotaCoordinator, retry_after
+
+
+class QuotaServer:
+    def __init__(self, per_second: float, burst: float = 5):
+        self.per_second = per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.ok = []
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.per_second)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.ok.append(now)
+                return True
+            self.rejected += 1
+            return False
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.allow():
+                    self.send_response(200)
+                    self.end_headers()
+                else:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def independent_worker(url, per_process, seconds):
+    session = requests.Session()
+    interval = 1 / per_process
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.monotonic()
+        response = session.get(url)
+        if response.status_code == 429:
+            time.sleep(retry_after(response) or 1)
+        else:
+            time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+
+def coordinated_worker(url, db_path, quota, seconds):
+    session = requests.Session()
+    coordinator = QuotaCoordinator(db_path, quotas={"service": Quota(per_second=quota, burst=5)})
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if not coordinator.acquire("service", timeout=max(0.0, end - time.monotonic())):
+            break
+        response = session.get(url)
+        if response.status_code == 429:
+            coordinator.report_throttled("service", retry_after(response))
+        else:
+            coordinator.report_success("service")
+
+
+def run(mode, args, db_path=None):
+    server = QuotaServer(args.quota)
+    url = server.start()
+    if mode == "independent":
+        processes = [
+            multiprocessing.Process(target=independent_worker, args=(url, args.per_process, args.seconds))
+            for _ in range(args.processes)
+        ]
+    else:
+        processes = [
+            multiprocessing.Process(target=coordinated_worker, args=(url, db_path, args.quota, args.seconds))
+            for _ in range(args.processes)
+        ]
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    server.stop()
+
+    per_second = [0] * args.seconds
+    for t in server.ok:
+        second = int(t - start)
+        if second < args.seconds:
+            per_second[second] += 1
+    steady = per_second[1:]
+    throughput = sum(steady) / len(steady)
+    print(
+        f"{mode:<13}{throughput:>10.1f}{throughput / args.quota:>8.0%}{server.rejected:>8}"
+        f"{statistics.pstdev(steady):>10.1f}   {steady}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=float, default=50, help="Requests per second allowed by the service")
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--per-process", type=float, default=20, help="Requests/s of each independent client")
+    parser.add_argument("--seconds", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"quota {args.quota:g}/s, {args.processes} processes, {args.seconds}s, first second excluded")
+    print(f"{'mode':<13}{'ok/s':>10}{'quota':>8}{'429s':>8}{'stdev/s':>10}   ok per second")
+    run("independent", args)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "quota.sqlite3")
+        run("coordinated", args, db_path)
+        stats = QuotaCoordinator(db_path, quotas={"service": Quota(per_second=args.quota)}).utilization()
+    print(f"coordinator utilization: {stats['service']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Full-pipeline runs of `AnswerOrchestrator` against recordings instead of live services.
+
+The fake embedding, vector search and LLM backends sleep for a jittered latency and, like a sampled LLM, do not
+answer the same question twice in the same words. The same posts are answered:
+
+    live              calling the backends directly
+    record            through a `CallRecorder` in auto mode on an empty store, i.e. live calls plus recording
+    replay instant    from the recordings, without waiting
+    replay recorded   from the recordings, waiting for each call's recorded latency
+
+Reports wall time per run, whether replies match the recorded run, the store size and the per-call replay overhead.
+
+Usage:
+    python benchmarks/bench_replay.py [--posts 20] [--embed 0.1] [--search 0.2] [--generate 0.8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from bench_lecture_warmup import TOPICS
+from orchestrator import AnswerOrchestrator, question_text
+from recorder import CallRecorder, ReplayMiss
+from settings import configure_logging
+
+
+class Backends:
+    def __init__(self, embed: float, search: float, generate: float, seed: int = None):
+        self.latency = {"embed": embed, "search": search, "generate": generate}
+        self.rng = random.Random(seed)
+
+    def _sleep(self, name: str):
+        time.sleep(self.latency[name] * self.rng.uniform(0.7, 1.3))
+
+    def embed(self, text: str) -> list:
+        self._sleep("embed")
+        return [len(text) / 100, text.count(" ") / 10]
+
+    def search(self, vector: list, k: int = 4) -> list:
+        self._sleep("search")
+        return [{"text": f"chunk {int(vector[0] * 100) % 50 + i}", "score": 0.9 - 0.05 * i} for i in range(k)]
+
+    def generate(self, question: str, documents: list) -> str:
+        self._sleep("generate")
+        opener = self.rng.choice(["Good question.", "In short:", "Recall from lecture that"])
+        return f"{opener} {question.splitlines()[0]} is covered in {documents[0]['text']}."
+
+
+def pipeline(backends: Backends, recorder: CallRecorder = None) -> AnswerOrchestrator:
+    embed, search, generate = backends.embed, backends.search, backends.generate
+    if recorder is not None:
+        embed = recorder.wrap("embedding", embed)
+        search = recorder.wrap("search", search)
+        generate = recorder.wrap("llm", generate)
+    return AnswerOrchestrator(retrieve=lambda post: search(embed(question_text(post))), generate=generate)
+
+
+def run(orchestrator: AnswerOrchestrator, posts: list):
+    start = time.perf_counter()
+    answers = [orchestrator.answer_sync(post)["answer"] for post in posts]
+    orchestrator.close()
+    return time.perf_counter() - start, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=20)
+    parser.add_argument("--embed", type=float, default=0.1, help="Seconds per embedding call")
+    parser.add_argument("--search", type=float, default=0.2, help="Seconds per vector search")
+    parser.add_argument("--generate", type=float, default=0.8, help="Seconds per LLM call")
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    posts = [
+        {"uid": f"cid{i}", "title": TOPICS[i % len(TOPICS)], "content_text": f"Question {i} about the homework."}
+        for i in range(args.posts)
+    ]
+    latencies = (args.embed, args.search, args.generate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "recordings.sqlite3")
+        results = {"live": run(pipeline(Backends(*latencies)), posts)}
+        results["live again"] = run(pipeline(Backends(*latencies)), posts)
+
+        recorder = CallRecorder(path, mode="auto")
+        results["record"] = run(pipeline(Backends(*latencies), recorder), posts)
+        size = os.path.getsize(path)
+        recorder.close()
+
+        for timing in ("instant", "recorded"):
+            recorder = CallRecorder(path, mode="replay", timing=timing)
+            results[f"replay {timing}"] = run(pipeline(Backends(*latencies), recorder), posts)
+            stats = recorder.stats()
+            recorder.close()
+
+        recorder = CallRecorder(path, mode="replay")
+        start = time.perf_counter()
+        for _ in range(1000):
+            recorder.call("embedding", None, question_text(posts[0]))
+        overhead = (time.perf_counter() - start) / 1000
+        try:
+            recorder.call("llm", None, "a question never asked", [])
+            offline = "called the backend"
+        except ReplayMiss:
+            offline = "ReplayMiss"
+        recorder.close()
+
+    recorded_answers = results["record"][1]
+    print(f"{args.posts} posts, {stats['hits'] // args.posts} calls each")
+    print(f"{'run':<18}{'wall s':>8}{'same as record':>16}")
+    for name, (seconds, answers) in results.items():
+        print(f"{name:<18}{seconds:>8.2f}{answers == recorded_answers!s:>16}")
+    print(
+        f"store: {sum(ns['calls'] for ns in stats['namespaces'].values())} calls, {size / 1024:.0f} KiB on disk; "
+        f"replay lookup {overhead * 1e6:.0f} us/call; unrecorded call in replay mode: {offline}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Answer-quality gain and latency overhead of the re-ranking stage on a synthetic retrieval eval set.
+
+Each question has 10 retrieved candidates from its lecture topic: a few chunks that actually answer it (they share its
+specific terms) and distractors about neighbouring subtopics, with vector scores that barely separate them, as with
+the 0.75 score threshold of `get_retriever`. Quality is precision@4 (the chunks put in the prompt, at most 0.5 on
+average since questions have 1 to 3 relevant chunks) and MRR of the first relevant chunk.
+
+Modes:
+    vector      retrieval order
+    lexical     `LexicalReranker`
+    slow model  a fake 15 ms/batch model under a 20 ms budget, shows the budget cut-off
+    onnx        `CrossEncoderReranker`, only with --onnx-model and --tokenizer
+
+Usage:
+    python benchmarks/bench_rerank.py [--questions 500] [--onnx-model model.onnx --tokenizer tokenizer.json]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "data_ingestion"))
+
+from rerank import CrossEncoderReranker, LexicalReranker, RerankStage
+from settings import configure_logging
+
+SUBTOPICS = {
+    "hmm": ["emission matrix", "transition matrix", "viterbi path", "forward probabilities", "baum welch update"],
+    "regression": ["normal equation", "ridge penalty", "gradient step", "residual plot", "feature scaling"],
+    "trees": ["gini impurity", "information gain", "pruning depth", "random forest bagging", "leaf size"],
+}
+FILLER = "in this lecture we discuss the example from the slides and work through the homework problem step by step"
+
+
+def chunk(topic: str, subtopic: str, rng: random.Random) -> str:
+    words = FILLER.split()
+    rng.shuffle(words)
+    return f"{topic} notes: {' '.join(words[:10])} {subtopic} {' '.join(words[10:])} the {subtopic} is computed"
+
+
+def eval_set(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(n):
+        topic = rng.choice(list(SUBTOPICS))
+        target = rng.choice(SUBTOPICS[topic])
+        others = [s for s in SUBTOPICS[topic] if s != target]
+        relevant = rng.randint(1, 3)
+        candidates = [{"_id": j, "text": chunk(topic, target, rng), "relevant": True} for j in range(relevant)]
+        candidates += [
+            {"_id": relevant + j, "text": chunk(topic, rng.choice(others), rng), "relevant": False}
+            for j in range(10 - relevant)
+        ]
+        for doc in candidates:
+            doc["score"] = 0.8 + rng.gauss(0, 0.02) + (0.01 if doc["relevant"] else 0.0)
+        candidates.sort(key=lambda doc: doc["score"], reverse=True)
+        questions.append((f"How is the {target} computed for {topic} in the homework?", candidates))
+    return questions
+
+
+def quality(ranked_lists, k: int = 4):
+    precision = np.mean([sum(doc["relevant"] for doc in ranked[:k]) / k for ranked in ranked_lists])
+    mrr = np.mean(
+        [next((1 / (i + 1) for i, doc in enumerate(ranked) if doc["relevant"]), 0.0) for ranked in ranked_lists]
+    )
+    return precision, mrr
+
+
+class SlowModel:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lexical = LexicalReranker(vector_weight=0.0)
+
+    def score(self, query, docs):
+        time.sleep(self.latency)
+        return self.lexical.score(query, docs)
+
+
+def run(name, stage, questions, top_n):
+    if stage is None:
+        ranked = [candidates[:top_n] for _, candidates in questions]
+        stats = {"latency_p50_ms": 0.0, "latency_p95_ms": 0.0, "over_budget": 0}
+    else:
+        ranked = [stage.rerank(query, candidates) for query, candidates in questions]
+        stats = stage.stats()
+    precision, mrr = quality(ranked, k=top_n)
+    print(
+        f"{name:<12}{precision:>8.3f}{mrr:>8.3f}{stats['latency_p50_ms']:>10.2f}{stats['latency_p95_ms']:>10.2f}"
+        f"{stats['over_budget']:>13}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--top-n", type=int, default=4)
+    parser.add_argument("--onnx-model")
+    parser.add_argument("--tokenizer")
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    questions = eval_set(args.questions)
+    print(f"{args.questions} questions, 10 candidates each, top {args.top_n} kept")
+    print(f"{'mode':<12}{'P@' + str(args.top_n):>8}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}{'over budget':>13}")
+
+    run("vector", None, questions, args.top_n)
+    run("lexical", RerankStage(LexicalReranker(), top_n=args.top_n), questions, args.top_n)
+    run(
+        "slow model",
+        RerankStage(SlowModel(0.015), top_n=args.top_n, budget_ms=20, batch_size=4),
+        questions[:100],
+        args.top_n,
+    )
+    if args.onnx_model and args.tokenizer:
+        model = CrossEncoderReranker(args.onnx_model, args.tokenizer)
+        run("onnx", RerankStage(model, top_n=args.top_n, budget_ms=200), questions, args.top_n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Locust-style load test of the answer service (`service.create_app`) served by uvicorn, against fake retrieval and
+LLM backends.
+
+Virtual users POST /answer in a loop with exponential think times. Questions are drawn from a Zipf distribution over
+a small pool, as in an exam spike where many students ask the same thing. Runs with request coalescing on and off,
+and reports throughput, tail latency of successful replies, 503s and backend LLM calls.
+
+Usage:
+    python benchmarks/bench_service.py [--users 200] [--seconds 15] [--questions 40] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from bench_lecture_warmup import TOPICS
+from bench_replay import Backends
+from orchestrator import AnswerOrchestrator, question_text
+from service import create_app
+from settings import configure_logging
+
+
+class CountingBackends(Backends):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generate_calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, question: str, documents: list) -> str:
+        with self._lock:
+            self.generate_calls += 1
+        return super().generate(question, documents)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app) -> tuple:
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=30)
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+async def user(client, questions, weights, think, deadline, rng, results):
+    while time.monotonic() < deadline:
+        question = rng.choices(questions, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await client.post("/answer", json=question)
+        except httpx.TransportError:
+            results.append((None, time.perf_counter() - start, None))
+        else:
+            results.append((response.status_code, time.perf_counter() - start, response.headers.get("Retry-After")))
+        await asyncio.sleep(rng.expovariate(1 / think))
+
+
+async def load(url, args, questions, weights):
+    rng = random.Random(0)
+    results = []
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        deadline = time.monotonic() + args.seconds
+        # Users ramp up over the first second
+        users = []
+        for _ in range(args.users):
+            users.append(asyncio.create_task(user(client, questions, weights, args.think, deadline, rng, results)))
+            await asyncio.sleep(1 / args.users)
+        await asyncio.gather(*users)
+        health = (await client.get("/health")).json()
+    return results, health
+
+
+def run(coalesce: bool, args, questions, weights):
+    backends = CountingBackends(args.embed, args.search, args.generate, seed=0)
+
+    def retrieve(post):
+        return backends.search(backends.embed(question_text(post)))
+
+    orchestrator = AnswerOrchestrator(retrieve=retrieve, generate=backends.generate, max_workers=args.concurrency * 2)
+    app = create_app(orchestrator, max_concurrency=args.concurrency, max_queue=args.queue, coalesce=coalesce)
+    server, thread, url = serve(app)
+    start = time.perf_counter()
+    results, health = asyncio.run(load(url, args, questions, weights))
+    elapsed = time.perf_counter() - start
+    server.should_exit = True
+    thread.join()
+
+    ok = sorted(latency for status, latency, _ in results if status == 200)
+    rejected = sum(status == 503 for status, _, _ in results)
+    errors = sum(status not in (200, 503) for status, _, _ in results)
+    quantile = lambda q: ok[min(len(ok) - 1, int(q * len(ok)))] if ok else float("nan")  # noqa: E731
+    print(
+        f"{'on' if coalesce else 'off':<10}{len(ok) / elapsed:>8.1f}{quantile(0.5):>8.2f}{quantile(0.95):>8.2f}"
+        f"{quantile(0.99):>8.2f}{rejected:>7}{errors:>8}"
+        f"{backends.generate_calls:>10}{health['coalesced']:>11}"
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--think", type=float, default=2.0, help="Mean seconds between two requests of a user")
+    parser.add_argument("--questions", type=int, default=40, help="Distinct questions in the pool")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent of question popularity")
+    parser.add_argument("--concurrency", type=int, default=16, help="Pipeline runs at once")
+    parser.add_argument("--queue", type=int, default=32, help="Runs allowed to wait for a slot")
+    parser.add_argument("--embed", type=float, default=0.05)
+    parser.add_argument("--search", type=float, default=0.1)
+    parser.add_argument("--generate", type=float, default=0.8)
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    questions = [
+        {"title": f"{TOPICS[i % len(TOPICS)]} ({i})", "content_text": f"How does {TOPICS[i % len(TOPICS)]} work?"}
+        for i in range(args.questions)
+    ]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.questions)]
+
+    print(
+        f"{args.users} users, think {args.think}s, {args.seconds:g}s, {args.questions} questions (zipf {args.zipf}), "
+        f"{args.concurrency} concurrent runs + {args.queue} queued, generate {args.generate}s"
+    )
+    print(
+        f"{'coalesce':<10}{'ok/s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+        f"{'503s':>7}{'errors':>8}{'LLM calls':>10}{'coalesced':>11}"
+    )
+    run(False, args, questions, weights)
+    results = run(True, args, questions, weights)
+    retry_after = [int(value) for status, _, value in results if status == 503 and value]
+    if retry_after:
+        print(f"Retry-After on 503s: median {statistics.median(retry_after)}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Query throughput of the sharded vector index (`sharding.ShardedIndex`) as the number of shards, i.e. worker
+processes, grows, against a single-process `QuantizedIndex` holding everything.
+
+Synthetic documents over 20 courses, partitioned by course. For every shard count, reports:
+
+    single     one query per scatter-gather: the latency of a bot answering one question
+    batch      --batch queries per scatter-gather: throughput when queries are queued, e.g. during an exam spike
+    course     single queries filtered on one course, which only reach the shard holding it
+
+Shards can only run in parallel on as many cores as the machine has; the core count is printed first.
+
+Usage:
+    python benchmarks/bench_sharded_search.py [--n 200000] [--dim 256] [--shards 1,2,4] [--queries 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "data_ingestion"))
+
+from bench_filtered_search import synthetic_metadata
+from quantization import QuantizedIndex
+from settings import configure_logging
+from sharding import ShardedIndex, write_shards
+
+
+def throughput(fn, queries, batch: int = 1) -> tuple:
+    results, timings = [], []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        begin = time.perf_counter()
+        results.extend(fn(queries[i : i + batch]))
+        timings.append((time.perf_counter() - begin) * 1000)
+    return len(queries) / (time.perf_counter() - start), statistics.median(timings), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--shards", default="1,2,4")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    configure_logging(level="WARNING", force=True)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.n, args.dim), dtype=np.float32)
+    metadata = synthetic_metadata(args.n, rng)
+    queries = list(rng.standard_normal((args.queries, args.dim), dtype=np.float32))
+    ids = list(range(args.n))
+    course = {"course": "course03"}
+    print(f"{args.n} documents, dim {args.dim}, {os.cpu_count()} cores")
+
+    index = QuantizedIndex(dtype="int8")
+    index.add(ids, vectors, metadata=metadata)
+    truth = [index.search(query, k=args.k) for query in queries]
+    # The index is bound as an argument, so that it is freed by the del below before the shards are loaded
+    single = throughput(lambda batch, index=index: [index.search(q, k=args.k) for q in batch], queries)
+    routed = throughput(lambda batch, index=index: [index.search(q, k=args.k, filter=course) for q in batch], queries)
+    print(f"{'shards':<10}{'single QPS':>11}{'p50 ms':>8}{'batch QPS':>11}{'course QPS':>12}{'recall':>8}")
+    print(f"{'in-process':<10}{single[0]:>11.0f}{single[1]:>8.2f}{single[0]:>11.0f}{routed[0]:>12.0f}{1.0:>8.2f}")
+    del index
+
+    for shards in (int(s) for s in args.shards.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            write_shards(directory, ids, vectors, metadata, shards=shards, by="course")
+            with ShardedIndex(directory, timeout=5.0) as sharded:
+                sharded.search_batch(queries[:4], k=args.k)
+                single = throughput(lambda batch: sharded.search_batch(batch, k=args.k), queries)
+                batched = throughput(lambda batch: sharded.search_batch(batch, k=args.k), queries, args.batch)
+                routed = throughput(lambda batch: sharded.search_batch(batch, k=args.k, filter=course), queries)
+                stats = sharded.stats()
+            recall = statistics.mean(
+                len({i for i, _ in r} & {i for i, _ in t}) / args.k for r, t in zip(single[2], truth)
+            )
+            print(
+                f"{shards:<10}{single[0]:>11.0f}{single[1]:>8.2f}{batched[0]:>11.0f}{routed[0]:>12.0f}{recall:>8.2f}"
+                + (f"  timeouts {stats['timeouts']}" if any(stats["timeouts"]) else "")
+            )
+
+
+if __name__ == "__main__":
+    main()
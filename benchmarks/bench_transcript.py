@@ -0,0 +1,121 @@
+"""
+Memory and lookup benchmark of `Transcript` against the "start - end: text" string list that
+`download_and_parse_captions` used to return, on synthetic multi-hour lecture transcripts.
+
+Usage:
+    python benchmarks/bench_transcript.py [--hours 1 3 8] [--lookups 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.append(os.path.join(REPO_DIR, "virtual_ta", "agent"))
+
+from transcript import Transcript
+
+WORDS = "the model so we take gradient of loss and then update weights matrix hidden state emission probability".split()
+
+
+def synthetic_captions(hours: float, seed: int = 0):
+    rng = random.Random(seed)
+    captions, t = [], 0.0
+    while t < hours * 3600:
+        duration = round(rng.uniform(1.5, 4.5), 2)
+        captions.append({"text": " ".join(rng.choices(WORDS, k=rng.randint(4, 12))), "start": t, "duration": duration})
+        t = round(t + duration + rng.choice([0, 0, 0, 0.3]), 2)
+    return captions
+
+
+def legacy_lines(captions):
+    lines = []
+    for cap in captions:
+        end = round(cap["start"] + cap["duration"], 2)
+        lines.append(f"{cap['start']} - {end}: {cap['text']}")
+    return lines
+
+
+def legacy_lookup(lines, seconds):
+    # What every consumer of the string list had to do: parse times back out of each line
+    for line in lines:
+        times, _, text = line.partition(": ")
+        start, _, end = times.partition(" - ")
+        if float(start) <= seconds < float(end):
+            return text
+    return None
+
+
+def measured(build):
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 3, 8])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    header = (
+        f"{'hours':>6}{'captions':>10}{'lines KiB':>11}{'compact KiB':>13}{'linear us':>11}{'bisect us':>11}"
+        f"{'windows ms':>12}{'json KiB':>10}{'file KiB':>10}{'load ms':>9}"
+    )
+    print(header)
+    for hours in args.hours:
+        captions = synthetic_captions(hours)
+        lines, lines_size = measured(lambda: legacy_lines(captions))
+        transcript, compact_size = measured(lambda: Transcript.from_captions(captions))
+
+        rng = random.Random(1)
+        times = [rng.uniform(0, transcript.duration) for _ in range(args.lookups)]
+        linear_lookups = times[: max(1, args.lookups // 20)]
+
+        start = time.perf_counter()
+        for seconds in linear_lookups:
+            legacy_lookup(lines, seconds)
+        linear = (time.perf_counter() - start) / len(linear_lookups)
+
+        start = time.perf_counter()
+        for seconds in times:
+            transcript.segment_at(seconds)
+        bisect = (time.perf_counter() - start) / len(times)
+
+        for seconds in linear_lookups:
+            segment = transcript.segment_at(seconds)
+            assert (segment.text if segment else None) == legacy_lookup(lines, seconds) or segment is None
+
+        start = time.perf_counter()
+        windows = sum(1 for _ in transcript.windows(30, 15))
+        windows_ms = (time.perf_counter() - start) * 1000
+
+        json_size = len(json.dumps(lines).encode("utf-8"))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "lecture.vttr")
+            transcript.save(path)
+            file_size = os.path.getsize(path)
+            start = time.perf_counter()
+            loaded = Transcript.load(path)
+            load_ms = (time.perf_counter() - start) * 1000
+        assert loaded.to_lines() == transcript.to_lines()
+
+        print(
+            f"{hours:>6g}{len(transcript):>10}{lines_size / 1024:>11.0f}{compact_size / 1024:>13.0f}"
+            f"{linear * 1e6:>11.0f}{bisect * 1e6:>11.2f}{windows_ms:>12.1f}{json_size / 1024:>10.0f}"
+            f"{file_size / 1024:>10.0f}{load_ms:>9.2f}"
+        )
+    print(f"({windows} windows of 30 s for the last transcript)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+import orjson
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# Shared by the `settings` modules of the agent and of data_ingestion, which re-export it: a process loading modules
+# of both sides only ever has one of them as `settings`, so whatever either side imports from `settings` lives here.
+# It belongs to neither side, and is imported as `common.settings` with the repository root on `sys.path`.
+
+
+class RepoPath:
+    """
+    Locations that do not depend on which side's `settings` module is loaded.
+    """
+
+    repo_dir: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    agent_dir: str = os.path.join(repo_dir, "virtual_ta", "agent")
+    ingestion_dir: str = os.path.join(repo_dir, "data_ingestion")
+    secrets_dir: str = os.path.join(repo_dir, "secrets")
+    env_file: str = os.path.join(repo_dir, ".env")
+    cache_dir: str = os.path.join(repo_dir, ".cache")
+    template_dir: str = os.path.join(repo_dir, "virtual_ta", "templates")
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=RepoPath.env_file, env_file_encoding="utf-8", extra="ignore")
+
+    GCLOUD_SERVICE_ACCOUNT_KEY_PATH: str = Field(default="<your-gcp-service-acc-key-filename>")
+    PROJECT_ID: str = Field(default="<your-gcp-project-id>")
+    PROJECT_LOCATION: str = Field(default="<your-gcp-project-location>")
+    # google.oauth2.service_account.Credentials, loaded in `get_settings`
+    CREDENTIALS: Any = Field(default=None)
+
+    MONGODB_URI: str = Field(default="<mongodb-connection-string>")
+
+    OPENAI_API_KEY: str = Field(default="<your-openai-api-key>")
+    HUGGINGFACEHUB_API_TOKEN: str = Field(default="<your-huggingfacehub-access-token>")
+
+
+class PiazzaBotConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_file=RepoPath.env_file, env_file_encoding="utf-8", extra="ignore")
+
+    PIAZZA_USER_EMAIL: str = Field()
+    PIAZZA_USER_PASSWORD: str = Field()
+
+
+class APIKeys(BaseSettings):
+    model_config = SettingsConfigDict(env_file=RepoPath.env_file, env_file_encoding="utf-8", extra="ignore")
+
+    YOUTUBE_API_KEY: str = Field()
+    GCLOUD_SERVICE_ACCOUNT_KEY_PATH: str = Field(default="<your-gcp-service-acc-key-filename>")
+
+
+class ServiceConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_file=RepoPath.env_file, env_file_encoding="utf-8", extra="ignore")
+
+    SERVICE_HOST: str = Field(default="127.0.0.1")
+    SERVICE_PORT: int = Field(default=8000)
+    # Requests running the pipeline at once, and requests allowed to wait for a slot before getting a 503
+    SERVICE_MAX_CONCURRENCY: int = Field(default=16)
+    SERVICE_MAX_QUEUE: int = Field(default=64)
+    # Seconds a request may wait for a slot
+    SERVICE_QUEUE_TIMEOUT: float = Field(default=10.0)
+
+
+class LoggingConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_file=RepoPath.env_file, env_file_encoding="utf-8", extra="ignore")
+
+    LOG_LEVEL: str = Field(default="DEBUG")
+    # One of "rich" (pretty console output) or "json" (one JSON object per line)
+    LOG_FORMAT: str = Field(default="rich")
+    # Hand records to a background thread so log calls never block on I/O
+    LOG_QUEUE: bool = Field(default=False)
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """
+    Formats log records as single-line JSON objects. Cheaper to render than Rich output and easy to ship to a log
+    aggregator.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(payload, default=str).decode("utf-8")
+
+
+_logging_lock = threading.Lock()
+_logging_configured = False
+_queue_listener = None
+_log_level = "DEBUG"
+_app_loggers = set()
+
+
+def _stop_queue_listener():
+    global _queue_listener
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+atexit.register(_stop_queue_listener)
+
+
+def configure_logging(level: str = None, fmt: str = None, use_queue: bool = None, force: bool = False):
+    """
+    Configures the root logger once per process. Subsequent calls are no-ops unless `force` is set, so handlers are
+    never stacked no matter how many times `get_logger` is called.
+
+    Args:
+        level (str): Logging level name. Defaults to `LOG_LEVEL`.
+        fmt (str): "rich" or "json". Defaults to `LOG_FORMAT`.
+        use_queue (bool): Whether to emit through a `QueueHandler`/`QueueListener` pair. Defaults to `LOG_QUEUE`.
+        force (bool): Tear down the current configuration and apply the new one.
+    """
+    global _logging_configured, _queue_listener, _log_level
+
+    with _logging_lock:
+        if _logging_configured and not force:
+            return
+
+        log_config = LoggingConfig()
+        level = (level or log_config.LOG_LEVEL).upper()
+        fmt = (fmt or log_config.LOG_FORMAT).lower()
+        use_queue = log_config.LOG_QUEUE if use_queue is None else use_queue
+
+        root = logging.getLogger()
+        _stop_queue_listener()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        if fmt == "json":
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(JSONLinesFormatter())
+        else:
+            from rich.logging import RichHandler
+
+            handler = RichHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+
+        if use_queue:
+            log_queue = queue.SimpleQueue()
+            _queue_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+            _queue_listener.start()
+            handler = QueueHandler(log_queue)
+
+        # Third-party libraries inherit WARNING from the root logger; only loggers handed out by `get_logger` run at
+        # the configured level, so disabled levels short-circuit in `Logger.isEnabledFor` before any formatting.
+        root.addHandler(handler)
+        root.setLevel(logging.WARNING)
+        _log_level = level
+        for name in _app_loggers:
+            logging.getLogger(name).setLevel(level)
+        _logging_configured = True
+
+
+def get_logger(name):
+    configure_logging()
+    logger = logging.getLogger(name)
+    with _logging_lock:
+        if name not in _app_loggers:
+            logger.setLevel(_log_level)
+            _app_loggers.add(name)
+    return logger
+
+
+class LazyObject:
+    """
+    Proxy that defers building the wrapped object until one of its attributes is first accessed. Used for settings
+    and clients so that importing a module never reads credential files or opens connections.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_wrapped", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _setup(self):
+        wrapped = object.__getattribute__(self, "_wrapped")
+        if wrapped is None:
+            with object.__getattribute__(self, "_lock"):
+                wrapped = object.__getattribute__(self, "_wrapped")
+                if wrapped is None:
+                    wrapped = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_wrapped", wrapped)
+        return wrapped
+
+    def __getattr__(self, name):
+        return getattr(self._setup(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._setup(), name, value)
+
+    def __getitem__(self, key):
+        return self._setup()[key]
+
+    def __repr__(self):
+        if object.__getattribute__(self, "_wrapped") is None:
+            return f"<LazyObject: {object.__getattribute__(self, '_factory')!r} (not initialized)>"
+        return repr(self._setup())
+
+
+@lru_cache(maxsize=64)
+def get_settings() -> Settings:
+    from google.oauth2.service_account import Credentials
+
+    settings = Settings()
+    settings.CREDENTIALS = Credentials.from_service_account_file(
+        os.path.join(RepoPath.secrets_dir, settings.GCLOUD_SERVICE_ACCOUNT_KEY_PATH),
+        scopes=["https://www.googleapis.com/auth/cloud-platform"],
+    )
+    return settings
+
+
+config = LazyObject(get_settings)
@@ -0,0 +1,239 @@
+import hashlib
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Tuple
+
+from pydantic import BaseModel
+
+# Separators tried in order when looking for a break point, like RecursiveCharacterTextSplitter
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+class Chunk(BaseModel):
+    chunk_id: str
+    source: str
+    page: int
+    # Character offsets of the chunk within the page text
+    start: int
+    end: int
+    text: str
+
+    def to_document(self, metadata: dict = None):
+        """
+        Args:
+            metadata (dict): Extra metadata of the whole source, e.g. its course and term filter fields.
+        """
+        from langchain_core.documents import Document
+
+        return Document(
+            page_content=self.text,
+            metadata={
+                **(metadata or {}),
+                "chunk_id": self.chunk_id,
+                "source": self.source,
+                "page": self.page,
+                "start": self.start,
+                "end": self.end,
+            },
+        )
+
+
+def make_chunk_id(source: str, page: int, start: int, end: int, text: str) -> str:
+    """
+    Stable id of a chunk: identical source, position and text always give the same id across runs.
+    """
+    digest = hashlib.blake2b(f"{source}|{page}|{start}|{end}|".encode("utf-8"), digest_size=12)
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CharacterSplitter:
+    """
+    Splits text into windows of at most `chunk_size` characters overlapping by about `chunk_overlap`, breaking on
+    the coarsest separator found in the second half of the window. Works on offsets, so it never copies the text
+    more than once per chunk.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150, separators: Tuple[str] = SEPARATORS):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        start, length = 0, len(text)
+        while start < length:
+            # Skip leading whitespace so chunks do not start with separators
+            while start < length and text[start].isspace():
+                start += 1
+            if start >= length:
+                return
+
+            end = min(start + self.chunk_size, length)
+            if end < length:
+                floor = start + self.chunk_size // 2
+                for separator in self.separators:
+                    cut = text.rfind(separator, floor, end)
+                    if cut != -1:
+                        end = cut + len(separator)
+                        break
+
+            stripped_end = end
+            while stripped_end > start and text[stripped_end - 1].isspace():
+                stripped_end -= 1
+            yield start, stripped_end
+
+            if end >= length:
+                return
+            start = max(end - self.chunk_overlap, start + 1)
+            # Move the overlap start to a word boundary
+            space = text.find(" ", start, end)
+            if space != -1:
+                start = space + 1
+
+
+class TokenSplitter:
+    """
+    Splits text into windows of `chunk_tokens` tokens overlapping by `overlap_tokens`, using a Hugging Face
+    `tokenizers` tokenizer. Token offsets map every window back to exact character offsets in the page.
+
+    The tokenizer is loaded lazily in each process, so instances can be sent to worker processes cheaply.
+    """
+
+    def __init__(self, tokenizer: str = "bert-base-uncased", chunk_tokens: int = 256, overlap_tokens: int = 32):
+        """
+        Args:
+            tokenizer (str): Path to a tokenizer.json file or a Hugging Face Hub model name.
+            chunk_tokens (int): Maximum tokens per chunk.
+            overlap_tokens (int): Tokens shared by consecutive chunks.
+        """
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.tokenizer = tokenizer
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self._tokenizer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tokenizer"] = None
+        return state
+
+    def _load(self):
+        if self._tokenizer is None:
+            from tokenizers import Tokenizer
+
+            if os.path.exists(self.tokenizer):
+                self._tokenizer = Tokenizer.from_file(self.tokenizer)
+            else:
+                self._tokenizer = Tokenizer.from_pretrained(self.tokenizer)
+            self._tokenizer.no_truncation()
+        return self._tokenizer
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        offsets = [
+            (start, end) for start, end in self._load().encode(text, add_special_tokens=False).offsets if end > start
+        ]
+        step = self.chunk_tokens - self.overlap_tokens
+        for first in range(0, len(offsets), step):
+            window = offsets[first : first + self.chunk_tokens]
+            yield window[0][0], window[-1][1]
+            if first + self.chunk_tokens >= len(offsets):
+                return
+
+
+def split_page(splitter, source: str, page: int, text: str) -> List[Chunk]:
+    """
+    Splits the text of one page into chunks with stable ids and page offsets.
+    """
+    chunks = []
+    for start, end in splitter.spans(text):
+        chunk_text = text[start:end]
+        chunks.append(
+            Chunk(
+                chunk_id=make_chunk_id(source, page, start, end, chunk_text),
+                source=source,
+                page=page,
+                start=start,
+                end=end,
+                text=chunk_text,
+            )
+        )
+    return chunks
+
+
+def _split_batch(splitter, batch: List[Tuple[str, int, str]]) -> List[Chunk]:
+    return [chunk for source, page, text in batch for chunk in split_page(splitter, source, page, text)]
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def iter_pdf_pages(
+    path: str, source: str = None, pages: Iterable[int] = None, cache: bool = True
+) -> Iterator[Tuple[str, int, str]]:
+    """
+    Streams (source, page number, text) for each page of a PDF without holding the whole document's text.
+
+    Args:
+        pages (Iterable[int]): Page numbers to read, starting at 1. Defaults to every page.
+        cache (bool): Read pages through the on-disk page cache (see `pdf_cache`), extracting only missing ones.
+    """
+    if cache:
+        from pdf_cache import iter_cached_pages
+
+        yield from iter_cached_pages(path, source=source, pages=pages)
+        return
+
+    from pypdf import PdfReader
+
+    source = source or os.path.basename(path)
+    reader = PdfReader(path)
+    numbers = range(1, len(reader.pages) + 1) if pages is None else pages
+    for number in numbers:
+        yield source, number, reader.pages[number - 1].extract_text() or ""
+
+
+def chunk_pages(
+    pages: Iterable[Tuple[str, int, str]],
+    splitter=None,
+    workers: int = None,
+    pages_per_task: int = 8,
+    max_pending: int = None,
+) -> Iterator[Chunk]:
+    """
+    Chunks a stream of (source, page number, text) tuples across a process pool, yielding chunks in page order.
+
+    Pages are sent to workers in batches of `pages_per_task` and at most `max_pending` batches are in flight, so
+    memory stays bounded however large the input is.
+
+    Args:
+        pages (Iterable): Page tuples, e.g. from `iter_pdf_pages`.
+        splitter: A `CharacterSplitter` or `TokenSplitter`. Defaults to `CharacterSplitter()`.
+        workers (int): Worker processes. 0 or 1 chunks in the current process.
+        pages_per_task (int): Pages per task sent to a worker.
+        max_pending (int): Batches in flight, defaults to twice the worker count.
+    """
+    splitter = splitter or CharacterSplitter()
+    workers = os.cpu_count() if workers is None else workers
+    batches = _batched(pages, pages_per_task)
+
+    if workers <= 1:
+        for batch in batches:
+            yield from _split_batch(splitter, batch)
+        return
+
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for batch in batches:
+            pending.append(executor.submit(_split_batch, splitter, batch))
+            if len(pending) >= max_pending:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
@@ -2,8 +2,7 @@ from typing import Any
 
 from bson import ObjectId
 from pydantic_core import core_schema
-from pymongo import MongoClient
-from settings import config, get_logger
+from settings import LazyObject, config, get_logger
 
 logger = get_logger(__name__)
 
@@ -45,6 +44,8 @@ class PyObjectId(ObjectId):
 
 class MongoDBConnector:
     def __init__(self, uri: str, db_name: str):
+        from pymongo import MongoClient
+
         try:
             self.client = MongoClient(uri)
         except Exception as e:
@@ -61,16 +62,23 @@ def get_collection(db, collection_name: str):
     return db[collection_name]
 
 
-try:
-    client = MongoClient(config.MONGODB_URI)
-except Exception as e:
-    logger.error("Unable to connect to MongoDB client: %s" % e)
+def get_client():
+    from pymongo import MongoClient
+
+    try:
+        return MongoClient(config.MONGODB_URI)
+    except Exception as e:
+        logger.error("Unable to connect to MongoDB client: %s" % e)
+        raise
+
 
 DB_NAME = "langchain_db"
 COLLECTION_NAME = "test"
 ATLAS_VECTOR_SEARCH_INDEX_NAME = "vector_index"
 
-main_db = client[DB_NAME]
+# Client, database and collection are only created when first used
+client = LazyObject(get_client)
+main_db = LazyObject(lambda: client[DB_NAME])
 
 # Get collections
-MONGODB_COLLECTION = get_collection(main_db, "test")
+MONGODB_COLLECTION = LazyObject(lambda: get_collection(main_db, COLLECTION_NAME))
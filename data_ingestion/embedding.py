@@ -1,6 +1,6 @@
 import time
 from typing import List
-from langchain_google_vertexai import VertexAIEmbeddings
+
 from settings import config
 
 
@@ -28,13 +28,29 @@ class EmbeddingClient:
     - location: The location of the Google Cloud project, such as 'us-central1'.
     - requests_per_minute: Maximum number of requests per minute.
     - num_instances_per_batch: Number of instances (texts) per batch.
+    - quota: Optional shared QuotaCoordinator. When given, requests draw from its "vertex-embedding" bucket and
+      are retried on 429s instead of being spaced by `requests_per_minute` within this client only.
+    - recorder: Optional CallRecorder the requests go through, to record them or replay recorded embeddings.
     """
 
     def __init__(
-        self, model_name: str, project: str, location: str, requests_per_minute: int, num_instances_per_batch: int
+        self,
+        model_name: str,
+        project: str,
+        location: str,
+        requests_per_minute: int,
+        num_instances_per_batch: int,
+        quota=None,
+        recorder=None,
     ):
         self.requests_per_minute = requests_per_minute
         self.num_instances_per_batch = num_instances_per_batch
+        self.quota = quota
+        self.recorder = recorder
+        self.model_name = model_name
+
+        from langchain_google_vertexai import VertexAIEmbeddings
+
         self.client = VertexAIEmbeddings(
             model_name=model_name,
             project=project,
@@ -49,10 +65,30 @@ class EmbeddingClient:
         :param query: The text query to embed.
         :return: The embeddings for the query or None if the operation fails.
         """
+        if self.recorder is not None:
+            return self.recorder.call(f"vertex-embedding:{self.model_name}:query", self._embed_query, query)
+        return self._embed_query(query)
+
+    def _embed_query(self, query):
+        if self.quota is not None:
+            return self.quota.call("vertex-embedding", self.client.embed_query, query)
         vectors = self.client.embed_query(query)
         return vectors
 
+    def _get_embeddings(self, texts: List[str]):
+        if self.recorder is not None:
+            return self.recorder.call(f"vertex-embedding:{self.model_name}", self._request_embeddings, texts)
+        return self._request_embeddings(texts)
+
+    def _request_embeddings(self, texts: List[str]):
+        if self.quota is not None:
+            return self.quota.call("vertex-embedding", self.client.get_embeddings, texts)
+        return self.client.get_embeddings(texts)
+
     def embed_documents(self, texts: List[str]):
+        if self.quota is not None:
+            return self._embed_documents_with_quota(texts)
+
         limiter = rate_limit(self.requests_per_minute)
         results = []
         docs = list(texts)
@@ -64,8 +100,16 @@ class EmbeddingClient:
                 docs[: self.num_instances_per_batch],
                 docs[self.num_instances_per_batch :],
             )
-            chunk = self.client.get_embeddings(head)
+            chunk = self._get_embeddings(head)
             results.extend(chunk)
             next(limiter)
 
         return [r.values for r in results]
+
+    def _embed_documents_with_quota(self, texts: List[str]):
+        results = []
+        docs = list(texts)
+        for i in range(0, len(docs), self.num_instances_per_batch):
+            head = docs[i : i + self.num_instances_per_batch]
+            results.extend(self._get_embeddings(head))
+        return [r.values for r in results]
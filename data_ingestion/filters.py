@@ -0,0 +1,189 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# Metadata stored at the top level of every knowledge-base document and usable to narrow a search
+FILTER_FIELDS = ("source", "course", "term", "folders")
+
+
+def term_of(created) -> str:
+    """
+    Academic term of a date, e.g. "2024-spring" for an ISO timestamp or `datetime` in January to May, "summer" for
+    June and July, "fall" from August. None when the date cannot be parsed.
+    """
+    if not created:
+        return None
+    if not isinstance(created, datetime):
+        try:
+            created = datetime.fromisoformat(str(created).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    season = "spring" if created.month <= 5 else "summer" if created.month <= 7 else "fall"
+    return f"{created.year}-{season}"
+
+
+def metadata_filter(**fields) -> dict:
+    """
+    MQL filter on the filter fields, e.g. `metadata_filter(course="cs567", term=["2024-spring", "2024-fall"])`.
+    A list matches any of its values and None values are ignored. Usable as the `pre_filter` of an Atlas vector
+    search once the fields are declared in the index (see `ensure_vector_index`) and as a `find` query.
+    """
+    clauses = []
+    for field, value in fields.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"{field!r} is not a filter field, expected one of {FILTER_FIELDS}")
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({field: {"$in": list(value)}})
+        else:
+            clauses.append({field: {"$eq": value}})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def vector_index_definition(
+    dimensions: int, path: str = "embedding", similarity: str = "cosine", filter_fields: Iterable[str] = FILTER_FIELDS
+) -> dict:
+    fields = [{"type": "vector", "path": path, "numDimensions": dimensions, "similarity": similarity}]
+    fields += [{"type": "filter", "path": field} for field in filter_fields]
+    return {"fields": fields}
+
+
+def ensure_vector_index(collection, dimensions: int, name: str = None, **kwargs) -> dict:
+    """
+    Creates the Atlas vector search index of a collection, or updates it, with the filter fields declared so that
+    `$vectorSearch` can pre-filter on them.
+
+    Args:
+        collection: The pymongo collection.
+        dimensions (int): Embedding dimensions.
+        name (str): Index name, defaults to `db.ATLAS_VECTOR_SEARCH_INDEX_NAME`.
+        **kwargs: Passed to `vector_index_definition`.
+
+    Returns:
+        dict: The server response.
+    """
+    if name is None:
+        from db import ATLAS_VECTOR_SEARCH_INDEX_NAME as name
+    from pymongo.errors import OperationFailure
+
+    definition = vector_index_definition(dimensions, **kwargs)
+    db = collection.database
+    existing = {index["name"] for index in collection.aggregate([{"$listSearchIndexes": {}}])}
+    if name in existing:
+        return db.command({"updateSearchIndex": collection.name, "name": name, "definition": definition})
+    try:
+        return db.command(
+            {
+                "createSearchIndexes": collection.name,
+                "indexes": [{"name": name, "type": "vectorSearch", "definition": definition}],
+            }
+        )
+    except OperationFailure:
+        # Created concurrently by another process
+        return db.command({"updateSearchIndex": collection.name, "name": name, "definition": definition})
+
+
+class MetadataIndex:
+    """
+    Local filter index over the documents of a vector index: for every value of every filter field, the sorted row
+    ids of the documents having it. Values held by at least `dense_fraction` of the rows also get a boolean bitmap,
+    so that intersecting with them costs one lookup per candidate instead of a merge.
+
+    Rows are numbered in insertion order, matching the rows of the vector index they belong to.
+    """
+
+    def __init__(self, fields: Iterable[str] = FILTER_FIELDS, dense_fraction: float = 1 / 16):
+        self.fields = tuple(fields)
+        self.dense_fraction = dense_fraction
+        self.size = 0
+        self._pending: Dict[str, Dict[object, List[int]]] = {field: {} for field in self.fields}
+        self._postings: Dict[str, Dict[object, np.ndarray]] = {field: {} for field in self.fields}
+        self._bitmaps: Dict[tuple, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, rows: Iterable[dict]):
+        """
+        Appends the metadata of documents, one dict per row. List values (e.g. folders) index the row under each
+        element, missing fields index nothing.
+        """
+        for metadata in rows:
+            for field in self.fields:
+                value = metadata.get(field)
+                if value is None:
+                    continue
+                for item in set(value) if isinstance(value, (list, tuple, set)) else (value,):
+                    self._pending[field].setdefault(item, []).append(self.size)
+            self.size += 1
+
+    def _flush(self):
+        if not any(self._pending.values()):
+            return
+        for field, values in self._pending.items():
+            postings = self._postings[field]
+            for value, rows in values.items():
+                added = np.asarray(rows, dtype=np.int32)
+                postings[value] = added if value not in postings else np.concatenate([postings[value], added])
+            values.clear()
+        self._bitmaps.clear()
+
+    def postings(self, field: str, value) -> np.ndarray:
+        self._flush()
+        return self._postings[field].get(value, np.empty(0, dtype=np.int32))
+
+    def _rows(self, field: str, values: tuple) -> np.ndarray:
+        lists = [self.postings(field, value) for value in values]
+        if not lists:
+            # An empty list of values matches no row
+            return np.empty(0, dtype=np.int32)
+        return lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+
+    def _bitmap(self, field: str, values: tuple) -> np.ndarray:
+        key = (field, values)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            bitmap = np.zeros(self.size, dtype=bool)
+            for value in values:
+                bitmap[self.postings(field, value)] = True
+            self._bitmaps[key] = bitmap
+        return bitmap
+
+    def ids(self, filter: dict) -> np.ndarray:
+        """
+        Sorted row ids matching a filter given as {field: value or list of values}: any of the values of a field,
+        all of the fields. None when the filter is empty, i.e. every row matches.
+        """
+        self._flush()
+        clauses = []
+        for field, value in (filter or {}).items():
+            if field not in self.fields:
+                raise ValueError(f"{field!r} is not an indexed field, expected one of {self.fields}")
+            if value is None:
+                continue
+            values = tuple(sorted(set(value))) if isinstance(value, (list, tuple, set)) else (value,)
+            # Upper bound of the clause size, without merging its posting lists
+            size = sum(len(self.postings(field, v)) for v in values)
+            clauses.append((size, field, values))
+        if not clauses:
+            return None
+
+        # Start from the most selective clause and narrow it down with the others
+        clauses.sort(key=lambda clause: clause[0])
+        result = self._rows(*clauses[0][1:])
+        for size, field, values in clauses[1:]:
+            if not len(result):
+                break
+            if size >= self.dense_fraction * self.size:
+                result = result[self._bitmap(field, values)[result]]
+            else:
+                result = np.intersect1d(result, self._rows(field, values), assume_unique=True)
+        return result
+
+    def count(self, filter: dict) -> int:
+        ids = self.ids(filter)
+        return self.size if ids is None else len(ids)
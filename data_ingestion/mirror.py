@@ -0,0 +1,505 @@
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Sequence
+
+import numpy as np
+from bson import json_util
+from filters import FILTER_FIELDS, MetadataIndex
+from quantization import normalize, quantize
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+STATE = "state.json"
+ARRAYS = ("codes", "scales", "vectors")
+# Server error codes meaning the change stream cannot resume from its token
+CHANGE_STREAM_HISTORY_LOST = 286
+NOT_A_REPLICA_SET = (40573, 20)
+
+
+class MirrorIndex:
+    """
+    Local vector index that accepts inserts, updates and deletes, backed by memory-mapped .npy files.
+
+    Rows are only ever appended: an update writes a new row and retires the old one, a delete retires it. Searches
+    skip retired rows, and the index is rewritten without them once they exceed `compact_fraction` of the rows.
+    Arrays are written to files of a new generation when they grow or are compacted, and `checkpoint` records which
+    generation and how many rows are current, so a crash at any point reopens a consistent index.
+    """
+
+    def __init__(self, directory: str, dtype: str = "int8", capacity: int = 1024, compact_fraction: float = 0.25):
+        self.directory = directory
+        self.dtype = dtype
+        self.compact_fraction = compact_fraction
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        state = self.read_state(directory)
+        self.generation = state.get("generation", 0)
+        self.dim = state.get("dim")
+        self.ids = state.get("ids", [])
+        self._metadata = state.get("metadata", [])
+        self.slots = {doc_id: slot for slot, doc_id in enumerate(self.ids) if doc_id is not None}
+        # Sized like the arrays, only the first `size` entries are meaningful
+        self.valid = np.array([doc_id is not None for doc_id in self.ids], dtype=bool)
+        self.metadata = MetadataIndex()
+        self.metadata.add(self._metadata)
+        self.arrays = {}
+        if self.dim is not None:
+            self.arrays = {name: self._open(name, self.generation) for name in ARRAYS}
+            self.valid = np.concatenate([self.valid, np.zeros(self.capacity - self.size, dtype=bool)])
+        self._initial_capacity = capacity
+
+    @staticmethod
+    def read_state(directory: str) -> dict:
+        path = os.path.join(directory, STATE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json_util.loads(f.read())
+
+    def _path(self, name: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{name}-{generation:06d}.npy")
+
+    def _open(self, name: str, generation: int):
+        return np.lib.format.open_memmap(self._path(name, generation), mode="r+")
+
+    def _create(self, generation: int, capacity: int) -> dict:
+        shapes = {"codes": (capacity, self.dim), "scales": (capacity,), "vectors": (capacity, self.dim)}
+        dtypes = {"codes": np.dtype(self.dtype), "scales": np.float32, "vectors": np.float32}
+        return {
+            name: np.lib.format.open_memmap(self._path(name, generation), mode="w+", dtype=dtypes[name], shape=shape)
+            for name, shape in shapes.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.arrays["codes"]) if self.arrays else 0
+
+    def _rewrite(self, rows: np.ndarray, capacity: int):
+        # New generation files; the current ones stay valid until the next checkpoint names the new generation
+        arrays = self._create(self.generation + 1, capacity)
+        for name in ARRAYS:
+            arrays[name][: len(rows)] = self.arrays[name][rows]
+        valid = np.zeros(capacity, dtype=bool)
+        valid[: len(rows)] = self.valid[rows]
+        self.arrays, self.valid = arrays, valid
+        self.generation += 1
+
+    def upsert(self, doc_id, vector: Sequence[float], metadata: dict = None) -> bool:
+        """
+        Inserts or replaces the vector and metadata of a document.
+
+        Returns:
+            bool: False when the document was already indexed with the same vector and metadata.
+        """
+        vector = normalize(np.asarray(vector, dtype=np.float32))
+        metadata = {field: metadata[field] for field in FILTER_FIELDS if field in (metadata or {})}
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(vector)
+                self.arrays = self._create(self.generation, self._initial_capacity)
+                self.valid = np.zeros(self._initial_capacity, dtype=bool)
+            slot = self.slots.get(doc_id)
+            if slot is not None:
+                if self._metadata[slot] == metadata and np.array_equal(self.arrays["vectors"][slot], vector):
+                    return False
+                self._retire(slot)
+            if self.size == self.capacity:
+                self._rewrite(np.arange(self.size), 2 * self.capacity)
+
+            slot = self.size
+            codes, scales = quantize(vector[None, :], dtype=self.dtype)
+            self.arrays["codes"][slot] = codes[0]
+            self.arrays["scales"][slot] = scales[0]
+            self.arrays["vectors"][slot] = vector
+            self.ids.append(doc_id)
+            self._metadata.append(metadata)
+            self.metadata.add([metadata])
+            self.valid[slot] = True
+            self.slots[doc_id] = slot
+            return True
+
+    def _retire(self, slot: int):
+        del self.slots[self.ids[slot]]
+        self.ids[slot] = None
+        self.valid[slot] = False
+
+    def delete(self, doc_id) -> bool:
+        with self._lock:
+            slot = self.slots.get(doc_id)
+            if slot is None:
+                return False
+            self._retire(slot)
+            return True
+
+    def compact(self):
+        """
+        Rewrites the index without its retired rows.
+        """
+        with self._lock:
+            rows = np.flatnonzero(self.valid[: self.size])
+            self._rewrite(rows, max(self._initial_capacity, 2 * len(rows)))
+            self.ids = [self.ids[i] for i in rows]
+            self._metadata = [self._metadata[i] for i in rows]
+            self.slots = {doc_id: slot for slot, doc_id in enumerate(self.ids)}
+            self.metadata = MetadataIndex()
+            self.metadata.add(self._metadata)
+
+    def clear(self):
+        with self._lock:
+            self.ids, self._metadata, self.slots = [], [], {}
+            self.metadata = MetadataIndex()
+            if self.dim is not None:
+                self.arrays = self._create(self.generation + 1, self._initial_capacity)
+                self.valid = np.zeros(self._initial_capacity, dtype=bool)
+                self.generation += 1
+
+    def checkpoint(self, **extra):
+        """
+        Flushes the arrays and atomically records the current rows, with `extra` fields such as a resume token.
+        Files of older generations are removed afterwards.
+        """
+        with self._lock:
+            if self.size and self.size - len(self.slots) > self.compact_fraction * self.size:
+                self.compact()
+            for array in self.arrays.values():
+                array.flush()
+            state = {
+                "generation": self.generation,
+                "dim": self.dim,
+                "dtype": self.dtype,
+                "ids": self.ids,
+                "metadata": self._metadata,
+                **extra,
+            }
+            path = os.path.join(self.directory, STATE)
+            with open(path + ".tmp", "w") as f:
+                f.write(json_util.dumps(state))
+            os.replace(path + ".tmp", path)
+            current = {self._path(name, self.generation) for name in ARRAYS}
+        for path in glob.glob(os.path.join(self.directory, "*-*.npy")):
+            if path not in current:
+                os.remove(path)
+
+    def search(self, query: Sequence[float], k: int = 10, filter: dict = None, rescore_factor: int = 4) -> list:
+        """
+        Returns the `k` best (id, score) pairs for a query vector: int8 scan, then full-precision rescoring of the
+        `rescore_factor * k` best rows.
+        """
+        query = normalize(np.asarray(query, dtype=np.float32))
+        with self._lock:
+            if not self.slots:
+                return []
+            rows = self.metadata.ids(filter) if filter else None
+            if rows is None:
+                rows = np.flatnonzero(self.valid[: self.size]) if len(self.slots) < self.size else np.arange(self.size)
+            else:
+                rows = rows[self.valid[rows]]
+            if not len(rows):
+                return []
+            codes, scales, vectors = self.arrays["codes"], self.arrays["scales"], self.arrays["vectors"]
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), 16384):
+                block = rows[start : start + 16384]
+                scores[start : start + len(block)] = (codes[block].astype(np.float32) @ query) * scales[block]
+
+            n_candidates = min(len(rows), k * rescore_factor)
+            candidates = rows[np.argpartition(-scores, n_candidates - 1)[:n_candidates]]
+            candidate_scores = vectors[candidates] @ query
+            order = np.argsort(-candidate_scores)[:k]
+            return [(self.ids[candidates[i]], float(candidate_scores[i])) for i in order]
+
+
+class _Resync(Exception):
+    """
+    The change stream cannot continue (collection dropped, resume token too old): bootstrap again.
+    """
+
+
+class IndexMirror:
+    """
+    Keeps a `MirrorIndex` in sync with a collection of the knowledge base, so retrieval can be served locally
+    without reloading every vector on each ingestion.
+
+    The index is bootstrapped from a snapshot of the collection, then follows it incrementally:
+
+        change_stream   tails `collection.watch()` (replica sets and Atlas); inserts, updates, replacements and
+                        deletes are applied as they commit, and the stream resumes from the last resume token
+        poll            for a standalone mongod; reads documents whose `updated_field` moved past the last value
+                        seen, and finds deletes by comparing ids every `reconcile_interval` seconds
+
+    "auto" uses change streams when the server supports them. The resume token (or polling position) is
+    checkpointed with the index, so a restarted mirror catches up from where it stopped instead of bootstrapping.
+
+    Unless given a `field`, the mirror indexes the field of the active `EmbeddingVersion` and bootstraps again from
+    the new field when retrieval switches to another version.
+
+    `lag()` is the delay between a change being committed and applied, 0 while the mirror is idle and caught up.
+    """
+
+    def __init__(
+        self,
+        collection,
+        directory: str,
+        field: str = None,
+        updated_field: str = "updated_at",
+        mode: str = "auto",
+        poll_interval: float = 5.0,
+        reconcile_interval: float = 300.0,
+        checkpoint_interval: float = 5.0,
+        versions=None,
+    ):
+        """
+        Args:
+            collection: The knowledge base collection.
+            directory (str): Directory of the `MirrorIndex` files and checkpoint.
+            field (str): Embedding field to index, follows the active version when None.
+            updated_field (str): Modification time field, used by the poll mode.
+            mode (str): "auto", "change_stream" or "poll".
+            poll_interval (float): Seconds between two polls.
+            reconcile_interval (float): Seconds between two searches for deleted documents in poll mode.
+            checkpoint_interval (float): Seconds between two checkpoints.
+            versions (VersionRegistry): Registry of the active version, defaults to `vector_search.get_versions()`.
+        """
+        if mode not in ("auto", "change_stream", "poll"):
+            raise ValueError(f"Unsupported mode {mode!r}")
+        self.collection = collection
+        self.versions = None
+        if field is None:
+            if versions is None:
+                from vector_search import get_versions
+
+                versions = get_versions()
+            self.versions = versions
+            field = versions.active().field
+        self.field = field
+        self.updated_field = updated_field
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.index = MirrorIndex(directory)
+
+        state = MirrorIndex.read_state(directory)
+        self.resume_token = state.get("resume_token")
+        self.polled_until = state.get("polled_until")
+        if self.polled_until is not None and self.polled_until.tzinfo is None:
+            self.polled_until = self.polled_until.replace(tzinfo=timezone.utc)
+        self.bootstrapped = (
+            "generation" in state
+            and (self.resume_token is not None or self.polled_until is not None)
+            # Checkpoints written before the field was recorded only ever indexed "embedding"
+            and state.get("field", "embedding") == self.field
+        )
+        self.applied = {"insert": 0, "update": 0, "delete": 0, "skipped": 0}
+        self._lag = 0.0
+        self._max_lag = 0.0
+        self._last_checkpoint = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def _projection(self) -> dict:
+        return {self.field: 1, self.updated_field: 1, **{name: 1 for name in FILTER_FIELDS}}
+
+    def _upsert(self, doc: dict) -> str:
+        if self.field not in doc:
+            return "delete" if self.index.delete(doc["_id"]) else "skipped"
+        inserted = doc["_id"] not in self.index.slots
+        if not self.index.upsert(doc["_id"], doc[self.field], doc):
+            return "skipped"
+        return "insert" if inserted else "update"
+
+    def _record(self, operation: str, committed: datetime = None):
+        self.applied[operation] += 1
+        if committed is not None:
+            if committed.tzinfo is None:
+                committed = committed.replace(tzinfo=timezone.utc)
+            self._lag = max(0.0, (datetime.now(timezone.utc) - committed).total_seconds())
+            self._max_lag = max(self._max_lag, self._lag)
+
+    def _checkpoint(self, force: bool = False):
+        if force or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.index.checkpoint(resume_token=self.resume_token, polled_until=self.polled_until, field=self.field)
+            self._last_checkpoint = time.monotonic()
+
+    def _check_version(self):
+        if self.versions is None:
+            return
+        field = self.versions.active().field
+        if field != self.field:
+            self.field = field
+            raise _Resync(f"active embedding version switched to field {field}")
+
+    def _use_change_streams(self) -> bool:
+        if self.mode != "auto":
+            return self.mode == "change_stream"
+        from pymongo.errors import OperationFailure
+
+        try:
+            with self.collection.watch(max_await_time_ms=1) as stream:
+                stream.try_next()
+            return True
+        except OperationFailure as e:
+            if e.code in NOT_A_REPLICA_SET:
+                logger.info("Change streams unavailable (%s), polling %s", e, self.updated_field)
+                self.mode = "poll"
+                return False
+            raise
+
+    def bootstrap(self):
+        """
+        Rebuilds the index from a snapshot of the collection. The change stream position (or polling position) is
+        taken before the snapshot, so changes committed while it is read are applied again afterwards.
+        """
+        start = time.monotonic()
+        self.resume_token, self.polled_until = None, None
+        if self._use_change_streams():
+            with self.collection.watch(full_document="updateLookup", max_await_time_ms=1) as stream:
+                stream.try_next()
+                self.resume_token = stream.resume_token
+        else:
+            self.collection.create_index(self.updated_field)
+            # Margin for the clock difference between this host and the writers
+            self.polled_until = datetime.now(timezone.utc) - timedelta(seconds=60)
+
+        self.index.clear()
+        for doc in self.collection.find({self.field: {"$exists": True}}, self._projection):
+            self.index.upsert(doc["_id"], doc[self.field], doc)
+        self._checkpoint(force=True)
+        self.bootstrapped = True
+        logger.info("Mirror bootstrapped with %d documents in %.1fs", len(self.index), time.monotonic() - start)
+
+    def _apply_change(self, change: dict):
+        operation = change["operationType"]
+        if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            raise _Resync(operation)
+        committed = change.get("wallTime")
+        if committed is None and "clusterTime" in change:
+            committed = datetime.fromtimestamp(change["clusterTime"].time, timezone.utc)
+        if operation == "delete":
+            self._record("delete" if self.index.delete(change["documentKey"]["_id"]) else "skipped", committed)
+            return
+        if operation == "update":
+            description = change.get("updateDescription", {})
+            touched = {path.split(".")[0] for path in description.get("updatedFields", {})}
+            touched |= {path.split(".")[0] for path in description.get("removedFields", [])}
+            if not touched & {self.field, *FILTER_FIELDS}:
+                self._record("skipped", committed)
+                return
+        doc = change.get("fullDocument")
+        if doc is None:
+            # Deleted before the update could be looked up; its delete event follows
+            self._record("skipped", committed)
+            return
+        self._record(self._upsert(doc), committed)
+
+    def _tail(self):
+        from pymongo.errors import OperationFailure
+
+        try:
+            with self.collection.watch(
+                full_document="updateLookup", resume_after=self.resume_token, max_await_time_ms=500
+            ) as stream:
+                while not self._stop.is_set():
+                    change = stream.try_next()
+                    if change is not None:
+                        self._apply_change(change)
+                    else:
+                        self._lag = 0.0
+                    self.resume_token = stream.resume_token
+                    self._checkpoint()
+                    self._check_version()
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_HISTORY_LOST:
+                raise _Resync("resume token no longer in the oplog") from e
+            raise
+
+    def _poll(self):
+        last_reconcile = time.monotonic()
+        while not self._stop.is_set():
+            # $gte, since several documents can share a timestamp; re-applying one is a no-op
+            query = {self.updated_field: {"$gte": self.polled_until}}
+            for doc in self.collection.find(query, self._projection).sort(self.updated_field, 1):
+                self._record(self._upsert(doc), doc[self.updated_field])
+                self.polled_until = max(self.polled_until, doc[self.updated_field].replace(tzinfo=timezone.utc))
+            self._lag = 0.0
+
+            if time.monotonic() - last_reconcile >= self.reconcile_interval:
+                existing = {doc["_id"] for doc in self.collection.find({self.field: {"$exists": True}}, {"_id": 1})}
+                for doc_id in set(self.index.slots) - existing:
+                    self.index.delete(doc_id)
+                    self._record("delete")
+                last_reconcile = time.monotonic()
+            self._checkpoint()
+            self._check_version()
+            self._stop.wait(self.poll_interval)
+
+    def run(self):
+        """
+        Syncs until `stop` is called, bootstrapping first unless a checkpoint can be resumed from.
+        """
+        from pymongo.errors import PyMongoError
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                if not self.bootstrapped:
+                    self.bootstrap()
+                if self.resume_token is not None and self.mode != "poll":
+                    self._tail()
+                else:
+                    if self.polled_until is None:
+                        self.bootstrapped = False
+                        continue
+                    self._poll()
+                backoff = 1.0
+            except _Resync as e:
+                logger.warning("Mirror resynchronizing: %s", e)
+                self.bootstrapped = False
+            except PyMongoError as e:
+                logger.warning("Mirror sync failed, retrying in %.0fs: %s", backoff, e)
+                self._stop.wait(backoff)
+                backoff = min(60.0, backoff * 2)
+        self._checkpoint(force=True)
+
+    def start(self) -> "IndexMirror":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="index-mirror", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def lag(self) -> float:
+        return self._lag
+
+    def search(self, query: Sequence[float], k: int = 10, filter: dict = None) -> list:
+        return self.index.search(query, k=k, filter=filter)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "field": self.field,
+            "documents": len(self.index),
+            "applied": dict(self.applied),
+            "lag_seconds": self._lag,
+            "max_lag_seconds": self._max_lag,
+            "resume_token": self.resume_token,
+            "polled_until": self.polled_until,
+        }
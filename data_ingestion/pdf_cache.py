@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
+
+from chunking import _batched
+from pydantic import BaseModel
+from settings import Path, get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_PATH = Path.cache_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    file_hash TEXT NOT NULL,
+    PRIMARY KEY (path, size, mtime_ns)
+);
+CREATE TABLE IF NOT EXISTS documents (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    PRIMARY KEY (file_hash, extractor)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text BLOB NOT NULL,
+    images TEXT NOT NULL,
+    PRIMARY KEY (file_hash, extractor, page)
+) WITHOUT ROWID;
+"""
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Content hash of a file, so a cached extraction survives renames and copies but not edits.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def extractor_version() -> str:
+    # Extractions of another pypdf version may differ, they are cached separately
+    from importlib.metadata import version
+
+    return f"pypdf-{version('pypdf')}"
+
+
+class PageContent(BaseModel):
+    page: int
+    text: str
+    # Names of the image XObjects of the page, see `PdfPages.image`
+    images: List[str] = []
+
+
+class PageCache:
+    """
+    On-disk store of extracted PDF pages keyed by file hash and page number. Text is zlib-compressed; the store is
+    a SQLite file that several processes can share.
+
+    File hashes are remembered by path, size and modification time, so a warm lookup does not read the PDF.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path (str): SQLite database file. Defaults to `.cache/pdf_pages.sqlite3` in the repository.
+        """
+        if path is None:
+            os.makedirs(DEFAULT_PATH, exist_ok=True)
+            path = os.path.join(DEFAULT_PATH, "pdf_pages.sqlite3")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def file_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?", key
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = file_hash(path)
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (*key, digest))
+        return digest
+
+    def page_count(self, digest: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_count FROM documents WHERE file_hash = ? AND extractor = ?", (digest, extractor_version())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_page_count(self, digest: str, count: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (digest, extractor_version(), count)
+            )
+
+    def get(self, digest: str, pages: Iterable[int]) -> dict:
+        """
+        Cached pages among `pages`, by page number.
+        """
+        pages = list(pages)
+        found = {}
+        with self._lock:
+            # Bounded by SQLite's variable limit
+            for start in range(0, len(pages), 500):
+                batch = pages[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT page, text, images FROM pages WHERE file_hash = ? AND extractor = ?"
+                    f" AND page IN ({','.join('?' * len(batch))})",
+                    (digest, extractor_version(), *batch),
+                ).fetchall()
+                for page, text, images in rows:
+                    found[page] = PageContent(
+                        page=page, text=zlib.decompress(text).decode("utf-8"), images=json.loads(images)
+                    )
+        return found
+
+    def put(self, digest: str, contents: Iterable[PageContent]):
+        rows = [
+            (
+                digest,
+                extractor_version(),
+                content.page,
+                zlib.compress(content.text.encode("utf-8")),
+                json.dumps(content.images),
+            )
+            for content in contents
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents, pages = self._conn.execute(
+                "SELECT COUNT(DISTINCT file_hash), COUNT(*) FROM pages WHERE extractor = ?", (extractor_version(),)
+            ).fetchone()
+        files = [self.path, self.path + "-wal"]
+        return {
+            "documents": documents,
+            "pages": pages,
+            "bytes": sum(os.path.getsize(f) for f in files if os.path.exists(f)),
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_page_cache() -> PageCache:
+    """
+    The page cache of this process, on the file named by the PDF_CACHE_DB environment variable or the default one.
+    """
+    return PageCache(path=os.environ.get("PDF_CACHE_DB"))
+
+
+def image_names(page) -> List[str]:
+    """
+    Names of the image XObjects in the resources of a pypdf page. Unlike `page.images`, this does not parse the
+    content stream again for inline images, which would double the extraction time.
+    """
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is None:
+        return []
+    xobjects = xobjects.get_object()
+    return [str(name) for name in xobjects if xobjects[name].get_object().get("/Subtype") == "/Image"]
+
+
+class PdfPages:
+    """
+    Lazy page-level access to a PDF. Pages are read from the page cache and only missing ones are extracted with
+    pypdf; the PDF is not even parsed when every requested page is cached. Extracted pages are written back in
+    batches of `batch_size`.
+
+    Page numbers start at 1, like the `page` metadata of chunks.
+    """
+
+    def __init__(self, path: str, cache: PageCache = None, batch_size: int = 32):
+        self.path = path
+        self.cache = cache if cache is not None else get_page_cache()
+        self.batch_size = batch_size
+        self.digest = self.cache.file_hash(path)
+        self._reader = None
+        self.extracted = 0
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            from pypdf import PdfReader
+
+            self._reader = PdfReader(self.path)
+        return self._reader
+
+    def __len__(self) -> int:
+        count = self.cache.page_count(self.digest)
+        if count is None:
+            count = len(self.reader.pages)
+            self.cache.set_page_count(self.digest, count)
+        return count
+
+    def _extract(self, number: int) -> PageContent:
+        page = self.reader.pages[number - 1]
+        try:
+            images = image_names(page)
+        except Exception as e:
+            logger.warning("Cannot list the images of page %d of %s: %s", number, self.path, e)
+            images = []
+        self.extracted += 1
+        return PageContent(page=number, text=page.extract_text() or "", images=images)
+
+    def iter_pages(self, pages: Iterable[int] = None) -> Iterator[PageContent]:
+        """
+        Yields the content of the given page numbers, by default every page, in the order given.
+        """
+        pages = range(1, len(self) + 1) if pages is None else pages
+        for batch in _batched(pages, self.batch_size):
+            cached = self.cache.get(self.digest, batch)
+            missing = [self._extract(number) for number in batch if number not in cached]
+            if missing:
+                self.cache.put(self.digest, missing)
+                cached.update((content.page, content) for content in missing)
+            for number in batch:
+                yield cached[number]
+
+    def __getitem__(self, number: int) -> PageContent:
+        return next(self.iter_pages([number]))
+
+    def text(self, number: int) -> str:
+        return self[number].text
+
+    def image(self, number: int, name: str):
+        """
+        The pypdf `ImageFile` of an image listed in `PageContent.images`. Images are not cached, only their names.
+        """
+        return self.reader.pages[number - 1].images[name]
+
+
+def iter_cached_pages(path: str, source: str = None, pages: Iterable[int] = None) -> Iterator[Tuple[str, int, str]]:
+    """
+    (source, page number, text) tuples of a PDF through the page cache, the input of `chunking.chunk_pages`.
+    """
+    source = source or os.path.basename(path)
+    for content in PdfPages(path).iter_pages(pages):
+        yield source, content.page, content.text
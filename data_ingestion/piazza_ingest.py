@@ -0,0 +1,225 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+from filters import term_of
+from settings import Path, get_logger
+
+# The conversation format is shared with the Piazza agent so that indexed threads look like live questions
+sys.path.append(os.path.join(Path.root_dir, "virtual_ta", "agent"))
+
+from thread_builder import ConversationThreadBuilder
+
+logger = get_logger(__name__)
+
+SOURCE = "piazza"
+NESTED_CHILD_KEY = re.compile(r"^Nested Child (?:(\d+)\.)?(\d+)$")
+CHILD_KEY = re.compile(r"^Child (\d+)$")
+
+
+def parse_folders(value) -> list:
+    """
+    The scraper writes folders with the csv module, i.e. as the repr of a Python list.
+    """
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value:
+        return []
+    try:
+        folders = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [value]
+    return list(folders) if isinstance(folders, (list, tuple)) else [str(folders)]
+
+
+def row_to_post(row: dict) -> dict:
+    """
+    Converts one row of the `piazza_scrapper.py` CSV into the parsed post structure of
+    `PiazzaBot.parse_post_data`.
+
+    Nested children are keyed "Nested Child <child>.<n>" by the current scraper; older scrapes used
+    "Nested Child <n>", which are attached to the closest preceding child.
+    """
+    post = {
+        "post_id": row["Post ID"],
+        "uid": str(row["Post ID"]),
+        "title": str(row["Post Title"] or "").strip(),
+        "content_text": str(row["Post Content"] or "").strip(),
+        "image_urls": [],
+        "answers": {"s_answer": {"text": None, "img": []}, "i_answer": {"text": None, "img": []}, "followup": []},
+    }
+
+    children = json.loads(row["Child Content"] or "{}")
+    followups = {}
+    last_child = None
+    for key, child in children.items():
+        content = (child.get("content") or "").strip()
+        if match := CHILD_KEY.match(key):
+            last_child = int(match.group(1))
+            if child["type"] in ("i_answer", "s_answer"):
+                post["answers"][child["type"]]["text"] = content
+            elif child["type"] == "followup":
+                followup = {"subject": content, "feedback": [], "fid": None}
+                followups[last_child] = followup
+                post["answers"]["followup"].append(followup)
+        elif match := NESTED_CHILD_KEY.match(key):
+            parent = int(match.group(1)) if match.group(1) else last_child
+            if parent in followups and content:
+                followups[parent]["feedback"].append(content)
+    return post
+
+
+def is_resolved(post: dict) -> bool:
+    return bool(post["answers"]["i_answer"]["text"] or post["answers"]["s_answer"]["text"])
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PiazzaIngester:
+    """
+    Streams a Piazza scrape into the vector store: reads the CSV in chunks, turns resolved threads into conversation
+    documents, and embeds and upserts only threads that are new or whose conversation changed since the last run.
+    """
+
+    def __init__(
+        self,
+        course_id: str,
+        collection=None,
+        embedding=None,
+        chunksize: int = 500,
+        embed_batch_size: int = 50,
+        max_tokens: int = 2000,
+        version=None,
+    ):
+        """
+        Args:
+            course_id (str): Piazza network ID of the course, stored on every document.
+            collection: MongoDB collection, defaults to `db.MONGODB_COLLECTION`.
+            embedding: Object with `embed_documents`, defaults to the client of the embedding version.
+            chunksize (int): CSV rows read per chunk.
+            embed_batch_size (int): Conversations embedded and written per batch.
+            max_tokens (int): Token budget of each conversation, keeps documents inside the embedding model limit.
+            version (EmbeddingVersion): Version whose field the vectors are written to, defaults to the active one.
+        """
+        if collection is None:
+            from db import MONGODB_COLLECTION as collection
+        stale_fields = []
+        if version is None:
+            from vector_search import get_versions
+
+            registry = get_versions()
+            version = registry.active()
+            stale_fields = [pending.field for pending in registry.pending() if pending != version]
+        if embedding is None:
+            from vector_search import get_embedding
+
+            embedding = get_embedding(version.model)
+
+        self.course_id = course_id
+        self.collection = collection
+        self.embedding = embedding
+        self.version = version
+        self.stale_fields = stale_fields
+        self.chunksize = chunksize
+        self.embed_batch_size = embed_batch_size
+        self.builder = ConversationThreadBuilder(max_tokens=max_tokens)
+
+    def existing_hashes(self) -> dict:
+        cursor = self.collection.find({"source": SOURCE, "course": self.course_id}, {"post_id": 1, "content_hash": 1})
+        return {str(doc["post_id"]): doc.get("content_hash") for doc in cursor}
+
+    def iter_rows(self, path: str):
+        import pandas as pd
+
+        for frame in pd.read_csv(path, chunksize=self.chunksize, dtype=str, keep_default_na=False):
+            yield from frame.to_dict("records")
+
+    def to_document(self, row: dict, post: dict) -> dict:
+        conversation = self.builder.build(post)["conversation"]
+        return {
+            "text": conversation,
+            "source": SOURCE,
+            "course": self.course_id,
+            "post_id": str(post["post_id"]),
+            "title": post["title"],
+            "folders": parse_folders(row.get("Folder Name")),
+            "created": row.get("Post Created Date"),
+            "term": term_of(row.get("Post Created Date")),
+            "content_hash": content_hash(conversation),
+        }
+
+    def _flush(self, batch: list, stats: dict):
+        from pymongo import UpdateOne
+
+        vectors = self.embedding.embed_documents([doc["text"] for doc in batch])
+        # Vectors of a re-embedding in progress are cleared, the job embeds the new text again
+        # Lets `mirror.IndexMirror` find changed documents when change streams are unavailable
+        now = datetime.now(timezone.utc)
+        unset = {"$unset": {field: "" for field in self.stale_fields}} if self.stale_fields else {}
+        operations = [
+            UpdateOne(
+                {"source": SOURCE, "course": self.course_id, "post_id": doc["post_id"]},
+                {"$set": {**doc, self.version.field: vector, "updated_at": now}, **unset},
+                upsert=True,
+            )
+            for doc, vector in zip(batch, vectors)
+        ]
+        result = self.collection.bulk_write(operations, ordered=False)
+        stats["embedded"] += len(batch)
+        stats["inserted"] += result.upserted_count
+        stats["updated"] += result.modified_count
+
+    def run(self, path: str) -> dict:
+        """
+        Ingests one scrape file.
+
+        Returns:
+            dict: Per-run statistics: rows read, resolved threads, unchanged threads skipped, documents embedded,
+            inserted and updated, elapsed seconds and rows/documents per second.
+        """
+        start = time.perf_counter()
+        stats = {"rows": 0, "resolved": 0, "unchanged": 0, "embedded": 0, "inserted": 0, "updated": 0, "errors": 0}
+        known = self.existing_hashes()
+
+        batch = []
+        for row in self.iter_rows(path):
+            stats["rows"] += 1
+            try:
+                post = row_to_post(row)
+            except (KeyError, ValueError) as e:
+                stats["errors"] += 1
+                logger.warning("Skipping post %s: %s", row.get("Post ID"), e)
+                continue
+            if not is_resolved(post):
+                continue
+            stats["resolved"] += 1
+
+            doc = self.to_document(row, post)
+            if known.get(doc["post_id"]) == doc["content_hash"]:
+                stats["unchanged"] += 1
+                continue
+
+            batch.append(doc)
+            if len(batch) >= self.embed_batch_size:
+                self._flush(batch, stats)
+                batch = []
+        if batch:
+            self._flush(batch, stats)
+
+        elapsed = time.perf_counter() - start
+        stats["seconds"] = round(elapsed, 3)
+        stats["rows_per_sec"] = round(stats["rows"] / max(elapsed, 1e-9), 1)
+        stats["embedded_per_sec"] = round(stats["embedded"] / max(elapsed, 1e-9), 1)
+        logger.info("Piazza ingestion of %s for %s: %s", path, self.course_id, stats)
+        return stats
+
+
+if __name__ == "__main__":
+    PiazzaIngester(course_id=sys.argv[2]).run(sys.argv[1])
@@ -1,17 +1,22 @@
 import csv
 import json
+import os
 import sys
-import time
 import re
 
 from piazza_api import Piazza
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "virtual_ta", "agent"))
+
+from quota import get_coordinator
+
 
 def scraping(course_id, path_to_csv):
     p = Piazza()
     p.user_login()
     course = p.network(course_id)
 
+    quota = get_coordinator()
     posts = course.iter_all_posts(limit=1000)
     fieldnames = ["Post ID", "Post Created Date", "Post Title", "Folder Name", "Post Content", "Child Content"]
 
@@ -50,7 +55,9 @@ def scraping(course_id, path_to_csv):
                             nested_child_content_values["content"] = re.sub(
                                 r"<[^>]*>", "", nested_child.get("subject", "")
                             )
-                            child_content[f"Nested Child {nested_child_idx}"] = nested_child_content_values
+                            # Keyed by parent index too, otherwise nested children of later children overwrite
+                            # those of earlier ones in `child_content_combined`
+                            child_content[f"Nested Child {idx}.{nested_child_idx}"] = nested_child_content_values
 
                     child_content_combined.update(child_content)
 
@@ -65,8 +72,10 @@ def scraping(course_id, path_to_csv):
                 }
             )
 
-            time.sleep(1)
+            # Each post is fetched when the iterator advances, so this paces the requests against the shared budget
+            quota.acquire("piazza")
     print("Data saved successfully!")
 
 
-scraping(sys.argv[1], sys.argv[2])
+if __name__ == "__main__":
+    scraping(sys.argv[1], sys.argv[2])
@@ -0,0 +1,382 @@
+from typing import Callable, Iterable, List, Sequence
+
+import numpy as np
+from bson.binary import Binary
+
+# Field names written next to the full-precision `embedding` array of a chunk document
+QUANTIZED_FIELD = "embedding_q"
+SCALE_FIELD = "embedding_scale"
+DTYPE_FIELD = "embedding_dtype"
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes rows so that dot products are cosine similarities.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray, dtype: str = "int8"):
+    """
+    Scalar-quantizes a batch of vectors.
+
+    Args:
+        vectors (np.ndarray): Array of shape (n, dim).
+        dtype (str): One of "float32", "float16" or "int8". int8 uses a symmetric per-vector scale.
+
+    Returns:
+        tuple: The quantized array and the per-vector scales (ones for float types).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype}, expected one of {SUPPORTED_DTYPES}")
+
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=-1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[..., None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(dtype), np.ones(vectors.shape[:-1], dtype=np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[..., None]
+
+
+def quantized_fields(field: str = "embedding") -> tuple:
+    """
+    Names of the packed codes, scale and dtype fields of the embedding array `field`. Every embedding version has its
+    own, so that the codes of a model being backfilled never replace those of the active one.
+    """
+    if field == "embedding":
+        return QUANTIZED_FIELD, SCALE_FIELD, DTYPE_FIELD
+    return f"{field}_q", f"{field}_scale", f"{field}_dtype"
+
+
+def active_field() -> str:
+    """
+    Embedding field of the active `EmbeddingVersion`.
+    """
+    from vector_search import get_versions
+
+    return get_versions().active().field
+
+
+def pack_vector(vector: Sequence[float], dtype: str = "int8", field: str = "embedding") -> dict:
+    """
+    Packs one embedding of `field` into BSON-ready fields: the raw little-endian bytes as `Binary`, its scale and
+    dtype.
+    """
+    codes_field, scale_field, dtype_field = quantized_fields(field)
+    codes, scales = quantize(np.asarray(vector, dtype=np.float32)[None, :], dtype=dtype)
+    return {
+        codes_field: Binary(codes[0].astype(codes.dtype.newbyteorder("<")).tobytes()),
+        scale_field: float(scales[0]),
+        dtype_field: dtype,
+    }
+
+
+def unpack_vector(doc: dict, field: str = "embedding") -> np.ndarray:
+    """
+    Restores the float32 approximation of an embedding of `field` packed by `pack_vector`.
+    """
+    codes_field, scale_field, dtype_field = quantized_fields(field)
+    dtype = np.dtype(doc[dtype_field]).newbyteorder("<")
+    codes = np.frombuffer(doc[codes_field], dtype=dtype)
+    return codes.astype(np.float32) * np.float32(doc[scale_field])
+
+
+def quantize_document(doc: dict, field: str = "embedding", dtype: str = "int8", keep_full: bool = True) -> dict:
+    """
+    Adds packed quantized fields to a chunk document.
+
+    Args:
+        doc (dict): The document holding the full-precision `field`.
+        field (str): Name of the embedding array field.
+        dtype (str): Quantization type.
+        keep_full (bool): Keep the original array, needed by Atlas Vector Search and for rescoring.
+
+    Returns:
+        dict: The updated document.
+    """
+    doc.update(pack_vector(doc[field], dtype=dtype, field=field))
+    if not keep_full:
+        doc.pop(field)
+    return doc
+
+
+class ProductQuantizer:
+    """
+    Product quantizer splitting vectors into `m` sub-vectors, each encoded by the index of its nearest of `k`
+    centroids. With k=256 every sub-vector costs one byte.
+    """
+
+    def __init__(self, m: int = 96, k: int = 256, iterations: int = 20, seed: int = 0):
+        self.m = m
+        self.k = k
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None
+
+    def fit(self, vectors: np.ndarray) -> "ProductQuantizer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if dim % self.m:
+            raise ValueError(f"Dimension {dim} is not divisible by m={self.m}")
+        rng = np.random.default_rng(self.seed)
+        sub_dim = dim // self.m
+        k = min(self.k, n)
+
+        self.codebooks = np.empty((self.m, k, sub_dim), dtype=np.float32)
+        for j in range(self.m):
+            sub = vectors[:, j * sub_dim : (j + 1) * sub_dim]
+            centroids = sub[rng.choice(n, size=k, replace=False)]
+            for _ in range(self.iterations):
+                assignment = self._nearest(sub, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sub)
+                counts = np.bincount(assignment, minlength=k)[:, None]
+                centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            self.codebooks[j] = centroids
+        return self
+
+    @staticmethod
+    def _nearest(sub: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (sub**2).sum(1)[:, None] - 2 * sub @ centroids.T + (centroids**2).sum(1)[None, :]
+        return distances.argmin(1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = self._nearest(vectors[:, j * sub_dim : (j + 1) * sub_dim], self.codebooks[j])
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Asymmetric dot-product scores of a full-precision query against encoded vectors.
+        """
+        sub_dim = self.codebooks.shape[2]
+        query = np.asarray(query, dtype=np.float32).reshape(self.m, sub_dim)
+        # (m, k) lookup table of sub-query/centroid dot products
+        table = np.einsum("md,mkd->mk", query, self.codebooks)
+        return table[np.arange(self.m), codes].sum(1)
+
+
+class QuantizedIndex:
+    """
+    In-memory nearest-neighbour index over quantized embeddings with full-precision rescoring.
+
+    Candidates are found by scanning the compact quantized matrix; only the `rescore_factor * k` best candidates
+    are then rescored with full-precision vectors, obtained from `full_vectors` or the `fetch_full` callback (e.g.
+    a MongoDB `find` on the candidate ids).
+
+    When documents are added with their metadata, searches can be restricted to a filter: the matching rows are
+    looked up in a `filters.MetadataIndex` first and only those are scanned.
+    """
+
+    def __init__(
+        self,
+        dtype: str = "int8",
+        product_quantizer: ProductQuantizer = None,
+        fetch_full: Callable[[List], np.ndarray] = None,
+        block_size: int = 16384,
+    ):
+        self.dtype = dtype
+        self.block_size = block_size
+        self.pq = product_quantizer
+        self.fetch_full = fetch_full
+        self.ids = []
+        self.codes = None
+        self.scales = None
+        self.full_vectors = None
+        self.metadata = None
+
+    def add(self, ids: Iterable, vectors: np.ndarray, keep_full: bool = None, metadata: Iterable[dict] = None):
+        """
+        Adds vectors to the index. They are normalized so that scores are cosine similarities.
+
+        Args:
+            ids (Iterable): Document ids of the vectors.
+            vectors (np.ndarray): Array of shape (n, dim).
+            keep_full (bool): Keep float32 copies in memory for rescoring. Defaults to True unless `fetch_full` is set.
+            metadata (Iterable[dict]): Filter fields of each vector, see `filters.FILTER_FIELDS`.
+        """
+        vectors = normalize(vectors)
+        keep_full = self.fetch_full is None if keep_full is None else keep_full
+
+        if self.pq is not None:
+            if self.pq.codebooks is None:
+                self.pq.fit(vectors)
+            codes, scales = self.pq.encode(vectors), np.ones(len(vectors), dtype=np.float32)
+        else:
+            codes, scales = quantize(vectors, dtype=self.dtype)
+
+        self.ids.extend(ids)
+        self.codes = codes if self.codes is None else np.concatenate([self.codes, codes])
+        self.scales = scales if self.scales is None else np.concatenate([self.scales, scales])
+        if keep_full:
+            self.full_vectors = vectors if self.full_vectors is None else np.concatenate([self.full_vectors, vectors])
+        if metadata is not None:
+            self._add_metadata(metadata, len(vectors))
+        elif self.metadata is not None:
+            self.metadata.add({} for _ in range(len(vectors)))
+
+    def _add_metadata(self, metadata: Iterable[dict], count: int):
+        from filters import MetadataIndex
+
+        if self.metadata is None:
+            self.metadata = MetadataIndex()
+            # Rows added before any metadata match no filter
+            self.metadata.add({} for _ in range(len(self.ids) - count))
+        self.metadata.add(metadata)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes held by the quantized codes and scales (excluding full-precision copies).
+        """
+        if self.codes is None:
+            return 0
+        return self.codes.nbytes + self.scales.nbytes
+
+    def approximate_scores(self, query: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """
+        Approximate scores of every vector, or of the given rows only.
+        """
+        if self.codes is None:
+            return np.empty(0, dtype=np.float32)
+        if self.pq is not None:
+            return self.pq.scores(query, self.codes if rows is None else self.codes[rows])
+        n = len(self.codes) if rows is None else len(rows)
+        # Scan in blocks so the float32 working copy stays small however large the index grows
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, self.block_size):
+            if rows is None:
+                block = self.codes[start : start + self.block_size]
+            else:
+                block = self.codes[rows[start : start + self.block_size]]
+            scores[start : start + self.block_size] = block.astype(np.float32) @ query
+        return scores * (self.scales if rows is None else self.scales[rows])
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 10,
+        rescore: bool = True,
+        rescore_factor: int = 4,
+        filter: dict = None,
+    ) -> list:
+        """
+        Returns the `k` best (id, score) pairs for a query vector.
+
+        Args:
+            filter (dict): Only consider documents matching {field: value or list of values}, see
+                `filters.MetadataIndex.ids`. Needs the metadata to have been added with the vectors.
+        """
+        if self.codes is None:
+            return []
+        query = normalize(np.asarray(query, dtype=np.float32))
+        rows = None
+        if filter:
+            if self.metadata is None:
+                raise ValueError("Filtering needs the metadata of the vectors, pass it to add()")
+            rows = self.metadata.ids(filter)
+            if rows is not None and not len(rows):
+                return []
+        scores = self.approximate_scores(query, rows)
+
+        n_candidates = min(len(scores), k * rescore_factor if rescore else k)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        if rows is not None:
+            scores, candidates = scores[candidates], rows[candidates]
+            positions = np.arange(len(candidates))
+        else:
+            positions = candidates
+
+        if rescore:
+            if self.full_vectors is not None:
+                full = self.full_vectors[candidates]
+            elif self.fetch_full is not None:
+                full = normalize(self.fetch_full([self.ids[i] for i in candidates]))
+            else:
+                raise ValueError("Rescoring needs full vectors in memory or a fetch_full callback")
+            candidate_scores = full @ query
+        else:
+            candidate_scores = scores[positions]
+
+        order = np.argsort(-candidate_scores)[:k]
+        return [(self.ids[candidates[i]], float(candidate_scores[i])) for i in order]
+
+
+def load_index(collection, dtype: str = "int8", field: str = None, query: dict = None) -> QuantizedIndex:
+    """
+    Builds a `QuantizedIndex` from the packed fields of a collection, with the filter fields of every document.
+    Full-precision vectors are not loaded; they are fetched from the collection for the rescoring candidates only.
+
+    Args:
+        field (str): Embedding field whose packed codes are loaded, defaults to the field of the active version.
+    """
+    field = field or active_field()
+    codes_field, _, dtype_field = quantized_fields(field)
+
+    def fetch_full(ids):
+        docs = {doc["_id"]: doc[field] for doc in collection.find({"_id": {"$in": ids}}, {field: 1})}
+        return np.asarray([docs[i] for i in ids], dtype=np.float32)
+
+    from filters import FILTER_FIELDS, MetadataIndex
+
+    index = QuantizedIndex(dtype=dtype, fetch_full=fetch_full)
+    ids, codes, metadata = [], [], MetadataIndex()
+    projection = {codes_field: 1, **{name: 1 for name in FILTER_FIELDS}}
+    cursor = collection.find({**(query or {}), dtype_field: dtype}, projection)
+    for doc in cursor:
+        ids.append(doc["_id"])
+        codes.append(np.frombuffer(doc[codes_field], dtype=np.dtype(dtype).newbyteorder("<")))
+        metadata.add([doc])
+
+    if ids:
+        index.ids = ids
+        index.metadata = metadata
+        index.codes = np.stack(codes)
+        # Stored vectors are not normalized; fold each row's norm into its scale so scores are cosine similarities
+        norms = np.concatenate(
+            [
+                np.linalg.norm(index.codes[start : start + index.block_size].astype(np.float32), axis=1)
+                for start in range(0, len(index.codes), index.block_size)
+            ]
+        )
+        index.scales = (1.0 / np.maximum(norms, 1e-12)).astype(np.float32)
+    return index
+
+
+def backfill_quantized(collection, dtype: str = "int8", field: str = None, batch_size: int = 500) -> int:
+    """
+    Adds packed quantized fields to every document of the collection that does not have them yet.
+
+    Args:
+        field (str): Embedding field to pack, defaults to the field of the active version.
+
+    Returns:
+        int: The number of updated documents.
+    """
+    from pymongo import UpdateOne
+
+    field = field or active_field()
+    dtype_field = quantized_fields(field)[2]
+    updated = 0
+    batch = []
+    cursor = collection.find({field: {"$exists": True}, dtype_field: {"$ne": dtype}}, {field: 1})
+    for doc in cursor:
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": pack_vector(doc[field], dtype=dtype, field=field)}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
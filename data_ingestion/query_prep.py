@@ -0,0 +1,201 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+# One exception or compiler/runtime error per match: "ValueError: ...", "error: ...", "Segmentation fault"
+ERROR_LINE = re.compile(
+    r"^\s*(?:[\w.]*(?:Error|Exception|Warning)\b.*|(?:fatal )?error\b.*|.*Segmentation fault.*|.*Traceback \(most.*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+SENTENCE = re.compile(r"[^.!?\n]+[.!?]?")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _clean(text: str) -> str:
+    return WHITESPACE.sub(" ", text or "").strip()
+
+
+def extract_error_messages(text: str, limit: int = 2) -> List[str]:
+    """
+    Returns the distinct error lines of a post, last ones first since the final line of a traceback names the error.
+    """
+    errors = []
+    for line in reversed(ERROR_LINE.findall(text or "")):
+        line = _clean(line)
+        if line.lower().startswith("traceback") or line in errors:
+            continue
+        errors.append(line)
+        if len(errors) == limit:
+            break
+    return errors
+
+
+def extract_core_question(text: str, max_chars: int = 400) -> str:
+    """
+    Returns the sentences of a post that ask something, or its opening sentences when none ends with "?".
+    Lines of code and error output are skipped.
+    """
+    prose = "\n".join(line for line in (text or "").splitlines() if not ERROR_LINE.match(line))
+    sentences = [_clean(s) for s in SENTENCE.findall(prose)]
+    sentences = [s for s in sentences if len(s) > 3]
+    questions = [s for s in sentences if s.endswith("?")] or sentences[:2]
+
+    core = ""
+    for sentence in questions:
+        if core and len(core) + len(sentence) + 1 > max_chars:
+            break
+        core = f"{core} {sentence}".strip()
+    return core[:max_chars]
+
+
+def extract_subqueries(post, max_subqueries: int = 4, max_chars: int = 400) -> List[dict]:
+    """
+    Splits a Piazza question into short, focused retrieval queries instead of embedding the whole thread.
+
+    Args:
+        post: A parsed post from `PiazzaBot.parse_post_data` or `piazza_ingest.row_to_post`, or plain question text.
+        max_subqueries (int): Maximum number of sub-queries. Keeping it at or below the embedding batch size lets all
+            of them be embedded in a single request.
+        max_chars (int): Maximum length of each sub-query.
+
+    Returns:
+        list: Dicts with "kind" ("title", "question", "error" or "followup") and "text", most important first and
+        without duplicates.
+    """
+    if isinstance(post, str):
+        post = {"title": "", "content_text": post, "answers": {"followup": []}}
+
+    title = _clean(post.get("title"))
+    content = post.get("content_text") or ""
+    candidates = [("title", title), ("question", extract_core_question(content, max_chars))]
+    candidates += [("error", error) for error in extract_error_messages(content)]
+
+    # The latest open follow-up is often the actual question when a thread is revived
+    followups = post.get("answers", {}).get("followup", [])
+    if followups and not followups[-1].get("feedback"):
+        candidates.append(("followup", extract_core_question(followups[-1].get("subject", ""), max_chars)))
+
+    subqueries, seen = [], set()
+    for kind, text in candidates:
+        text = text[:max_chars]
+        if not text or text.lower() in seen:
+            continue
+        seen.add(text.lower())
+        subqueries.append({"kind": kind, "text": text})
+    if not subqueries and content:
+        subqueries.append({"kind": "question", "text": _clean(content)[:max_chars]})
+    return subqueries[:max_subqueries]
+
+
+def document_key(doc: dict):
+    for field in ("_id", "chunk_id", "content_hash"):
+        if doc.get(field) is not None:
+            return doc[field]
+    return doc.get("text")
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], k: int = 10, weights: List[float] = None, c: int = 60):
+    """
+    Merges ranked result lists by reciprocal rank fusion, deduplicating documents by `document_key`.
+
+    Each merged document gets "fused_score" and "matched", the indexes of the lists it appeared in, and keeps the best
+    "score" it had in any list.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    merged = {}
+    for list_index, (results, weight) in enumerate(zip(result_lists, weights)):
+        for rank, doc in enumerate(results):
+            key = document_key(doc)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {**doc, "fused_score": 0.0, "matched": []}
+            elif doc.get("score", 0) > entry.get("score", 0):
+                entry["score"] = doc["score"]
+            entry["fused_score"] += weight / (c + rank + 1)
+            entry["matched"].append(list_index)
+    return sorted(merged.values(), key=lambda doc: doc["fused_score"], reverse=True)[:k]
+
+
+class SubQueryRetriever:
+    """
+    Retrieves course material for a Piazza question with several focused sub-queries: they are embedded together in
+    one `embed_documents` call, searched concurrently and merged by reciprocal rank fusion.
+    """
+
+    def __init__(
+        self,
+        embedding=None,
+        search: Callable = None,
+        k: int = 10,
+        per_query_k: int = None,
+        max_subqueries: int = 4,
+        weights: dict = None,
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            embedding: Object with `embed_documents`, defaults to `vector_search.get_embedding()`.
+            search (Callable): Called with (vector, k, pre_filter), returns ranked documents. Defaults to
+                `vector_search.search_by_vector`.
+            k (int): Number of merged documents returned.
+            per_query_k (int): Documents retrieved per sub-query, defaults to k.
+            max_subqueries (int): Maximum sub-queries per question.
+            weights (dict): Fusion weight per sub-query kind, missing kinds weigh 1.
+            max_workers (int): Concurrent searches.
+        """
+        if embedding is None:
+            from vector_search import get_embedding
+
+            embedding = get_embedding()
+        if search is None:
+            # Takes (vector, k, pre_filter) positionally
+            from vector_search import search_by_vector as search
+
+        self.embedding = embedding
+        self.search = search
+        self.k = k
+        self.per_query_k = per_query_k or k
+        self.max_subqueries = max_subqueries
+        self.weights = weights or {"title": 1.0, "question": 1.0, "error": 1.2, "followup": 0.8}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="subquery-search")
+
+    def retrieve_with_timings(self, post, pre_filter: dict = None):
+        """
+        Returns:
+            tuple: The merged documents, the sub-queries, and the time spent preparing, embedding and searching
+            in seconds.
+        """
+        start = time.perf_counter()
+        subqueries = extract_subqueries(post, max_subqueries=self.max_subqueries)
+        prepared = time.perf_counter()
+
+        vectors = self.embedding.embed_documents([subquery["text"] for subquery in subqueries]) if subqueries else []
+        embedded = time.perf_counter()
+
+        searches = [self._executor.submit(self.search, vector, self.per_query_k, pre_filter) for vector in vectors]
+        result_lists = [future.result() for future in searches]
+        weights = [self.weights.get(subquery["kind"], 1.0) for subquery in subqueries]
+        documents = reciprocal_rank_fusion(result_lists, k=self.k, weights=weights)
+        searched = time.perf_counter()
+
+        for doc in documents:
+            doc["matched"] = [subqueries[i]["kind"] for i in doc["matched"]]
+        timings = {
+            "prepare": prepared - start,
+            "embed": embedded - prepared,
+            "search": searched - embedded,
+            "total": searched - start,
+        }
+        logger.debug("Retrieved %d documents for %d sub-queries in %s", len(documents), len(subqueries), timings)
+        return documents, subqueries, timings
+
+    def retrieve(self, post, pre_filter: dict = None) -> List[dict]:
+        return self.retrieve_with_timings(post, pre_filter=pre_filter)[0]
+
+    def close(self):
+        self._executor.shutdown()
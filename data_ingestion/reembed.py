@@ -0,0 +1,319 @@
+import re
+import sys
+import time
+from typing import Callable, List
+
+from db import ATLAS_VECTOR_SEARCH_INDEX_NAME
+from pydantic import BaseModel, ConfigDict
+from quantization import pack_vector, quantized_fields
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+# Collection of `main_db` holding the active embedding version and the state of re-embedding jobs
+VERSIONS_COLLECTION = "embedding_versions"
+ACTIVE_ID = "active"
+
+
+class EmbeddingVersion(BaseModel):
+    """
+    An embedding model together with the document field its vectors are stored in and the Atlas vector index over
+    that field. Vectors of different models live side by side in different fields.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    model: str
+    field: str = "embedding"
+    index: str = ATLAS_VECTOR_SEARCH_INDEX_NAME
+
+    @classmethod
+    def for_model(cls, model: str) -> "EmbeddingVersion":
+        slug = re.sub(r"[^0-9a-zA-Z]+", "_", model).strip("_").lower()
+        return cls(model=model, field=f"embedding_{slug}", index=f"{ATLAS_VECTOR_SEARCH_INDEX_NAME}_{slug}")
+
+
+# The model every existing document was embedded with
+DEFAULT_VERSION = EmbeddingVersion(model="textembedding-gecko@003")
+
+
+class VersionRegistry:
+    """
+    Active embedding version, shared by every process through a control document. Reads are cached for `ttl`
+    seconds, so processes pick up a switch within that delay; both fields stay populated meanwhile.
+    """
+
+    def __init__(self, collection, ttl: float = 30.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._active = None
+        self._read_at = 0.0
+
+    def active(self) -> EmbeddingVersion:
+        if self._active is None or time.monotonic() - self._read_at > self.ttl:
+            doc = self.collection.find_one({"_id": ACTIVE_ID})
+            self._active = EmbeddingVersion(**{k: v for k, v in doc.items() if k != "_id"}) if doc else DEFAULT_VERSION
+            self._read_at = time.monotonic()
+        return self._active
+
+    def switch(self, version: EmbeddingVersion, expected: EmbeddingVersion = None) -> bool:
+        """
+        Atomically makes `version` the active one, only if `expected` (when given) still is.
+
+        Returns:
+            bool: False when another version became active in the meantime.
+        """
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        query = {"_id": ACTIVE_ID}
+        if expected is not None:
+            query["model"] = expected.model
+        try:
+            self.collection.find_one_and_update(
+                query,
+                {"$set": version.model_dump()},
+                # The control document does not exist until the first switch away from the default version
+                upsert=expected is None or expected == DEFAULT_VERSION,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return False
+        self._active, self._read_at = None, 0.0
+        switched = self.active() == version
+        if switched:
+            logger.info("Retrieval switched to %s (field %s)", version.model, version.field)
+        return switched
+
+    def pending(self) -> List[EmbeddingVersion]:
+        """
+        Versions being backfilled by a job that has not switched retrieval yet. Writers must write or clear their
+        field too, so that the job does not keep vectors of outdated text.
+        """
+        jobs = self.collection.find({"_id": {"$regex": "^job:"}, "status": {"$ne": "switched"}}, {"target": 1})
+        return [EmbeddingVersion(**job["target"]) for job in jobs if "target" in job]
+
+    def job_state(self, model: str) -> dict:
+        return self.collection.find_one({"_id": f"job:{model}"}) or {}
+
+    def save_job_state(self, model: str, **fields):
+        self.collection.update_one({"_id": f"job:{model}"}, {"$set": fields}, upsert=True)
+
+
+def wait_until_queryable(collection, name: str, timeout: float = 600, interval: float = 10) -> bool:
+    """
+    Waits for an Atlas search index to finish its initial build.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for index in collection.aggregate([{"$listSearchIndexes": {"name": name}}]):
+            if index.get("queryable"):
+                return True
+        time.sleep(interval)
+    return False
+
+
+class ReembedJob:
+    """
+    Background job embedding every document of the knowledge base with a new model, alongside the vectors of the
+    active one, then switching retrieval over.
+
+    The collection is walked in `_id` order in batches; the last `_id` written is checkpointed after every batch, so
+    a stopped job resumes where it left off. Documents inserted behind the walk are caught up by a final pass over
+    those still missing the new field. Retrieval switches only once the coverage reaches `min_coverage` and the new
+    vector index is queryable.
+
+    Throttling: at most `docs_per_second`, and the job pauses while the shared "vertex-embedding" quota is used
+    above `max_utilization`, leaving the rest to live retrieval.
+
+    When the vectors of the active version are also packed for `quantization.load_index`, the new vectors are packed
+    with the same dtype into the quantized fields of the target, so the local index is ready at the switch.
+    """
+
+    def __init__(
+        self,
+        collection,
+        target: EmbeddingVersion,
+        registry: VersionRegistry,
+        embed: Callable[[List[str]], List[List[float]]] = None,
+        batch_size: int = 50,
+        docs_per_second: float = None,
+        quota=None,
+        max_utilization: float = 0.5,
+        text_key: str = "text",
+        min_coverage: float = 1.0,
+        create_index: bool = True,
+        quantized_dtype: str = None,
+    ):
+        """
+        Args:
+            collection: The knowledge base collection.
+            target (EmbeddingVersion): The version to embed with.
+            registry (VersionRegistry): Where the active version and the job state are kept.
+            embed (Callable): Embeds a batch of texts, defaults to the `EmbeddingClient` of the target model.
+            batch_size (int): Documents per batch and checkpoint.
+            docs_per_second (float): Upper bound of the embedding rate, unbounded when None.
+            quota: `QuotaCoordinator` whose utilization pauses the job, none when None.
+            max_utilization (float): Utilization of the "vertex-embedding" quota above which the job waits.
+            text_key (str): Field holding the text that was embedded.
+            min_coverage (float): Fraction of the documents embedded with the target needed to switch.
+            create_index (bool): Create the Atlas vector index of the target field and wait for it before switching.
+            quantized_dtype (str): Dtype the new vectors are packed with, defaults to the one of the active version's
+                packed vectors; not packed when those do not exist either.
+        """
+        self.collection = collection
+        self.target = target
+        self.registry = registry
+        self.embed = embed
+        self.batch_size = batch_size
+        self.docs_per_second = docs_per_second
+        self.quota = quota
+        self.max_utilization = max_utilization
+        self.text_key = text_key
+        self.min_coverage = min_coverage
+        self.create_index = create_index
+        self.quantized_dtype = quantized_dtype
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.embed is None:
+            from vector_search import get_embedding
+
+            self.embed = get_embedding(self.target.model).embed_documents
+        return self.embed(texts)
+
+    def _wait_for_quota(self):
+        if self.quota is None:
+            return
+        while True:
+            usage = self.quota.utilization().get("vertex-embedding", {})
+            if (usage.get("utilization") or 0) <= self.max_utilization and not usage.get("blocked_for"):
+                return
+            time.sleep(1.0)
+
+    def _packed_dtype(self, version: EmbeddingVersion) -> str:
+        dtype_field = quantized_fields(version.field)[2]
+        doc = self.collection.find_one({dtype_field: {"$exists": True}}, {dtype_field: 1})
+        return doc[dtype_field] if doc else None
+
+    @property
+    def _embeddable(self) -> dict:
+        return {self.text_key: {"$type": "string", "$ne": ""}}
+
+    def coverage(self) -> tuple:
+        """
+        Returns:
+            tuple: Documents embedded with the target and documents to embed.
+        """
+        total = self.collection.count_documents(self._embeddable)
+        done = self.collection.count_documents({**self._embeddable, self.target.field: {"$exists": True}})
+        return done, total
+
+    def progress(self) -> dict:
+        state = self.registry.job_state(self.target.model)
+        done, total = self.coverage()
+        rate = state.get("embedded", 0) / state["seconds"] if state.get("seconds") else None
+        return {
+            "model": self.target.model,
+            "status": state.get("status", "pending"),
+            "done": done,
+            "total": total,
+            "coverage": done / total if total else 1.0,
+            "docs_per_second": rate,
+            "eta_seconds": (total - done) / rate if rate else None,
+        }
+
+    def run(self, max_batches: int = None, switch: bool = True) -> dict:
+        """
+        Embeds the documents missing the target field, resuming from the last checkpoint.
+
+        Args:
+            max_batches (int): Stop after this many batches, e.g. to run in a nightly window.
+            switch (bool): Switch retrieval to the target once complete.
+
+        Returns:
+            dict: The progress, see `progress`.
+        """
+        from pymongo import UpdateOne
+
+        from filters import ensure_vector_index
+
+        previous = self.registry.active()
+        state = self.registry.job_state(self.target.model)
+        last_id, embedded, seconds = state.get("last_id"), state.get("embedded", 0), state.get("seconds", 0.0)
+        index_created = state.get("index_created", False)
+        dtype = self.quantized_dtype or self._packed_dtype(previous)
+        self.registry.save_job_state(
+            self.target.model, status="running", previous=previous.model, target=self.target.model_dump()
+        )
+
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            query = {**self._embeddable, self.target.field: {"$exists": False}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = list(self.collection.find(query, {self.text_key: 1}).sort("_id", 1).limit(self.batch_size))
+            if not docs:
+                if last_id is None:
+                    break
+                # Catch up with documents inserted behind the walk
+                last_id = None
+                continue
+
+            self._wait_for_quota()
+            start = time.monotonic()
+            vectors = self._embed([doc[self.text_key] for doc in docs])
+            updates = []
+            for doc, vector in zip(docs, vectors):
+                fields = {self.target.field: list(vector)}
+                if dtype:
+                    fields.update(pack_vector(vector, dtype=dtype, field=self.target.field))
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            self.collection.bulk_write(updates, ordered=False)
+            if self.create_index and not index_created:
+                ensure_vector_index(self.collection, len(vectors[0]), name=self.target.index, path=self.target.field)
+                index_created = True
+
+            if self.docs_per_second:
+                time.sleep(max(0.0, len(docs) / self.docs_per_second - (time.monotonic() - start)))
+            last_id, embedded, batches = docs[-1]["_id"], embedded + len(docs), batches + 1
+            seconds += time.monotonic() - start
+            self.registry.save_job_state(
+                self.target.model, last_id=last_id, embedded=embedded, seconds=seconds, index_created=index_created
+            )
+            if batches % 20 == 0:
+                progress = self.progress()
+                logger.info(
+                    "Re-embedding with %s: %d/%d (%.1f%%), %.1f docs/s, ETA %.0fs",
+                    self.target.model,
+                    progress["done"],
+                    progress["total"],
+                    100 * progress["coverage"],
+                    progress["docs_per_second"] or 0,
+                    progress["eta_seconds"] or 0,
+                )
+
+        progress = self.progress()
+        complete = progress["coverage"] >= self.min_coverage
+        if complete and switch and previous != self.target:
+            if self.create_index and not wait_until_queryable(self.collection, self.target.index):
+                logger.warning("Index %s is not queryable yet, not switching", self.target.index)
+            elif not self.registry.switch(self.target, expected=previous):
+                logger.warning("Active version changed during the job, not switching to %s", self.target.model)
+        status = "switched" if self.registry.active() == self.target else "complete" if complete else "paused"
+        self.registry.save_job_state(self.target.model, status=status)
+        return {**progress, "status": status}
+
+
+if __name__ == "__main__":
+    from db import MONGODB_COLLECTION
+    from vector_search import get_quota, get_versions
+
+    # python reembed.py <model> [docs per second]
+    job = ReembedJob(
+        MONGODB_COLLECTION,
+        EmbeddingVersion.for_model(sys.argv[1]),
+        get_versions(),
+        docs_per_second=float(sys.argv[2]) if len(sys.argv) > 2 else None,
+        quota=get_quota(),
+    )
+    print(job.run())
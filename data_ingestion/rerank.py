@@ -0,0 +1,220 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+TOKEN = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or so that the this to what when "
+    "where which why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def document_text(doc) -> str:
+    """
+    Text of a langchain `Document` or of a document dict from `vector_search.search_by_vector`.
+    """
+    return doc.page_content if hasattr(doc, "page_content") else doc.get("text", "")
+
+
+def document_score(doc) -> float:
+    """
+    Similarity score given by the vector search, 0 when unknown.
+    """
+    if hasattr(doc, "metadata"):
+        return float(doc.metadata.get("score", 0.0))
+    return float(doc.get("score", 0.0))
+
+
+class LexicalReranker:
+    """
+    Cheap CPU scorer: BM25 over the candidate set, computed as one term-frequency matrix per query, blended with the
+    vector search score so that chunks sharing the rare words of the question move up.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, vector_weight: float = 0.5):
+        """
+        Args:
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 length normalization.
+            vector_weight (float): Weight of the normalized vector search score, the BM25 score gets the rest.
+        """
+        self.k1 = k1
+        self.b = b
+        self.vector_weight = vector_weight
+
+    def score(self, query: str, docs: list) -> np.ndarray:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not docs:
+            return np.zeros(0, dtype=np.float32)
+
+        counts = [Counter(tokenize(document_text(doc))) for doc in docs]
+        tf = np.array([[count[term] for term in terms] for count in counts], dtype=np.float32).reshape(
+            len(docs), len(terms)
+        )
+        lengths = np.array([sum(count.values()) for count in counts], dtype=np.float32)
+
+        df = (tf > 0).sum(axis=0)
+        idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        bm25 = (tf * (self.k1 + 1) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+        vector = np.array([document_score(doc) for doc in docs], dtype=np.float32)
+        if not vector.any():
+            # No similarity scores, fall back on the retrieval order
+            vector = np.linspace(1.0, 0.0, len(docs), dtype=np.float32)
+        return self.vector_weight * _minmax(vector) + (1 - self.vector_weight) * _minmax(bm25)
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min() if len(values) else 0
+    return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+
+class CrossEncoderReranker:
+    """
+    Scores (question, chunk) pairs with a small cross-encoder exported to ONNX, e.g. ms-marco-MiniLM-L-6-v2, on CPU
+    with onnxruntime. The model and its `tokenizers` tokenizer are loaded on first use.
+    """
+
+    def __init__(self, model_path: str, tokenizer: str, max_length: int = 256, threads: int = None):
+        """
+        Args:
+            model_path (str): Path of the ONNX model, with `input_ids`, `attention_mask` and optionally
+                `token_type_ids` inputs and relevance logits as first output.
+            tokenizer (str): Path of a `tokenizer.json` or name of a Hugging Face tokenizer.
+            max_length (int): Maximum tokens of a pair, longer chunks are truncated.
+            threads (int): Intra-op threads of onnxruntime, defaults to its own choice.
+        """
+        self.model_path = model_path
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            options = ort.SessionOptions()
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+
+            if self.tokenizer.endswith(".json"):
+                tokenizer = Tokenizer.from_file(self.tokenizer)
+            else:
+                tokenizer = Tokenizer.from_pretrained(self.tokenizer)
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()
+
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def score(self, query: str, docs: list) -> np.ndarray:
+        if not docs:
+            return np.zeros(0, dtype=np.float32)
+        self._load()
+        encodings = self._tokenizer.encode_batch([(query, document_text(doc)) for doc in docs])
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self._session.run(None, {name: value for name, value in inputs.items() if name in self._input_names})
+        return np.asarray(logits[0], dtype=np.float32).reshape(len(docs), -1)[:, 0]
+
+
+class RerankStage:
+    """
+    Re-orders retrieved chunks with a reranker before they go into the prompt, and keeps only the best `top_n`.
+
+    Candidates are scored in batches, in retrieval order, until the latency budget runs out. The scored prefix is
+    re-ordered by the reranker and the unscored rest keeps its retrieval order behind it, so a slow model degrades to
+    plain vector search instead of delaying the answer.
+    """
+
+    def __init__(
+        self,
+        reranker=None,
+        top_n: int = 4,
+        budget_ms: float = 50.0,
+        batch_size: int = 16,
+        min_score: float = None,
+    ):
+        """
+        Args:
+            reranker: Object with `score(query, docs) -> np.ndarray`, defaults to `LexicalReranker()`.
+            top_n (int): Chunks kept after re-ranking.
+            budget_ms (float): Time after which no further batch is scored. The first batch is always scored.
+            batch_size (int): Candidates per call of the reranker. The lexical scorer normalizes per call, keep it at
+                least the retriever k for it.
+            min_score (float): Drop scored chunks below this reranker score.
+        """
+        self.reranker = reranker or LexicalReranker()
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.min_score = min_score
+
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.counts = {"calls": 0, "over_budget": 0, "scored": 0, "unscored": 0}
+
+    def rerank(self, query: str, docs: list) -> list:
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        scores = []
+        for i in range(0, len(docs), self.batch_size):
+            if i and time.perf_counter() >= deadline:
+                break
+            scores.extend(self.reranker.score(query, docs[i : i + self.batch_size]).tolist())
+
+        scored = sorted(zip(scores, range(len(scores))), key=lambda pair: pair[0], reverse=True)
+        if self.min_score is not None:
+            scored = [pair for pair in scored if pair[0] >= self.min_score]
+        ranked = [docs[i] for _, i in scored] + list(docs[len(scores) :])
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.counts["calls"] += 1
+            self.counts["scored"] += len(scores)
+            self.counts["unscored"] += len(docs) - len(scores)
+            if len(scores) < len(docs):
+                self.counts["over_budget"] += 1
+        logger.debug("Re-ranked %d/%d chunks in %.1f ms", len(scores), len(docs), elapsed * 1000)
+        return ranked[: self.top_n]
+
+    def stats(self) -> dict:
+        """
+        Returns counters and re-ranking latency percentiles in milliseconds.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, math.ceil(p * len(latencies)) - 1)] * 1000
+
+        return {**counts, "latency_p50_ms": percentile(0.5), "latency_p95_ms": percentile(0.95)}
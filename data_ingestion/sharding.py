@@ -0,0 +1,307 @@
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from multiprocessing.connection import wait
+from typing import Iterable, List, Sequence
+
+import numpy as np
+from filters import MetadataIndex
+from quantization import QuantizedIndex, active_field, normalize, quantize
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST = "manifest.json"
+# Documents without the partitioning field are spread by id instead
+SHARD_BY = ("hash", "course")
+
+
+def shard_of(key, shards: int) -> int:
+    """
+    Stable shard number of a key, the same in every process and run (unlike `hash`).
+    """
+    return zlib.crc32(str(key).encode("utf-8")) % shards
+
+
+def _json_id(doc_id):
+    return doc_id if isinstance(doc_id, (int, str)) else str(doc_id)
+
+
+def write_shards(
+    directory: str,
+    ids: Sequence,
+    vectors: np.ndarray,
+    metadata: Sequence[dict] = None,
+    shards: int = 4,
+    by: str = "hash",
+    dtype: str = "int8",
+) -> dict:
+    """
+    Partitions vectors into shard directories of .npy files that workers memory-map, so a shard costs page cache
+    shared with every process instead of a private copy.
+
+    Args:
+        directory (str): Output directory, holding `manifest.json` and one `shard-NNN` directory per shard.
+        ids (Sequence): Document ids, stored as JSON (ObjectIds become strings).
+        vectors (np.ndarray): Array of shape (n, dim).
+        metadata (Sequence[dict]): Filter fields of each vector, see `filters.FILTER_FIELDS`.
+        shards (int): Number of shards.
+        by (str): "hash" spreads documents by id; "course" keeps every course on one shard so that queries
+            filtered on a course only reach the shards holding it.
+        dtype (str): Quantization type of the scanned codes.
+
+    Returns:
+        dict: The manifest.
+    """
+    if by not in SHARD_BY:
+        raise ValueError(f"Unsupported partitioning {by!r}, expected one of {SHARD_BY}")
+    vectors = normalize(vectors)
+    metadata = metadata if metadata is not None else [{} for _ in range(len(ids))]
+    keys = [m.get(by) if by != "hash" else None for m in metadata]
+    assignment = np.fromiter(
+        (shard_of(key if key is not None else _json_id(doc_id), shards) for doc_id, key in zip(ids, keys)),
+        dtype=np.int64,
+        count=len(ids),
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"shards": [], "by": by, "dtype": dtype, "dim": int(vectors.shape[1])}
+    for shard in range(shards):
+        rows = np.flatnonzero(assignment == shard)
+        path = os.path.join(directory, f"shard-{shard:03d}")
+        os.makedirs(path, exist_ok=True)
+        codes, scales = quantize(vectors[rows], dtype=dtype)
+        np.save(os.path.join(path, "codes.npy"), codes)
+        np.save(os.path.join(path, "scales.npy"), scales)
+        np.save(os.path.join(path, "vectors.npy"), vectors[rows])
+        with open(os.path.join(path, "docs.json"), "w") as f:
+            json.dump({"ids": [_json_id(ids[i]) for i in rows], "metadata": [metadata[i] for i in rows]}, f)
+        courses = sorted({str(metadata[i]["course"]) for i in rows if metadata[i].get("course") is not None})
+        manifest["shards"].append({"path": os.path.basename(path), "size": len(rows), "courses": courses})
+
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def export_shards(collection, directory: str, field: str = None, query: dict = None, **kwargs) -> dict:
+    """
+    Writes the shards of the knowledge base stored in a collection by `vector_store.py`: its embeddings (of the
+    active version unless `field` is given) and filter fields. Keyword arguments are passed to `write_shards`.
+    """
+    from filters import FILTER_FIELDS
+
+    field = field or active_field()
+    ids, vectors, metadata = [], [], []
+    projection = {field: 1, **{name: 1 for name in FILTER_FIELDS}}
+    for doc in collection.find({**(query or {}), field: {"$exists": True}}, projection):
+        ids.append(doc["_id"])
+        vectors.append(np.asarray(doc[field], dtype=np.float32))
+        metadata.append({name: doc[name] for name in FILTER_FIELDS if name in doc})
+    if not ids:
+        raise ValueError("No embedded documents to shard")
+    return write_shards(directory, ids, np.stack(vectors), metadata, **kwargs)
+
+
+def open_shard(path: str, dtype: str = "int8") -> QuantizedIndex:
+    """
+    Opens a shard written by `write_shards` as a `QuantizedIndex` over memory-mapped arrays.
+    """
+    index = QuantizedIndex(dtype=dtype)
+    index.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+    index.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+    index.full_vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    with open(os.path.join(path, "docs.json")) as f:
+        docs = json.load(f)
+    index.ids = docs["ids"]
+    if any(docs["metadata"]):
+        index.metadata = MetadataIndex()
+        index.metadata.add(docs["metadata"])
+    return index
+
+
+def _serve_shard(path: str, dtype: str, conn):
+    """
+    Worker loop: answers (request id, queries, k, filter) messages with the top-k of every query until it receives
+    None.
+    """
+    index = open_shard(path, dtype=dtype)
+    conn.send(("ready", len(index.ids)))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        request_id, queries, k, filter = message
+        try:
+            results = [index.search(query, k=k, filter=filter) for query in queries]
+            conn.send((request_id, results, None))
+        except Exception as e:
+            conn.send((request_id, None, f"{type(e).__name__}: {e}"))
+
+
+class ShardedIndex:
+    """
+    Scatter-gather search over shards written by `write_shards`, each served by its own worker process holding the
+    memory-mapped shard. Every query is sent to the shards that can hold matches, each shard returns its own top-k
+    and the results are merged.
+
+    A shard that has not answered within `timeout` seconds is left out of the result rather than holding up the
+    query; its late reply is discarded. A shard whose worker died is left out too and its worker is respawned for
+    the next queries. Timeouts, errors and restarts are counted per shard in `stats()`.
+
+    One scatter-gather runs at a time; `search_batch` sends many queries in one message per shard.
+    """
+
+    def __init__(self, directory: str, timeout: float = 1.0, start_method: str = "spawn"):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.directory = directory
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._timeouts = [0] * len(self.manifest["shards"])
+        self._errors = [0] * len(self.manifest["shards"])
+        self._restarts = [0] * len(self.manifest["shards"])
+
+        # Fork is unsafe once the caller runs threads (the bot scheduler, the answer service)
+        self._context = multiprocessing.get_context(start_method)
+        self._conns, self._workers = [], []
+        for shard in range(len(self.manifest["shards"])):
+            conn, worker = self._spawn(shard)
+            self._conns.append(conn)
+            self._workers.append(worker)
+        for conn in self._conns:
+            conn.recv()
+
+    def _spawn(self, shard: int) -> tuple:
+        parent, child = self._context.Pipe()
+        worker = self._context.Process(
+            target=_serve_shard,
+            args=(os.path.join(self.directory, self.manifest["shards"][shard]["path"]), self.manifest["dtype"], child),
+            daemon=True,
+        )
+        worker.start()
+        child.close()
+        return parent, worker
+
+    def _respawn(self, shard: int):
+        """
+        Replaces the dead worker of a shard. Its "ready" message is discarded like a late reply, so nothing waits
+        for the new worker to start.
+        """
+        self._conns[shard].close()
+        if self._workers[shard].is_alive():
+            self._workers[shard].terminate()
+        self._workers[shard].join(timeout=5)
+        self._conns[shard], self._workers[shard] = self._spawn(shard)
+        self._restarts[shard] += 1
+        logger.warning("Restarted the worker of shard %d", shard)
+
+    def __len__(self) -> int:
+        return sum(shard["size"] for shard in self.manifest["shards"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def shards_for(self, filter: dict = None) -> List[int]:
+        """
+        Shards that can hold matches of a filter: all of them unless the index is partitioned by course and the
+        filter names courses.
+        """
+        courses = (filter or {}).get("course")
+        if self.manifest["by"] != "course" or courses is None:
+            return list(range(len(self._conns)))
+        courses = {str(c) for c in (courses if isinstance(courses, (list, tuple, set)) else [courses])}
+        return [i for i, shard in enumerate(self.manifest["shards"]) if courses & set(shard["courses"])]
+
+    def search(self, query: Sequence[float], k: int = 10, filter: dict = None) -> list:
+        """
+        Returns the `k` best (id, score) pairs for a query vector over all shards, see `QuantizedIndex.search`.
+        """
+        return self.search_batch([query], k=k, filter=filter)[0]
+
+    def search_batch(self, queries: Iterable[Sequence[float]], k: int = 10, filter: dict = None) -> List[list]:
+        queries = [np.asarray(query, dtype=np.float32) for query in queries]
+        shards = self.shards_for(filter)
+        if not shards:
+            return [[] for _ in queries]
+
+        with self._lock:
+            request_id = next(self._request_ids)
+            pending, dead = {}, []
+            for shard in shards:
+                try:
+                    self._conns[shard].send((request_id, queries, k, filter))
+                except (BrokenPipeError, OSError) as e:
+                    self._errors[shard] += 1
+                    logger.warning("Shard %d is unreachable: %s", shard, e)
+                    dead.append(shard)
+                    continue
+                pending[self._conns[shard]] = shard
+
+            partial = [[] for _ in queries]
+            deadline = time.monotonic() + self.timeout
+            while pending:
+                ready = wait(list(pending), timeout=max(0.0, deadline - time.monotonic()))
+                if not ready:
+                    break
+                for conn in ready:
+                    try:
+                        reply = conn.recv()
+                    except (EOFError, OSError):
+                        reply = (request_id, None, "worker exited")
+                        dead.append(pending[conn])
+                    if reply[0] != request_id:
+                        # Late reply to a query that timed out, or the "ready" message of a respawned worker
+                        continue
+                    _, results, error = reply
+                    shard = pending.pop(conn)
+                    if error is not None:
+                        self._errors[shard] += 1
+                        logger.warning("Shard %d failed: %s", shard, error)
+                        continue
+                    for merged, found in zip(partial, results):
+                        merged.extend(found)
+
+            for shard in pending.values():
+                self._timeouts[shard] += 1
+                logger.warning("Shard %d did not answer within %.3fs", shard, self.timeout)
+            for shard in dead:
+                self._respawn(shard)
+
+        return [heapq.nlargest(k, found, key=lambda pair: pair[1]) for found in partial]
+
+    def stats(self) -> dict:
+        return {
+            "shards": len(self._conns),
+            "documents": len(self),
+            "timeouts": list(self._timeouts),
+            "errors": list(self._errors),
+            "restarts": list(self._restarts),
+            "alive": [worker.is_alive() for worker in self._workers],
+        }
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._workers = [], []
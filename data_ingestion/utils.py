@@ -1,10 +1,6 @@
 import base64
 import re
 
-from langchain_core.messages import HumanMessage
-from langchain_google_vertexai import ChatVertexAI
-from settings import config
-
 
 def encode_image(image_path):
     """Getting the base64 string"""
@@ -37,12 +33,34 @@ def is_image_data(b64data):
         return False
 
 
-def image_summarize(img_base64, prompt):
-    """Make image summary"""
-    model = ChatVertexAI(
-        model_name="gemini-pro-vision", credentials=config.CREDENTIALS, max_output_tokens=2048, temperature=0.15
+def get_vision_model(project: str = None, location: str = None, credentials=None):
+    """Gemini vision chat model, reuse it across calls instead of building one per image.
+    Project, location and credentials default to those of `settings.config`."""
+    from langchain_google_vertexai import ChatVertexAI
+
+    if project is None or location is None or credentials is None:
+        from settings import config
+
+        project = project or config.PROJECT_ID
+        location = location or config.PROJECT_LOCATION
+        credentials = credentials or config.CREDENTIALS
+
+    return ChatVertexAI(
+        model_name="gemini-pro-vision",
+        project=project,
+        location=location,
+        credentials=credentials,
+        max_output_tokens=2048,
+        temperature=0.15,
     )
 
+
+def image_summarize(img_base64, prompt, model=None):
+    """Make image summary"""
+    from langchain_core.messages import HumanMessage
+
+    model = model or get_vision_model()
+
     msg = HumanMessage(
         content=[
             {"type": "text", "text": prompt},
@@ -1,34 +1,97 @@
+import sys
+from functools import lru_cache
 from pprint import pprint
 
-from db import ATLAS_VECTOR_SEARCH_INDEX_NAME, MONGODB_COLLECTION
+from db import MONGODB_COLLECTION
 from embedding import EmbeddingClient
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_google_vertexai import ChatVertexAI, VertexAI
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from settings import config
-
-model_name = "textembedding-gecko@003"
-project = config.PROJECT_ID
-location = config.PROJECT_LOCATION
+from filters import metadata_filter
+from quantization import quantized_fields
+from reembed import VERSIONS_COLLECTION, EmbeddingVersion, VersionRegistry
+from rerank import RerankStage
+from settings import Path, config
 
 # Embedding
 EMBEDDING_QPM = 1200
 EMBEDDING_NUM_BATCH = 5
 
 
-embedding = EmbeddingClient(
-    model_name="textembedding-gecko@003",
-    project=config.PROJECT_ID,
-    location=config.PROJECT_LOCATION,
-    requests_per_minute=EMBEDDING_QPM,
-    num_instances_per_batch=EMBEDDING_NUM_BATCH,
-)
+# Define a prompt template
+template = """
+
+Use the following pieces of context to answer the question at the end.
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+"""
+
+
+def add_agent_path():
+    # The quota coordinator and call recorder live with the agent, which shares them
+    if Path.agent_dir not in sys.path:
+        sys.path.append(Path.agent_dir)
+
+
+def get_quota():
+    add_agent_path()
+    from quota import get_coordinator
+
+    return get_coordinator()
+
+
+def get_call_recorder():
+    add_agent_path()
+    from recorder import get_recorder
+
+    return get_recorder()
+
+
+@lru_cache(maxsize=1)
+def get_versions() -> VersionRegistry:
+    from db import main_db
+
+    return VersionRegistry(main_db[VERSIONS_COLLECTION])
+
+
+def get_embedding(model: str = None) -> EmbeddingClient:
+    """
+    Embedding client of `model`, by default the model of the active embedding version.
+    """
+    return _get_embedding(model or get_versions().active().model)
+
+
+@lru_cache(maxsize=2)
+def _get_embedding(model: str) -> EmbeddingClient:
+    return EmbeddingClient(
+        model_name=model,
+        project=config.PROJECT_ID,
+        location=config.PROJECT_LOCATION,
+        requests_per_minute=EMBEDDING_QPM,
+        num_instances_per_batch=EMBEDDING_NUM_BATCH,
+        quota=get_quota(),
+        recorder=get_call_recorder(),
+    )
+
+
+def get_vector_search():
+    """
+    Vector search over the field and index of the active embedding version, see `reembed.VersionRegistry`.
+    """
+    return _get_vector_search(get_versions().active())
+
+
+@lru_cache(maxsize=2)
+def _get_vector_search(version: EmbeddingVersion):
+    from langchain_mongodb import MongoDBAtlasVectorSearch
+
+    return MongoDBAtlasVectorSearch(
+        collection=MONGODB_COLLECTION,
+        embedding=get_embedding(version.model),
+        index_name=version.index,
+        embedding_key=version.field,
+    )
 
-vector_search = MongoDBAtlasVectorSearch(
-    collection=MONGODB_COLLECTION, embedding=embedding, index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME
-)
 
 # qa_retriever = vector_search.as_retriever(
 #     search_type="similarity",
@@ -46,46 +109,130 @@ vector_search = MongoDBAtlasVectorSearch(
 #     print(result)
 
 
-# Instantiate Atlas Vector Search as a retriever
-retriever = vector_search.as_retriever(search_type="similarity", search_kwargs={"k": 10, "score_threshold": 0.75})
-
-# Define a prompt template
-template = """
+def get_retriever(pre_filter: dict = None):
+    # Instantiate Atlas Vector Search as a retriever
+    search_kwargs = {"k": 10, "score_threshold": 0.75}
+    if pre_filter:
+        search_kwargs["pre_filter"] = pre_filter
+    return get_vector_search().as_retriever(search_type="similarity", search_kwargs=search_kwargs)
 
-Use the following pieces of context to answer the question at the end.
-If you don't know the answer, just say that you don't know, don't try to make up an answer.
 
-{context}
+@lru_cache(maxsize=1)
+def get_llm():
+    from langchain_google_vertexai import VertexAI
 
-Question: {question}
-"""
-custom_rag_prompt = PromptTemplate.from_template(template)
+    return VertexAI(
+        model_name="gemini-pro", max_output_tokens=2048, temperature=0.2, top_p=0.8, top_k=40, streaming=True
+    )
 
-llm = VertexAI(model_name="gemini-pro", max_output_tokens=2048, temperature=0.2, top_p=0.8, top_k=40, streaming=True)
 
 # chat = ChatVertexAI()
 
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
-
+def search_by_vector(
+    vector, k: int = 10, pre_filter: dict = None, num_candidates: int = None, collection=None, version=None
+):
+    """
+    Runs an Atlas `$vectorSearch` for an already computed query embedding.
+
+    Args:
+        vector (list): The query embedding.
+        k (int): Number of documents to return.
+        pre_filter (dict): MQL filter on indexed filter fields, applied before the similarity search.
+        num_candidates (int): Candidates considered by the ANN search, defaults to 10 * k.
+        collection: Collection to search, defaults to `MONGODB_COLLECTION`.
+        version (EmbeddingVersion): Version the query was embedded with, defaults to the active one.
+
+    Returns:
+        list: Documents without their embeddings, each with a "score" field.
+    """
+    version = version or get_versions().active()
+    stage = {
+        "index": version.index,
+        "path": version.field,
+        "queryVector": list(vector),
+        "numCandidates": num_candidates or 10 * k,
+        "limit": k,
+    }
+    if pre_filter:
+        stage["filter"] = pre_filter
+    pipeline = [
+        {"$vectorSearch": stage},
+        {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+        {"$project": {name: 0 for field in {"embedding", version.field} for name in (field, *quantized_fields(field))}},
+    ]
+    return list((collection if collection is not None else MONGODB_COLLECTION).aggregate(pipeline))
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> RerankStage:
+    # The lexical scorer needs no model, swap in a CrossEncoderReranker when one is deployed next to the bot
+    return RerankStage(top_n=4, budget_ms=50)
+
+
+def retrieve_and_rerank(question: str, k: int = 10, score_threshold: float = 0.75, pre_filter: dict = None):
+    """
+    Same candidates as `get_retriever()`, with the similarity kept in the metadata for the reranker.
+
+    Args:
+        pre_filter (dict): MQL filter on the filter fields, see `filters.metadata_filter`. Applied by Atlas before
+            the similarity search, so the `k` candidates all match it.
+    """
+    docs = []
+    results = get_vector_search().similarity_search_with_score(query=question, k=k, pre_filter=pre_filter or None)
+    for doc, score in results:
+        if score >= score_threshold:
+            doc.metadata["score"] = score
+            docs.append(doc)
+    return get_reranker().rerank(question, docs)
 
-# Construct a chain to answer questions on your data
-rag_chain = (
-    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-    | custom_rag_prompt
-    | llm
-    | StrOutputParser()
-)
 
-# Prompt the chain
-question = "What is linear regression? What does it represent mathematically? In which doesn't this work? What are the other choices?"
-answer = rag_chain.invoke(question)
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
 
-print("Question: " + question)
-print("Answer: " + answer)
 
-# # Return source documents
-# documents = retriever.get_relevant_documents(question)
-# print("\nSource documents:")
-# pprint(documents)
+@lru_cache(maxsize=16)
+def get_rag_chain(rerank: bool = True, course: str = None, term: str = None):
+    """
+    RAG chain answering a question string, searching only the documents of `course` and `term` when given.
+    """
+    from langchain.prompts import PromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+    custom_rag_prompt = PromptTemplate.from_template(template)
+    pre_filter = metadata_filter(course=course, term=term)
+    if rerank:
+        retriever = RunnableLambda(lambda question: retrieve_and_rerank(question, pre_filter=pre_filter))
+    else:
+        # Looked up on every question so that a switch of embedding version is picked up
+        retriever = RunnableLambda(lambda question: get_retriever(pre_filter).invoke(question))
+    llm = get_llm()
+    recorder = get_call_recorder()
+    if recorder is not None:
+        llm = RunnableLambda(lambda prompt: recorder.call("vertex-gemini:rag", get_llm().invoke, prompt.to_string()))
+
+    # Construct a chain to answer questions on your data
+    return (
+        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+        | custom_rag_prompt
+        | llm
+        | StrOutputParser()
+    )
+
+
+if __name__ == "__main__":
+    # Prompt the chain
+    question = (
+        "What is linear regression? What does it represent mathematically? In which doesn't this work? What are the "
+        "other choices?"
+    )
+    answer = get_rag_chain().invoke(question)
+
+    print("Question: " + question)
+    print("Answer: " + answer)
+
+    # # Return source documents
+    # documents = get_retriever().get_relevant_documents(question)
+    # print("\nSource documents:")
+    # pprint(documents)
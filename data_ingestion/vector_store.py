@@ -3,22 +3,13 @@ import os
 import tempfile
 from pprint import pprint
 
+from chunking import chunk_pages, iter_pdf_pages
 from db import ATLAS_VECTOR_SEARCH_INDEX_NAME, MONGODB_COLLECTION
 from embedding import EmbeddingClient
-from langchain_community.document_loaders.pdf import PyMuPDFLoader, PyPDFLoader
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from PIL import Image
-from pypdf import PdfReader
 from settings import config
-from tqdm import tqdm
 
 # Load the PDF
 # loader = PyPDFLoader("https://arxiv.org/pdf/2303.08774.pdf")
-path = os.path.relpath(
-    "c:\\Users\\shahk\\OneDrive - University of Southern California\\Books\\References\\"
-    "3rd Edition Ethem Alpaydin-Introduction to Machine Learning-The MIT Press (2014).pdf"
-)
 
 # loader = PyMuPDFLoader(path)
 # # docs = loader.load_and_split(text_splitter=RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150))
@@ -27,20 +18,42 @@ path = os.path.relpath(
 # for doc in docs[:30]:
 #     print(doc.json())
 
-with tempfile.TemporaryDirectory() as temp_dir:
-    reader = PdfReader(path)
 
-    for i in tqdm(range(len(reader.pages))):
-        page = reader.pages[i]
+def load_chunked_documents(
+    path: str, splitter=None, workers: int = None, course: str = None, term: str = None, pages=None
+):
+    """
+    Streams the PDF page by page through the parallel chunking stage and yields langchain Documents carrying
+    stable chunk ids and page offsets in their metadata, plus the `course` and `term` filter fields when given.
+    Pages come from the page cache when they were extracted before; `pages` restricts ingestion to some page numbers.
+    """
+    metadata = {field: value for field, value in (("course", course), ("term", term)) if value is not None}
+    for chunk in chunk_pages(iter_pdf_pages(path, pages=pages), splitter=splitter, workers=workers):
+        yield chunk.to_document(metadata)
+
+
+def extract_images(path: str):
+    from PIL import Image
+    from tqdm import tqdm
+
+    from pdf_cache import PdfPages
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf = PdfPages(path)
+
+        # Image names are cached with the pages, so pages without images are skipped without parsing them
+        for content in tqdm(pdf.iter_pages(), total=len(pdf)):
+            i = content.page - 1
+            if content.images:
+                for j, name in enumerate(content.images):
+                    img = pdf.image(content.page, name)
+                    print(i + 1, j + 1, img.name, img.image)
+                    image = Image.open(io.BytesIO(img.data))
+                    image.show()
+                    # rgb_image = image.convert("RGB")
+                    image_path = os.path.join(temp_dir, f"page{i}_img{j}.png")
+                    image.save(image_path)
 
-        if page.images:
-            for j, img in enumerate(page.images):
-                print(i + 1, j + 1, img.name, img.image)
-                image = Image.open(io.BytesIO(img.data))
-                image.show()
-                # rgb_image = image.convert("RGB")
-                image_path = os.path.join(temp_dir, f"page{i}_img{j}.png")
-                image.save(image_path)
 
 # model_name = "textembedding-gecko@003"
 # project = config.PROJECT_ID
@@ -61,3 +74,11 @@ with tempfile.TemporaryDirectory() as temp_dir:
 #     collection=MONGODB_COLLECTION,
 #     index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
 # )
+
+
+if __name__ == "__main__":
+    path = os.path.relpath(
+        "c:\\Users\\shahk\\OneDrive - University of Southern California\\Books\\References\\"
+        "3rd Edition Ethem Alpaydin-Introduction to Machine Learning-The MIT Press (2014).pdf"
+    )
+    extract_images(path)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of both sides import each other by their bare names, like the scripts they are run as. Benchmarks are on
+# the path too, for the tests of their simulations.
+for directory in (
+    os.path.join(REPO_DIR, "virtual_ta", "agent"),
+    os.path.join(REPO_DIR, "data_ingestion"),
+    os.path.join(REPO_DIR, "benchmarks"),
+):
+    if directory not in sys.path:
+        sys.path.append(directory)
@@ -0,0 +1,109 @@
+import time
+from types import SimpleNamespace
+
+from answer_post import AnswerPublisher
+from fake_piazza import FakePiazza, make_child, make_post
+
+NETWORK = "course"
+
+
+class RecordingRPC:
+    """
+    Wraps the fake Piazza RPC, recording answer posts and failing the first ones with the given errors.
+    """
+
+    def __init__(self, piazza: FakePiazza, errors: list = ()):
+        self.rpc = piazza._rpc_api
+        self.errors = list(errors)
+        self.posted = []
+
+    def content_get(self, cid, nid=None):
+        return self.rpc.content_get(cid=cid, nid=nid)
+
+    def content_instructor_answer(self, params: dict):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.posted.append(params)
+        return self.rpc.content_instructor_answer(params)
+
+
+class HTTPError(Exception):
+    def __init__(self, message: str, headers: dict):
+        super().__init__(message)
+        self.response = SimpleNamespace(status_code=429, headers=headers)
+
+
+def piazza_with_post(answers: list = ()) -> FakePiazza:
+    piazza = FakePiazza()
+    children = [make_child("s_answer")] if answers else []
+    if answers:
+        children[0]["history"] = [{"content": answer} for answer in answers]
+    piazza.add_post(NETWORK, make_post(1, "HW2", "<p>How is the HMM trained?</p>", children=children))
+    return piazza
+
+
+def publisher(rpc, ledger_path, **kwargs) -> AnswerPublisher:
+    return AnswerPublisher(rpc, ledger_path=str(ledger_path), quota=False, min_interval=0, **kwargs)
+
+
+def test_ledger_keeps_answers_from_being_posted_twice(tmp_path):
+    rpc = RecordingRPC(piazza_with_post())
+    first = publisher(rpc, tmp_path / "ledger.sqlite3")
+    assert first.submit("cid00000001", "Use Baum-Welch.", nid=NETWORK)
+    first.close()
+
+    # A later run with the same ledger skips the answer without asking Piazza
+    second = publisher(rpc, tmp_path / "ledger.sqlite3")
+    assert not second.submit("cid00000001", "  Use Baum-Welch.\n", nid=NETWORK)
+    second.close()
+
+    # Without the ledger, the answer already on the post is recognized and recorded
+    third = publisher(rpc, tmp_path / "other.sqlite3")
+    assert third.submit("cid00000001", "Use Baum-Welch.", nid=NETWORK)
+    third.close()
+    assert len(rpc.posted) == 1
+    assert third.stats()["duplicates"] == 1 and third.stats()["published"] == 0
+
+
+def test_answers_are_posted_against_the_current_revision(tmp_path):
+    piazza = piazza_with_post(answers=["Second edit.", "First answer."])
+    rpc = RecordingRPC(piazza)
+    answers = publisher(rpc, tmp_path / "ledger.sqlite3")
+    answers.submit("cid00000001", "Use Baum-Welch.", nid=NETWORK)
+    answers.flush()
+    answers.submit("cid00000001", "Use Baum-Welch with several restarts.", nid=NETWORK)
+    answers.close()
+
+    assert [params["revision"] for params in rpc.posted] == [2, 3]
+    history = piazza.posts[NETWORK][1]["children"][0]["history"]
+    assert history[0]["content"] == "Use Baum-Welch with several restarts."
+    assert answers.stats()["published"] == 2
+
+
+def test_retries_wait_for_retry_after(tmp_path):
+    errors = [HTTPError("429 Too Many Requests", {"Retry-After": "0.05"}), HTTPError("503", {"Retry-After": "0"})]
+    rpc = RecordingRPC(piazza_with_post(), errors=errors)
+    # Without Retry-After the backoff would wait at least 50 s for the first retry
+    answers = publisher(rpc, tmp_path / "ledger.sqlite3", backoff_base=100.0)
+    start = time.monotonic()
+    answers.submit("cid00000001", "Use Baum-Welch.", nid=NETWORK)
+    answers.close()
+
+    assert time.monotonic() - start < 5
+    stats = answers.stats()
+    assert (stats["published"], stats["retries"], stats["failed"]) == (1, 2, 0)
+    assert len(rpc.posted) == 1
+
+
+def test_answer_failing_every_retry_is_recorded(tmp_path):
+    rpc = RecordingRPC(piazza_with_post(), errors=[Exception("Connection reset")] * 3)
+    answers = publisher(rpc, tmp_path / "ledger.sqlite3", max_retries=2, backoff_base=0.001)
+    answers.submit("cid00000001", "Use Baum-Welch.", nid=NETWORK)
+    answers.close()
+
+    stats = answers.stats()
+    assert (stats["published"], stats["retries"], stats["failed"]) == (0, 2, 1)
+    assert stats["failures"] == [{"cid": "cid00000001", "error": "Connection reset"}]
+    stats["failures"].clear()
+    assert len(answers.stats()["failures"]) == 1
+    assert rpc.posted == []
@@ -0,0 +1,39 @@
+from chunking import CharacterSplitter, chunk_pages
+
+TEXT = "\n\n".join(
+    f"Paragraph {i}. " + "Hidden Markov models estimate transitions by counting. " * 6 for i in range(20)
+)
+
+
+def pages(count: int):
+    return [("lecture.pdf", number, f"Page {number}.\n\n{TEXT}") for number in range(1, count + 1)]
+
+
+def test_chunk_ids_are_stable_and_track_the_text():
+    splitter = CharacterSplitter(chunk_size=400, chunk_overlap=50)
+    first = [chunk.chunk_id for chunk in chunk_pages(pages(4), splitter=splitter, workers=0)]
+    again = [chunk.chunk_id for chunk in chunk_pages(pages(4), splitter=splitter, workers=2, pages_per_task=1)]
+    assert first == again
+    assert len(set(first)) == len(first)
+
+    # Editing one page only changes the ids of that page's chunks
+    edited = pages(4)
+    edited[2] = ("lecture.pdf", 3, edited[2][2].replace("Paragraph 0.", "Paragraph zero."))
+    changed = [chunk for chunk in chunk_pages(edited, splitter=splitter, workers=0) if chunk.chunk_id not in first]
+    assert changed and {chunk.page for chunk in changed} == {3}
+
+
+def test_pending_pages_stay_bounded():
+    consumed = []
+
+    def stream():
+        for page in pages(40):
+            consumed.append(page[1])
+            yield page
+
+    chunks = chunk_pages(stream(), workers=2, pages_per_task=2, max_pending=3)
+    first = next(chunks)
+    assert first.page == 1
+    # Only the batches in flight have been read from the stream when the first chunk comes out
+    assert len(consumed) <= 3 * 2
+    assert len(list(chunks)) > 0 and len(consumed) == 40
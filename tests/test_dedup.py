@@ -0,0 +1,35 @@
+from dedup import NearDuplicateIndex
+
+
+def post(uid: str, title: str, text: str = "", answered: bool = False) -> dict:
+    answers = {"i_answer": {"text": "Yes" if answered else ""}}
+    return {"uid": uid, "post_id": uid, "title": title, "content_text": text, "answers": answers}
+
+
+def test_posts_without_enough_text_are_not_duplicates():
+    index = NearDuplicateIndex()
+    # Image-only posts: nothing but a short title
+    posts = [post("a", "HW2"), post("b", "Question"), post("c", ""), post("d", "Help please")]
+    clusters = index.cluster(posts)
+
+    assert [cluster["post"]["uid"] for cluster in clusters] == ["a", "b", "c", "d"]
+    assert len(index) == 0
+    assert index.query("HW2") == []
+
+
+def test_near_duplicates_are_grouped_and_linked_to_answered_threads():
+    question = "How are the transition probabilities of the hidden markov model estimated from the training data"
+    index = NearDuplicateIndex()
+    index.add_post(post("old", "HMM estimation", question, answered=True))
+    clusters = index.cluster([post("new1", "HMM estimation", question), post("new2", "HMM estimation", question + "?")])
+
+    assert len(clusters) == 1
+    assert [p["uid"] for p in clusters[0]["duplicates"]] == ["new2"]
+    assert [uid for uid, _ in clusters[0]["answered"]] == ["old"]
+
+
+def test_post_edited_down_to_nothing_leaves_the_index():
+    index = NearDuplicateIndex()
+    index.add_post(post("a", "Gradient", "How do I compute the gradient of the loss"))
+    index.add_post(post("a", "", ""))
+    assert "a" not in index
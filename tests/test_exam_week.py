@@ -0,0 +1,39 @@
+import random
+from argparse import Namespace
+
+from bench_exam_week import Latency, arrival_times, simulate, synthetic_post
+
+
+def test_arrivals_spike_around_the_peak_minute():
+    times = arrival_times(1000, spike_share=0.5, peak_minute=40, rng=random.Random(0))
+    assert times == sorted(times) and 0 <= times[0] and times[-1] < 3600
+    # Half the questions land within ~8 minutes of the peak, about 4 times the background rate
+    around_peak = sum(1 for t in times if 36 * 60 <= t <= 44 * 60)
+    assert 0.35 < around_peak / len(times) < 0.6
+
+
+def test_latency_has_the_given_median_and_p95():
+    rng = random.Random(0)
+    samples = sorted(Latency("2:6").sample(rng) for _ in range(20000))
+    assert abs(samples[len(samples) // 2] - 2) < 0.1
+    assert abs(samples[int(0.95 * len(samples))] - 6) < 0.4
+    assert Latency("1:1").sample(rng) == 1.0
+
+
+def test_synthetic_posts_are_content_get_payloads():
+    post = synthetic_post(7, random.Random(0))
+    assert post["id"] == "cid00000007" and post["nr"] == 7
+    assert post["history"][0]["subject"].endswith("(7)")
+
+
+def test_every_question_of_a_short_simulated_hour_is_answered_once():
+    args = Namespace(questions=20, spike_share=0.5, peak_minute=40, hour_seconds=2, poll_interval=30, drain=600, seed=0)
+    latencies = {name: Latency("0.5:2") for name in ("piazza", "embed", "search", "youtube")}
+    latencies["llm"] = Latency("4:12")
+    result = simulate(workers=4, args=args, latencies=latencies)
+
+    assert result["arrived"] == result["answered"] == result["published"] == 20
+    assert result["failed"] == 0
+    # Answers start after the post shows up in a poll, and finish after they start
+    assert 0 <= result["queue_p50"] <= result["latency_p50"] <= result["latency_max"]
+    assert result["backlog_max"] >= 1
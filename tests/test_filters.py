@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from filters import MetadataIndex
+
+
+def index() -> MetadataIndex:
+    metadata = MetadataIndex(fields=("course", "term", "folders"))
+    metadata.add(
+        [
+            {"course": "cs567", "term": "2024-spring", "folders": ["hw1", "hmm"]},
+            {"course": "cs567", "term": "2024-fall", "folders": ["hmm"]},
+            {"course": "cs570", "term": "2024-fall"},
+        ]
+    )
+    return metadata
+
+
+def test_ids_match_any_value_of_a_field_and_all_fields():
+    metadata = index()
+    assert metadata.ids({"course": "cs567", "folders": "hmm"}).tolist() == [0, 1]
+    assert metadata.ids({"term": ["2024-spring", "2024-fall"], "course": "cs570"}).tolist() == [2]
+    assert metadata.ids({"course": None}) is None
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(ValueError, match="'topic' is not an indexed field"):
+        index().ids({"topic": "hmm"})
+
+
+def test_empty_list_of_values_matches_no_row():
+    metadata = index()
+    assert metadata.ids({"course": []}).tolist() == []
+    assert metadata.ids({"course": "cs567", "folders": []}).tolist() == []
+    assert metadata.count({"term": set()}) == 0
+
+
+def test_filtered_search_with_an_empty_list_of_values_finds_nothing():
+    from quantization import QuantizedIndex
+
+    vectors = np.eye(3, 4, dtype=np.float32)
+    quantized = QuantizedIndex()
+    quantized.add(["a", "b", "c"], vectors, metadata=[{"course": "cs567"}, {"course": "cs567"}, {"course": "cs570"}])
+    assert quantized.search(vectors[0], k=2, filter={"course": []}) == []
+    assert [doc_id for doc_id, _ in quantized.search(vectors[0], k=1, filter={"course": "cs567"})] == ["a"]
@@ -0,0 +1,74 @@
+import io
+import threading
+
+from http_stub import LocalHTTPStub, make_png
+from images import ImageCache, PostImagePipeline
+from orchestrator import AnswerOrchestrator
+from PIL import Image
+from query_prep import extract_subqueries
+
+
+class Summarizer:
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, img_base64: str, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+        return "ValueError: shapes (3,4) and (3,4) not aligned"
+
+
+def pipeline(tmp_path, summarizer) -> PostImagePipeline:
+    return PostImagePipeline(summarizer=summarizer, cache=ImageCache(str(tmp_path)), max_side=256, timeout=5)
+
+
+def test_images_are_downsized_and_cached(tmp_path):
+    routes = {"/a.png": make_png(1600, 1200, seed=1), "/b.png": make_png(800, 1000, seed=2)}
+    summarizer = Summarizer()
+    with LocalHTTPStub(routes) as stub:
+        images = pipeline(tmp_path, summarizer)
+        urls = [stub.url(path) for path in routes] + [stub.url("/missing.png")]
+
+        first = images.summarize_urls(urls)
+        again = images.summarize_urls(urls)
+        data = images.fetch(urls[0])
+        images.close()
+
+    assert first == again
+    assert first[2] is None and all(first[:2])
+    # The cached images were downloaded once and the summaries computed once
+    assert stub.hits == {"/a.png": 1, "/b.png": 1, "/missing.png": 2}
+    assert summarizer.calls == 2
+    image = Image.open(io.BytesIO(data))
+    assert image.format == "JPEG" and max(image.size) == 256
+    assert len(data) < len(routes["/a.png"])
+
+
+def test_orchestrator_retrieves_with_the_text_of_the_images(tmp_path):
+    queries = []
+    with LocalHTTPStub({"/error.png": make_png(seed=3)}) as stub:
+        post = {
+            "uid": "luz5g88xy27xx",
+            "title": "HW2 matrix product",
+            "content_text": "Why does this fail?",
+            "image_urls": [stub.url("/error.png")],
+        }
+        images = pipeline(tmp_path, Summarizer())
+        orchestrator = AnswerOrchestrator(
+            retrieve=lambda post: queries.append(extract_subqueries(post)) or [], images=images
+        )
+        result = orchestrator.answer_sync(post)
+        orchestrator.close()
+        images.close()
+
+    assert result["errors"] == {}
+    assert "images" in result["timings"]
+    # The error message in the screenshot becomes a sub-query of its own
+    assert queries == [
+        [
+            {"kind": "title", "text": "HW2 matrix product"},
+            {"kind": "question", "text": "Why does this fail?"},
+            {"kind": "error", "text": "ValueError: shapes (3,4) and (3,4) not aligned"},
+        ]
+    ]
@@ -0,0 +1,44 @@
+import numpy as np
+from lecture_index import LectureIndex
+
+
+def video(video_id: str) -> dict:
+    return {"videoId": video_id, "title": f"Lecture {video_id}", "link": f"https://www.youtube.com/watch?v={video_id}"}
+
+
+def windows(count: int) -> list:
+    return [{"start": 30.0 * i, "end": 30.0 * i + 30, "text": f"window {i}"} for i in range(count)]
+
+
+def test_index_is_reloaded_from_disk(tmp_path):
+    index = LectureIndex(str(tmp_path))
+    index.add(video("hmm"), windows(3), np.eye(3, 4))
+    index.add(video("crf"), windows(2), [[0, 0, 0, 1], [0, 0, 1, 1]])
+    # Re-adding a video replaces its windows, on disk too
+    index.add(video("crf"), windows(1), [[0, 0, 0, 1]])
+
+    reloaded = LectureIndex(str(tmp_path))
+    assert "hmm" in reloaded and "crf" in reloaded and "svm" not in reloaded
+    assert len(reloaded) == 4
+    assert reloaded.videos["hmm"] == video("hmm")
+    assert reloaded.search([0, 1, 0, 0], k=1) == [
+        {"video": video("hmm"), "start": 30.0, "end": 60.0, "text": "window 1", "score": 1.0}
+    ]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["crf.npz", "hmm.npz"]
+
+
+def test_search_keeps_at_most_per_video_windows_of_each_video(tmp_path):
+    index = LectureIndex(str(tmp_path))
+    index.add(video("hmm"), windows(3), [[1, 0], [0.9, 0.1], [0.8, 0.2]])
+    index.add(video("crf"), windows(2), [[0.7, 0.3], [0, 1]])
+
+    assert [(r["video"]["videoId"], r["text"]) for r in index.search([1, 0], k=3)] == [
+        ("hmm", "window 0"),
+        ("crf", "window 0"),
+    ]
+    assert [(r["video"]["videoId"], r["text"]) for r in index.search([1, 0], k=3, per_video=2)] == [
+        ("hmm", "window 0"),
+        ("hmm", "window 1"),
+        ("crf", "window 0"),
+    ]
+    assert LectureIndex(str(tmp_path / "empty")).search([1, 0]) == []
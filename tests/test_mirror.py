@@ -0,0 +1,176 @@
+"""
+Tests of `mirror.IndexMirror` against a real MongoDB replica set, since change streams need one. Set
+MONGODB_TEST_URI, e.g. to a local `mongod --replSet rs0` after `rs.initiate()`:
+
+    MONGODB_TEST_URI="mongodb://localhost:27017/?replicaSet=rs0" python -m pytest tests/test_mirror.py
+
+Each test works in a database of its own, dropped afterwards.
+"""
+
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+MONGODB_TEST_URI = os.environ.get("MONGODB_TEST_URI")
+
+pytestmark = pytest.mark.skipif(not MONGODB_TEST_URI, reason="MONGODB_TEST_URI is not set")
+
+DIM = 16
+
+
+@pytest.fixture
+def db():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(MONGODB_TEST_URI, serverSelectionTimeoutMS=3000, tz_aware=True)
+    try:
+        hello = client.admin.command("hello")
+    except PyMongoError as e:
+        pytest.skip(f"No MongoDB reachable at MONGODB_TEST_URI: {e}")
+    if "setName" not in hello:
+        pytest.skip("MONGODB_TEST_URI is not a replica set, change streams are unavailable")
+    name = f"mirror_test_{uuid.uuid4().hex[:12]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def versions(db):
+    from reembed import VERSIONS_COLLECTION, VersionRegistry
+
+    return VersionRegistry(db[VERSIONS_COLLECTION], ttl=0)
+
+
+def vector(seed: int) -> list:
+    return np.random.default_rng(seed).standard_normal(DIM).tolist()
+
+
+def document(doc_id: int, seed: int = None, course: str = "cs567") -> dict:
+    return {
+        "_id": doc_id,
+        "text": f"chunk {doc_id}",
+        "course": course,
+        "embedding": vector(doc_id if seed is None else seed),
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.05)
+
+
+def top(mirror, seed: int):
+    results = mirror.search(vector(seed), k=1)
+    return results[0][0] if results else None
+
+
+def test_bootstrap_then_follow_inserts_updates_and_deletes(db, versions, tmp_path):
+    from mirror import IndexMirror
+
+    collection = db["chunks"]
+    collection.insert_many([document(i) for i in range(3)])
+    mirror = IndexMirror(collection, str(tmp_path), mode="change_stream", versions=versions).start()
+    try:
+        wait_for(lambda: mirror.bootstrapped and len(mirror.index) == 3)
+        assert mirror.field == "embedding"
+        assert top(mirror, 1) == 1
+
+        collection.insert_one(document(3))
+        wait_for(lambda: top(mirror, 3) == 3)
+
+        collection.update_one({"_id": 1}, {"$set": {"embedding": vector(100)}})
+        wait_for(lambda: top(mirror, 100) == 1)
+
+        # Fields that are neither the vector nor a filter field do not touch the index
+        collection.update_one({"_id": 0}, {"$set": {"text": "edited"}})
+        collection.delete_one({"_id": 2})
+        wait_for(lambda: 2 not in mirror.index.slots)
+        assert mirror.stats()["applied"] == {"insert": 1, "update": 1, "delete": 1, "skipped": 1}
+        assert mirror.search(vector(0), k=5, filter={"course": "cs567"})[0][0] == 0
+        assert mirror.search(vector(0), k=5, filter={"course": []}) == []
+    finally:
+        mirror.stop()
+
+
+def test_restart_resumes_from_the_checkpointed_resume_token(db, versions, tmp_path):
+    from mirror import IndexMirror
+
+    collection = db["chunks"]
+    collection.insert_many([document(i) for i in range(3)])
+    mirror = IndexMirror(collection, str(tmp_path), mode="change_stream", versions=versions).start()
+    wait_for(lambda: len(mirror.index) == 3)
+    mirror.stop()
+    resume_token = mirror.resume_token
+
+    # Changes committed while the mirror is down
+    collection.insert_one(document(3))
+    collection.delete_one({"_id": 0})
+
+    restarted = IndexMirror(collection, str(tmp_path), mode="change_stream", versions=versions)
+    assert restarted.bootstrapped
+    assert restarted.resume_token == resume_token
+    restarted.start()
+    try:
+        wait_for(lambda: 3 in restarted.index.slots and 0 not in restarted.index.slots)
+        # Caught up from the token: the two changes are applied one by one, without a new snapshot
+        assert restarted.stats()["applied"] == {"insert": 1, "update": 0, "delete": 1, "skipped": 0}
+        assert sorted(restarted.index.slots) == [1, 2, 3]
+    finally:
+        restarted.stop()
+
+
+def test_poll_mode_follows_the_updated_field(db, versions, tmp_path):
+    from mirror import IndexMirror
+
+    collection = db["chunks"]
+    collection.insert_many([document(i) for i in range(3)])
+    mirror = IndexMirror(
+        collection, str(tmp_path), mode="poll", poll_interval=0.05, reconcile_interval=0, versions=versions
+    ).start()
+    try:
+        wait_for(lambda: mirror.bootstrapped and len(mirror.index) == 3)
+        assert mirror.resume_token is None and mirror.polled_until is not None
+
+        collection.insert_one(document(3))
+        wait_for(lambda: top(mirror, 3) == 3)
+
+        collection.update_one(
+            {"_id": 1}, {"$set": {"embedding": vector(100), "updated_at": datetime.now(timezone.utc)}}
+        )
+        wait_for(lambda: top(mirror, 100) == 1)
+
+        # Deletes leave nothing to poll, they are found by comparing ids
+        collection.delete_one({"_id": 2})
+        wait_for(lambda: 2 not in mirror.index.slots)
+    finally:
+        mirror.stop()
+
+
+def test_switching_the_embedding_version_resyncs_from_its_field(db, versions, tmp_path):
+    from mirror import IndexMirror
+    from reembed import EmbeddingVersion
+
+    collection = db["chunks"]
+    collection.insert_many([{**document(i), "embedding_v2": vector(1000 + i)} for i in range(3)])
+    mirror = IndexMirror(collection, str(tmp_path), mode="change_stream", versions=versions).start()
+    try:
+        wait_for(lambda: len(mirror.index) == 3)
+        assert top(mirror, 1) == 1
+
+        assert versions.switch(EmbeddingVersion(model="v2", field="embedding_v2", index="vector_index_v2"))
+        wait_for(lambda: mirror.field == "embedding_v2" and mirror.bootstrapped and top(mirror, 1001) == 1)
+    finally:
+        mirror.stop()
+
+    # The checkpoint names the field it was built from
+    assert IndexMirror(collection, str(tmp_path), versions=versions).bootstrapped
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+from orchestrator import AnswerOrchestrator
+
+POST = {"uid": "luz5g88xy27xx", "title": "HMM parameter estimation", "content_text": "How are they estimated?"}
+
+
+class YouTube:
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+
+    def get_top_videos(self, query: str, max_results: int = 1):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [{"videoId": "hmm", "title": "Lecture 7"}]
+
+    def generate_iframe(self, video: dict, start: float = None) -> str:
+        return f"<iframe {video['videoId']}>"
+
+
+def test_timed_out_step_is_reported_and_the_rest_is_kept():
+    def generate(question, documents):
+        time.sleep(0.5)
+        return "too late"
+
+    orchestrator = AnswerOrchestrator(
+        retrieve=lambda post: [{"text": "Count the transitions."}],
+        generate=generate,
+        youtube=YouTube(),
+        generate_timeout=0.05,
+    )
+    start = time.perf_counter()
+    result = orchestrator.answer_sync(POST)
+    orchestrator.close()
+
+    assert time.perf_counter() - start < 0.4
+    assert result["answer"] is None
+    assert result["documents"] == [{"text": "Count the transitions."}]
+    assert result["html"] == "<iframe hmm>"
+    assert result["errors"] == {"generate": "timed out after 0.05s"}
+    assert set(result["timings"]) == {"retrieve", "generate", "video", "total"}
+
+
+def test_failed_video_branch_does_not_block_the_answer():
+    orchestrator = AnswerOrchestrator(
+        retrieve=lambda post: [],
+        generate=lambda question, documents: "Count the transitions.",
+        youtube=YouTube(error=RuntimeError("quota spent")),
+    )
+    result = orchestrator.answer_sync(POST)
+    orchestrator.close()
+
+    assert result["answer"] == "Count the transitions."
+    assert result["video"] is None and result["html"] is None
+    assert result["errors"] == {"video": "quota spent"}
+
+
+def test_cancelling_the_answer_cancels_both_branches():
+    cancelled = []
+
+    async def retrieve(post):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("retrieve")
+            raise
+
+    orchestrator = AnswerOrchestrator(retrieve=retrieve, youtube=YouTube(delay=0.2), retrieve_timeout=10)
+
+    async def run():
+        task = asyncio.ensure_future(orchestrator.answer(POST))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    orchestrator.close()
+    assert cancelled == ["retrieve"]
@@ -0,0 +1,82 @@
+import csv
+import json
+from types import SimpleNamespace
+
+from piazza_ingest import PiazzaIngester
+
+FIELDS = ["Post ID", "Post Created Date", "Post Title", "Folder Name", "Post Content", "Child Content"]
+
+
+class Collection:
+    """
+    The pymongo collection calls of the ingester, over a dict keyed by (source, course, post_id).
+    """
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query: dict, projection: dict = None):
+        for doc in self.docs.values():
+            if all(doc.get(field) == value for field, value in query.items()):
+                yield doc
+
+    def bulk_write(self, requests, ordered=True):
+        upserted = modified = 0
+        for request in requests:
+            key = tuple(request._filter[field] for field in ("source", "course", "post_id"))
+            if key in self.docs:
+                modified += 1
+            else:
+                upserted += 1
+                self.docs[key] = dict(request._filter)
+            self.docs[key].update(request._doc["$set"])
+        return SimpleNamespace(upserted_count=upserted, modified_count=modified)
+
+
+class Embedding:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def write_scrape(path, answers: dict):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for post_id, answer in answers.items():
+            children = {"Child 1": {"type": "i_answer", "content": answer}} if answer else {}
+            writer.writerow(
+                {
+                    "Post ID": post_id,
+                    "Post Created Date": "2024-04-01T00:00:00Z",
+                    "Post Title": f"Question {post_id}",
+                    "Folder Name": "['hw2']",
+                    "Post Content": f"How do I solve part {post_id}?",
+                    "Child Content": json.dumps(children),
+                }
+            )
+
+
+def test_unchanged_threads_are_not_embedded_again(tmp_path):
+    path = tmp_path / "scrape.csv"
+    collection, embedding = Collection(), Embedding()
+    ingester = PiazzaIngester(
+        "course", collection=collection, embedding=embedding, version=SimpleNamespace(field="embedding")
+    )
+
+    write_scrape(path, {"1": "Use dynamic programming.", "2": "Check the base case.", "3": None})
+    first = ingester.run(str(path))
+    assert (first["resolved"], first["embedded"], first["inserted"], first["updated"]) == (2, 2, 2, 0)
+
+    second = ingester.run(str(path))
+    assert (second["unchanged"], second["embedded"], second["inserted"], second["updated"]) == (2, 0, 0, 0)
+
+    # Only the thread whose conversation changed is embedded and overwritten in place
+    write_scrape(path, {"1": "Use dynamic programming.", "2": "Check the base case first.", "3": None})
+    third = ingester.run(str(path))
+    assert (third["unchanged"], third["embedded"], third["inserted"], third["updated"]) == (1, 1, 0, 1)
+    assert len(collection.docs) == 2 and len(embedding.texts) == 3
+    assert "Check the base case first." in collection.docs[("piazza", "course", "2")]["text"]
@@ -0,0 +1,80 @@
+import numpy as np
+import quantization
+from quantization import QuantizedIndex, backfill_quantized, load_index, pack_vector, unpack_vector
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$exists" and (field in doc) != operand:
+                return False
+    return True
+
+
+class Result:
+    def __init__(self, count: int):
+        self.modified_count = count
+
+
+class Collection:
+    """
+    The few pymongo collection calls used by the loaders, over a list of dicts.
+    """
+
+    def __init__(self, docs: list):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    def find(self, query: dict, projection: dict = None):
+        for doc in self.docs.values():
+            if matches(doc, query):
+                yield {k: v for k, v in doc.items() if k == "_id" or projection is None or k in projection}
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            self.docs[request._filter["_id"]].update(request._doc["$set"])
+        return Result(len(requests))
+
+
+def test_each_embedding_field_has_its_own_packed_fields():
+    vector = np.linspace(-1, 1, 8, dtype=np.float32)
+    packed = pack_vector(vector, field="embedding_text_embedding_004")
+    assert set(packed) == {
+        "embedding_text_embedding_004_q",
+        "embedding_text_embedding_004_scale",
+        "embedding_text_embedding_004_dtype",
+    }
+    assert set(pack_vector(vector)) == {"embedding_q", "embedding_scale", "embedding_dtype"}
+    np.testing.assert_allclose(unpack_vector(packed, field="embedding_text_embedding_004"), vector, atol=0.01)
+
+
+def test_loaders_default_to_the_field_of_the_active_version(monkeypatch):
+    rng = np.random.default_rng(0)
+    old, new = rng.standard_normal((20, 8)), rng.standard_normal((20, 8))
+    collection = Collection(
+        [{"_id": i, "course": "cs567", "embedding": list(old[i]), "embedding_new": list(new[i])} for i in range(20)]
+    )
+    monkeypatch.setattr(quantization, "active_field", lambda: "embedding_new")
+
+    assert backfill_quantized(collection) == 20
+    assert "embedding_new_q" in collection.docs[0] and "embedding_q" not in collection.docs[0]
+    index = load_index(collection)
+    assert index.search(new[3], k=1)[0][0] == 3
+
+
+def test_empty_index_finds_nothing():
+    index = QuantizedIndex()
+    query = np.ones(8, dtype=np.float32)
+
+    assert index.search(query, k=5) == []
+    assert index.search(query, k=5, rescore=False) == []
+    assert len(index.approximate_scores(query)) == 0
+    assert index.nbytes == 0
@@ -0,0 +1,64 @@
+from query_prep import SubQueryRetriever, extract_subqueries, reciprocal_rank_fusion
+
+POST = {
+    "title": "HW3 Viterbi",
+    "content_text": (
+        "My Viterbi implementation crashes on the second sentence.\n"
+        "Traceback (most recent call last):\n"
+        '  File "viterbi.py", line 12, in decode\n'
+        "IndexError: index 5 is out of bounds for axis 0 with size 5\n"
+        "Should the backpointer table have one more column? hw3 viterbi"
+    ),
+    "answers": {"followup": [{"subject": "Any update on this?", "feedback": []}]},
+}
+
+
+def test_subqueries_split_title_question_error_and_open_followup():
+    assert extract_subqueries(POST) == [
+        {"kind": "title", "text": "HW3 Viterbi"},
+        {"kind": "question", "text": "Should the backpointer table have one more column?"},
+        {"kind": "error", "text": "IndexError: index 5 is out of bounds for axis 0 with size 5"},
+        {"kind": "followup", "text": "Any update on this?"},
+    ]
+    assert [subquery["kind"] for subquery in extract_subqueries(POST, max_subqueries=2)] == ["title", "question"]
+
+
+def test_duplicate_subqueries_are_dropped():
+    post = {"title": "Is the midterm open book?", "content_text": "Is the midterm open book?", "answers": {}}
+    assert extract_subqueries(post) == [{"kind": "title", "text": "Is the midterm open book?"}]
+    assert extract_subqueries("Where are the slides?") == [{"kind": "question", "text": "Where are the slides?"}]
+
+
+def test_fusion_deduplicates_documents_and_applies_weights():
+    a, b, c = ({"_id": name, "text": name, "score": 0.5} for name in "abc")
+    fused = reciprocal_rank_fusion([[a, b], [{**b, "score": 0.9}, c]], k=10)
+    assert [doc["_id"] for doc in fused] == ["b", "a", "c"]
+    assert fused[0]["matched"] == [0, 1] and fused[0]["score"] == 0.9
+
+    # Weighting the second list puts its top document first
+    weighted = reciprocal_rank_fusion([[a, b], [c, a]], weights=[1.0, 3.0])
+    assert [doc["_id"] for doc in weighted] == ["a", "c", "b"]
+    assert reciprocal_rank_fusion([[a, b], [c, a]], weights=[1.0, 3.0], k=1)[0]["_id"] == "a"
+
+
+class Embedding:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(i)] for i in range(len(texts))]
+
+
+def test_retriever_embeds_every_subquery_in_one_call():
+    embedding = Embedding()
+    results = {0.0: [{"_id": "title"}], 1.0: [{"_id": "question"}], 2.0: [{"_id": "error"}], 3.0: [{"_id": "title"}]}
+    retriever = SubQueryRetriever(
+        embedding=embedding, search=lambda vector, k, pre_filter: results[vector[0]], weights={"error": 3.0}
+    )
+    documents = retriever.retrieve(POST)
+    retriever.close()
+
+    assert len(embedding.calls) == 1 and len(embedding.calls[0]) == 4
+    assert [doc["_id"] for doc in documents] == ["error", "title", "question"]
+    assert documents[1]["matched"] == ["title", "followup"]
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+from quota import QuotaCoordinator, QuotaExhausted, next_quota_reset
+
+
+def test_spent_daily_quota_is_not_retried(tmp_path):
+    coordinator = QuotaCoordinator(path=str(tmp_path / "quota.sqlite3"))
+    calls = []
+
+    def search():
+        calls.append(1)
+        raise RuntimeError('403 {"error": {"errors": [{"reason": "quotaExceeded"}]}}')
+
+    with pytest.raises(RuntimeError):
+        coordinator.call("youtube", search)
+    assert len(calls) == 1
+
+    # Every process sharing the database fails fast until the reset instead of waiting or calling again
+    other = QuotaCoordinator(path=str(tmp_path / "quota.sqlite3"))
+    with pytest.raises(QuotaExhausted) as exhausted:
+        other.acquire("youtube")
+    assert exhausted.value.until == pytest.approx(next_quota_reset())
+    assert 0 < other.utilization()["youtube"]["exhausted_for"] <= 86_400 + 3600
+
+
+def test_exhaustion_ends_at_the_reset(tmp_path):
+    coordinator = QuotaCoordinator(path=str(tmp_path / "quota.sqlite3"))
+    coordinator.report_exhausted("piazza", until=time.time() - 1)
+    assert coordinator.acquire("piazza", timeout=5)
+
+
+def test_next_reset_is_pacific_midnight():
+    # 2024-03-10 is the start of daylight saving time in the US: the day is 23 hours long
+    assert next_quota_reset(1710057600) == 1710140400
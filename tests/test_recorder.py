@@ -0,0 +1,64 @@
+import pytest
+import requests
+from recorder import CallRecorder, ReplayMiss
+from youtube import RelatedYouTubeVideos
+
+
+class Flaky:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, query):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("503 Service Unavailable")
+        return f"answer to {query}"
+
+
+def test_auto_mode_does_not_freeze_a_transient_error(tmp_path):
+    recorder = CallRecorder(str(tmp_path / "calls.sqlite3"), mode="auto")
+    llm = Flaky(failures=1)
+
+    with pytest.raises(RuntimeError):
+        recorder.call("llm", llm, "question")
+    assert recorder.call("llm", llm, "question") == "answer to question"
+    assert recorder.call("llm", llm, "question") == "answer to question"
+    assert llm.calls == 2
+
+
+def test_errors_recorded_in_record_mode_are_replayed(tmp_path):
+    path = str(tmp_path / "calls.sqlite3")
+    with pytest.raises(RuntimeError):
+        CallRecorder(path, mode="record").call("llm", Flaky(failures=1), "question")
+
+    replay = CallRecorder(path, mode="replay")
+    with pytest.raises(RuntimeError, match="503"):
+        replay.call("llm", None, "question")
+    with pytest.raises(ReplayMiss):
+        replay.call("llm", None, "another question")
+
+    # A later auto run calls the service again and keeps the response
+    auto = CallRecorder(path, mode="auto")
+    assert auto.call("llm", Flaky(failures=0), "question") == "answer to question"
+    assert replay.call("llm", None, "question") == "answer to question"
+
+
+def test_rate_limited_youtube_response_is_not_recorded(tmp_path, monkeypatch):
+    recorder = CallRecorder(str(tmp_path / "calls.sqlite3"), mode="auto")
+    monkeypatch.setattr("recorder.get_recorder", lambda: recorder)
+    responses = []
+
+    def fake_get(url, params=None, headers=None):
+        response = requests.Response()
+        response.status_code, response._content = (429, b"{}") if not responses else (200, b'{"items": []}')
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    youtube = RelatedYouTubeVideos(api_key="key", quota=False)
+
+    assert youtube.make_request("https://www.googleapis.com/youtube/v3/search", {"q": "hmm"}) is None
+    assert youtube.make_request("https://www.googleapis.com/youtube/v3/search", {"q": "hmm"}) == {"items": []}
+    assert youtube.make_request("https://www.googleapis.com/youtube/v3/search", {"q": "hmm"}) == {"items": []}
+    assert len(responses) == 2
@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+from rerank import LexicalReranker, RerankStage
+
+
+class SlowReranker:
+    """
+    Scores documents by their "relevance" field, sleeping for every batch.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.batches = []
+
+    def score(self, query: str, docs: list) -> np.ndarray:
+        self.batches.append(len(docs))
+        time.sleep(self.delay)
+        return np.array([doc["relevance"] for doc in docs], dtype=np.float32)
+
+
+def docs(relevance: list) -> list:
+    return [{"text": f"chunk {i}", "relevance": value} for i, value in enumerate(relevance)]
+
+
+def test_out_of_budget_rerank_orders_the_scored_prefix_only():
+    candidates = docs([0.1, 0.9, 0.5, 0.2, 0.8, 1.0, 0.7, 0.3])
+    reranker = SlowReranker(delay=0.03)
+    stage = RerankStage(reranker, top_n=8, budget_ms=10, batch_size=3)
+    ranked = stage.rerank("question", candidates)
+
+    # Only the first batch fits the budget: it is re-ordered, the rest keeps its retrieval order
+    assert reranker.batches == [3]
+    assert [doc["text"] for doc in ranked] == [f"chunk {i}" for i in (1, 2, 0, 3, 4, 5, 6, 7)]
+    assert stage.stats()["scored"] == 3 and stage.stats()["unscored"] == 5 and stage.stats()["over_budget"] == 1
+
+
+def test_rerank_within_budget_orders_everything_and_keeps_top_n():
+    stage = RerankStage(SlowReranker(delay=0), top_n=3, budget_ms=1000, batch_size=3, min_score=0.25)
+    ranked = stage.rerank("question", docs([0.1, 0.9, 0.5, 0.2, 0.8, 1.0, 0.7, 0.3]))
+    assert [doc["text"] for doc in ranked] == ["chunk 5", "chunk 1", "chunk 4"]
+    assert stage.stats()["over_budget"] == 0
+
+
+def test_lexical_reranker_moves_chunks_sharing_rare_words_up():
+    candidates = [
+        {"text": "Office hours are on Tuesday.", "score": 0.82},
+        {"text": "The Viterbi algorithm keeps a backpointer table.", "score": 0.815},
+        {"text": "Office hours move to Zoom this week.", "score": 0.81},
+    ]
+    scores = LexicalReranker().score("How big is the Viterbi backpointer table?", candidates)
+    assert int(np.argmax(scores)) == 1
@@ -0,0 +1,99 @@
+import time
+
+import piazza
+from answer_post import AnswerPublisher
+from fake_piazza import FakePiazza, make_child, make_post
+from scheduler import BotScheduler
+
+
+def fake_backend(posts_per_course: dict) -> FakePiazza:
+    fake = FakePiazza()
+    for network_id, count in posts_per_course.items():
+        for i in range(count):
+            fake.add_post(network_id, make_post(i, f"Question {i}", "<p>How do I compute the gradient?</p>"))
+    return fake
+
+
+def test_courses_share_one_session_and_are_served_round_robin():
+    fake = fake_backend({"busy": 50, "quiet-a": 3, "quiet-b": 3})
+    handled = []
+    scheduler = BotScheduler(handler=lambda bot, post, conv: handled.append(bot.network_id), piazza=fake)
+    for network_id in ("busy", "quiet-a", "quiet-b"):
+        scheduler.add_course(network_id, poll_interval=30)
+
+    assert scheduler.run_once() == 56
+    assert fake.logins == 0
+    # The quiet courses are done within the first rounds instead of waiting behind the busy one
+    assert max(i for i, network_id in enumerate(handled) if network_id != "busy") < 9
+    metrics = scheduler.metrics()
+    assert metrics["busy"]["processed"] == 50
+    assert metrics["quiet-a"]["queue_depth"] == 0
+
+
+def test_handled_and_answered_posts_are_not_queued_again():
+    fake = fake_backend({"course": 3})
+    fake.add_post("course", make_post(3, "Answered", "<p>?</p>", children=[make_child("i_answer", "<p>Yes</p>")]))
+    scheduler = BotScheduler(handler=lambda bot, post, conv: None, piazza=fake)
+    scheduler.add_course("course", poll_interval=30)
+
+    assert scheduler.run_once() == 3
+    scheduler.poll_due(now=time.monotonic() + 60)
+    assert scheduler.run_once() == 0
+    assert scheduler.metrics()["course"]["discovered"] == 3
+
+
+def test_full_queue_drops_posts_and_failures_are_counted():
+    fake = fake_backend({"course": 10})
+
+    def handler(bot, post, conv):
+        if post["post_id"] % 2:
+            raise RuntimeError("LLM unavailable")
+
+    scheduler = BotScheduler(handler=handler, piazza=fake)
+    scheduler.add_course("course", poll_interval=30, max_queue_size=4)
+
+    assert scheduler.run_once() == 4
+    metrics = scheduler.metrics()["course"]
+    assert metrics["dropped"] == 6
+    assert (metrics["processed"], metrics["failed"]) == (2, 2)
+
+
+def test_bot_without_creds_logs_in_with_the_environment(monkeypatch):
+    fake = fake_backend({"course": 1})
+    monkeypatch.setenv("PIAZZA_USER_EMAIL", "ta@example.edu")
+    monkeypatch.setenv("PIAZZA_USER_PASSWORD", "secret")
+    monkeypatch.setattr(piazza, "Piazza", lambda: fake)
+
+    bot = piazza.PiazzaBot(network_id="course")
+    assert fake.logins == 1
+    assert [item["nr"] for item in bot.get_unattended_feeds()] == [0]
+
+
+def test_near_duplicates_of_a_handled_post_get_a_reply_linking_to_it():
+    fake = FakePiazza()
+    fake.add_post("course", make_post(0, "Gradient", "<p>How do I compute the gradient of the loss?</p>"))
+    fake.add_post("course", make_post(1, "Gradient", "<p>How do I compute the gradient of the loss function?</p>"))
+    # Posts without text to compare, like image-only ones, are all answered
+    fake.add_post("course", make_post(2, "HW2", "<p>?</p>"))
+    fake.add_post("course", make_post(3, "HW2", "<p>?</p>"))
+    publisher = AnswerPublisher(fake._rpc_api, ledger_path=":memory:", quota=False, min_interval=0)
+    handled = []
+
+    def handler(bot, post, conv):
+        handled.append((post["post_id"], conv.get("duplicate_of")))
+        if conv.get("duplicate_of"):
+            content = f"<p>This was answered in {conv['duplicate_of']}.</p>"
+        else:
+            content = "<p>Use the chain rule.</p>"
+        publisher.submit(post["uid"], content, nid=bot.network_id)
+
+    scheduler = BotScheduler(handler=handler, piazza=fake)
+    scheduler.add_course("course", poll_interval=30, dedup=True)
+
+    assert scheduler.run_once() == 4
+    publisher.close()
+    assert handled == [(0, None), (1, "cid00000000"), (2, None), (3, None)]
+    metrics = scheduler.metrics()["course"]
+    assert (metrics["processed"], metrics["duplicates"]) == (3, 1)
+    reply = fake._rpc_api.content_get(cid="cid00000001", nid="course")["children"][0]
+    assert reply["history"][0]["content"] == "<p>This was answered in cid00000000.</p>"
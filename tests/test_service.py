@@ -0,0 +1,21 @@
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from orchestrator import AnswerOrchestrator
+from service import create_app
+
+DOCUMENTS = [{"_id": ObjectId("65f1c0ffee0000000000beef"), "text": "Count the transitions.", "score": 0.9}]
+
+
+def test_documents_from_mongodb_are_serialized():
+    orchestrator = AnswerOrchestrator(
+        retrieve=lambda post: DOCUMENTS, generate=lambda question, documents: f"{len(documents)} document(s)"
+    )
+    with TestClient(create_app(orchestrator)) as client:
+        retrieved = client.post("/retrieve", json={"question": "How are HMM transitions estimated?", "k": 1})
+        answered = client.post("/answer", json={"title": "How are HMM transitions estimated?"})
+
+    assert retrieved.status_code == 200
+    assert retrieved.json()["documents"][0]["_id"] == "65f1c0ffee0000000000beef"
+    assert answered.status_code == 200
+    assert answered.json()["answer"] == "1 document(s)"
+    assert answered.json()["documents"][0]["_id"] == "65f1c0ffee0000000000beef"
@@ -0,0 +1,49 @@
+import importlib.util
+import logging
+import os
+import threading
+
+import settings
+from common import settings as common_settings
+
+from conftest import REPO_DIR
+
+
+def load_ingestion_settings():
+    # A process only has one of the two sides as `settings`; load data_ingestion's under another name
+    spec = importlib.util.spec_from_file_location(
+        "ingestion_settings", os.path.join(REPO_DIR, "data_ingestion", "settings.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_both_sides_share_the_common_settings():
+    ingestion_settings = load_ingestion_settings()
+
+    for name in ("config", "get_logger", "configure_logging", "LazyObject", "PiazzaBotConfig"):
+        assert getattr(settings, name) is getattr(common_settings, name)
+        assert getattr(ingestion_settings, name) is getattr(common_settings, name)
+    assert settings.Path.repo_dir == ingestion_settings.Path.repo_dir == REPO_DIR
+    assert settings.Path.agent_dir == os.path.join(REPO_DIR, "virtual_ta", "agent")
+    assert ingestion_settings.Path.ingestion_dir == os.path.join(REPO_DIR, "data_ingestion")
+
+
+def test_loggers_handed_out_concurrently_are_registered_once():
+    names = [f"test_settings.worker{i % 4}" for i in range(64)]
+    start = threading.Barrier(len(names))
+
+    def get(name):
+        start.wait()
+        settings.get_logger(name)
+
+    threads = [threading.Thread(target=get, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {name for name in common_settings._app_loggers if name.startswith("test_settings.")} == set(names)
+    level = logging.getLevelName(common_settings._log_level)
+    assert all(logging.getLogger(name).level == level for name in set(names))
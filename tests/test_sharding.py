@@ -0,0 +1,24 @@
+import numpy as np
+from sharding import ShardedIndex, write_shards
+
+
+def test_dead_worker_is_left_out_and_respawned(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 16)).astype(np.float32)
+    write_shards(str(tmp_path), list(range(200)), vectors, shards=2)
+
+    with ShardedIndex(str(tmp_path), timeout=30) as index:
+        expected = index.search(vectors[7], k=3)
+        assert expected[0][0] == 7
+        index._workers[0].kill()
+        index._workers[0].join()
+
+        # Only the other shard answers while the dead one is replaced
+        partial = index.search(vectors[7], k=3)
+        assert len(partial) == 3
+        stats = index.stats()
+        assert stats["errors"][0] == 1
+        assert stats["restarts"] == [1, 0]
+
+        assert index.search(vectors[7], k=3) == expected
+        assert index.stats()["alive"] == [True, True]
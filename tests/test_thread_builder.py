@@ -0,0 +1,34 @@
+from thread_builder import ConversationThreadBuilder
+
+
+def post(followups: int) -> dict:
+    return {
+        "uid": "luz5g88xy27xx",
+        "title": "HMM parameter estimation",
+        "content_text": "How are the transition probabilities estimated?",
+        "answers": {
+            "i_answer": {"text": "By counting transitions.", "img": []},
+            "s_answer": {"text": "Use Baum-Welch.", "img": []},
+            "followup": [{"subject": f"Follow-up number {i}", "feedback": [], "fid": str(i)} for i in range(followups)],
+        },
+    }
+
+
+def test_truncated_thread_with_omitted_marker_stays_within_budget():
+    full = ConversationThreadBuilder().build(post(30))
+    for max_tokens in range(60, full["tokens"]):
+        thread = ConversationThreadBuilder(max_tokens=max_tokens).build(post(30))
+        assert thread["tokens"] <= max_tokens
+        assert thread["truncated"]
+        # Follow-ups are only kept along with the marker of the omitted ones
+        if "Follow-up:" in thread["conversation"]:
+            assert "earlier follow-up(s) omitted]" in thread["conversation"]
+
+
+def test_unbounded_thread_keeps_everything():
+    thread = ConversationThreadBuilder().build(post(3))
+    assert not thread["truncated"]
+    assert thread["conversation"].endswith("Follow-up: Follow-up number 1\nFollow-up: Follow-up number 2\n")
+    assert thread["conversation"] == "".join(s["text"] for s in thread["segments"])
+    assert thread["conversation"] == ConversationThreadBuilder().render(post(3))
+    assert [s["fid"] for s in thread["segments"] if s["kind"] == "followup"] == ["0", "1", "2"]
@@ -0,0 +1,68 @@
+import pytest
+from transcript import Segment, Transcript
+
+CAPTIONS = [
+    {"start": 0.0, "duration": 4.0, "text": "Welcome to lecture seven."},
+    {"start": 4.0, "duration": 3.5, "text": "Today: hidden\nMarkov models."},
+    # A pause between 7.5 and 20 seconds
+    {"start": 20.0, "duration": 5.0, "text": "The forward algorithm — in O(N²T)."},
+    {"start": 25.0, "duration": 5.0, "text": "Then Viterbi decoding."},
+]
+
+
+def transcript() -> Transcript:
+    return Transcript.from_captions(CAPTIONS)
+
+
+def test_bytes_round_trip():
+    original = transcript()
+    loaded = Transcript.from_bytes(original.to_bytes())
+    assert list(loaded) == list(original)
+    assert loaded[1] == Segment(4.0, 7.5, "Today: hidden Markov models.")
+    assert loaded[2].text == "The forward algorithm — in O(N²T)."
+    assert list(Transcript.from_bytes(Transcript.from_captions([]).to_bytes())) == []
+    with pytest.raises(ValueError):
+        Transcript.from_bytes(b"XXXX" + original.to_bytes()[4:])
+
+
+def test_segment_at_gaps_and_edges():
+    captions = transcript()
+    assert captions.segment_at(-1.0) is None
+    assert captions.segment_at(0.0).text == "Welcome to lecture seven."
+    # A caption ends where the next one starts
+    assert captions.segment_at(4.0).start == 4.0
+    assert captions.segment_at(7.49).start == 4.0
+    assert captions.segment_at(7.5) is None
+    assert captions.segment_at(12.0) is None
+    assert captions.segment_at(29.9).text == "Then Viterbi decoding."
+    assert captions.segment_at(30.0) is None
+    assert Transcript.from_captions([]).segment_at(0.0) is None
+
+
+def test_between_selects_captions_starting_in_range():
+    captions = transcript()
+    assert [segment.start for segment in captions.between(4.0, 25.0)] == [4.0, 20.0]
+    assert [segment.text for segment in captions.between(5.0, 26.0)] == [
+        "The forward algorithm — in O(N²T).",
+        "Then Viterbi decoding.",
+    ]
+    assert len(captions.between(8.0, 19.0)) == 0
+    assert len(captions.between(30.0, 10.0)) == 0
+
+
+def test_window_bounds_skip_empty_and_repeated_windows():
+    captions = transcript()
+    # Windows start at 0, 10, 20 and 30 s: the one at 10 s only covers the pause
+    assert captions.window_bounds(window_seconds=10.0, stride_seconds=10.0).tolist() == [[0, 2], [2, 4]]
+    assert captions.window_bounds(window_seconds=30.0, stride_seconds=10.0).tolist() == [[0, 4], [2, 4]]
+    assert [window.text for window in captions.windows(window_seconds=10.0, stride_seconds=10.0)] == [
+        "Welcome to lecture seven. Today: hidden Markov models.",
+        "The forward algorithm — in O(N²T). Then Viterbi decoding.",
+    ]
+    assert Transcript.from_captions([]).window_bounds().shape == (0, 2)
+
+
+def test_lines_round_trip():
+    captions = transcript()
+    assert captions.to_lines()[1] == "4.0 - 7.5: Today: hidden Markov models."
+    assert list(Transcript.from_lines(captions.to_lines())) == list(captions)
@@ -0,0 +1,33 @@
+from work_queue import DEAD, DONE, PostWorkQueue
+
+
+def feed_item(nr: int) -> dict:
+    return {"nr": nr, "created": "2024-04-01T00:00:00Z", "tags": [], "no_answer_followup": 0}
+
+
+def test_item_whose_leases_keep_expiring_is_dead_lettered():
+    queue = PostWorkQueue(":memory:", max_attempts=2, visibility_timeout=0)
+    queue.put("course", feed_item(1))
+
+    # The worker dies on every attempt: its lease expires without an ack or nack
+    assert [item.attempts for item in queue.lease()] == [1]
+    assert [item.attempts for item in queue.lease()] == [2]
+    assert queue.lease() == []
+    assert queue.dead_letters() == [
+        {"network_id": "course", "post_id": "1", "attempts": 2, "last_error": "lease expired"}
+    ]
+
+
+def test_outcome_of_an_expired_lease_is_ignored():
+    queue = PostWorkQueue(":memory:", max_attempts=3, visibility_timeout=0)
+    queue.put("course", feed_item(1))
+    stale = queue.lease()[0]
+    queue.visibility_timeout = 300
+    current = queue.lease()[0]
+
+    assert not queue.nack(stale, error="late failure")
+    assert not queue.ack(stale)
+    assert queue.stats()["depth"]["leased"] == 1
+    assert queue.ack(current)
+    assert queue.stats()["depth"][DONE] == 1
+    assert queue.stats()["depth"][DEAD] == 0
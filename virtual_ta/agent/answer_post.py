@@ -1,28 +1,248 @@
+import hashlib
 import os
-import sys
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from piazza_api import Piazza
+from quota import get_coordinator, is_rate_limited, retry_after
+from settings import Path, PiazzaBotConfig, get_logger
 
-NOTEBOOKS_DIR = os.path.dirname(__file__)
-REPO_DIR = os.path.dirname(NOTEBOOKS_DIR)
+logger = get_logger(__name__)
 
-sys.path.append(REPO_DIR)
 
-from data_ingestion.settings import piazza_creds
+def answer_hash(content: str) -> str:
+    return hashlib.sha256(content.strip().encode("utf-8")).hexdigest()
 
-p = Piazza()
-p.user_login(email=piazza_creds.PIAZZA_USER_EMAIL, password=piazza_creds.PIAZZA_USER_PASSWORD)
-course = p.network("lurzv0qdtfm55d")
 
-x = p._rpc_api.content_instructor_answer(
-    params={
-        "anonymous": "no",
-        "cid": "luz5g88xy27xx",
-        "content": "This is an new answer for this question?. Revision 55086086087 new msg ytyutitit",
-        "revision": 1000000,
-        "type": "s_answer",
-        "editor": "rte",
-    }
-)
+class RateLimiter:
+    """
+    Spaces calls at least `min_interval` seconds apart across all threads, and lets callers push the next slot back
+    when the server asks to slow down.
+    """
 
-print(x)
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def penalize(self, delay: float):
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + delay)
+
+
+class AnswerPublisher:
+    """
+    Publishes generated answers to Piazza with bounded concurrency, spacing between calls and retries with
+    exponential backoff, or after the Retry-After delay when the failed response carries one.
+
+    Answers are deduplicated by (cid, answer hash) against a local SQLite ledger and against the answer currently on
+    the post, so re-running the bot never posts the same answer twice. Each post is made against the answer's
+    current revision, fetched right before posting.
+    """
+
+    def __init__(
+        self,
+        piazza_rpc,
+        ledger_path: str = None,
+        max_concurrency: int = 4,
+        min_interval: float = 0.5,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        answer_type: str = "s_answer",
+        quota=None,
+    ):
+        """
+        Args:
+            piazza_rpc: The `Piazza._rpc_api` of a logged-in client.
+            ledger_path (str): SQLite file recording published answers, kept across runs. Defaults to
+                `published_answers.sqlite3` under `Path.cache_dir`; ":memory:" only deduplicates within this run.
+            max_concurrency (int): Maximum answers being posted at once.
+            min_interval (float): Minimum seconds between two Piazza calls, when not drawing from a shared quota.
+            max_retries (int): Retries of a failed post before it is recorded as failed.
+            backoff_base (float): Base delay of the exponential backoff, in seconds.
+            answer_type (str): "s_answer" or "i_answer", depending on the role of the bot account.
+            quota (QuotaCoordinator): Calls draw from its shared "piazza" bucket. Defaults to the process
+                coordinator; False spaces calls by a per-publisher `min_interval` instead.
+        """
+        self.rpc = piazza_rpc
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.answer_type = answer_type
+        quota = get_coordinator() if quota is None else quota
+        self.limiter = quota.limiter("piazza") if quota else RateLimiter(min_interval)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="answer-publisher")
+        self._futures = []
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        if ledger_path is None:
+            os.makedirs(Path.cache_dir, exist_ok=True)
+            ledger_path = os.path.join(Path.cache_dir, "published_answers.sqlite3")
+        self._conn = sqlite3.connect(ledger_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS published (cid TEXT NOT NULL, answer_hash TEXT NOT NULL, nid TEXT,"
+            " published_at REAL, PRIMARY KEY (cid, answer_hash))"
+        )
+
+        self.latencies = []
+        self.counts = {"submitted": 0, "published": 0, "duplicates": 0, "retries": 0, "failed": 0}
+        self.failures = []
+
+    def _already_published(self, cid: str, digest: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM published WHERE cid = ? AND answer_hash = ?", (cid, digest)
+            ).fetchone()
+        return row is not None
+
+    def _record(self, cid: str, digest: str, nid: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO published (cid, answer_hash, nid, published_at) VALUES (?, ?, ?, ?)",
+                (cid, digest, nid, time.time()),
+            )
+
+    def current_answer(self, cid: str, nid: str):
+        """
+        Returns the revision to post against and the hash of the answer currently on the post.
+
+        Piazza expects the revision to equal the number of edits of the existing answer, 0 when there is none.
+        """
+        self.limiter.wait()
+        post = self.rpc.content_get(cid=cid, nid=nid)
+        for child in post.get("children", []):
+            if child.get("type") == self.answer_type:
+                history = child.get("history", [])
+                current = answer_hash(history[0]["content"]) if history else None
+                return len(history), current
+        return 0, None
+
+    def submit(self, cid: str, content: str, nid: str = None) -> bool:
+        """
+        Queues an answer for publishing.
+
+        Returns:
+            bool: False when the same answer was already published or is queued for this post.
+        """
+        digest = answer_hash(content)
+        with self._lock:
+            self.counts["submitted"] += 1
+            if (cid, digest) in self._in_flight:
+                self.counts["duplicates"] += 1
+                return False
+            self._in_flight.add((cid, digest))
+
+        if self._already_published(cid, digest):
+            with self._lock:
+                self.counts["duplicates"] += 1
+                self._in_flight.discard((cid, digest))
+            return False
+
+        self._futures.append(self._executor.submit(self._publish, cid, content, digest, nid))
+        return True
+
+    def _publish(self, cid: str, content: str, digest: str, nid: str):
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    revision, current = self.current_answer(cid, nid)
+                    if current == digest:
+                        # Posted by an earlier run whose ledger entry was lost
+                        with self._lock:
+                            self.counts["duplicates"] += 1
+                        self._record(cid, digest, nid)
+                        return
+
+                    self.limiter.wait()
+                    self.rpc.content_instructor_answer(
+                        params={
+                            "anonymous": "no",
+                            "cid": cid,
+                            "content": content,
+                            "revision": revision,
+                            "type": self.answer_type,
+                            "editor": "rte",
+                        }
+                    )
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    # Errors raised by `requests` keep the response, and with it the delay the server asked for
+                    wait = retry_after(getattr(e, "response", None))
+                    delay = self.backoff_base * 2**attempt * (0.5 + random.random()) if wait is None else wait
+                    if wait is not None or is_rate_limited(e):
+                        # Slow every worker down, not just this one
+                        self.limiter.penalize(delay)
+                    with self._lock:
+                        self.counts["retries"] += 1
+                    logger.warning("Posting answer to %s failed (%s), retrying in %.1fs", cid, e, delay)
+                    time.sleep(delay)
+                else:
+                    self._record(cid, digest, nid)
+                    with self._lock:
+                        self.counts["published"] += 1
+                        self.latencies.append(time.perf_counter() - start)
+                    return
+        except Exception as e:
+            logger.error("Giving up on answer to %s: %s", cid, e)
+            with self._lock:
+                self.counts["failed"] += 1
+                self.failures.append({"cid": cid, "error": str(e)})
+        finally:
+            with self._lock:
+                self._in_flight.discard((cid, digest))
+
+    def flush(self):
+        """
+        Blocks until every submitted answer is published or has failed.
+        """
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+        self._conn.close()
+
+    def stats(self) -> dict:
+        """
+        Returns counters and posting latency percentiles in seconds.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+            failures = list(self.failures)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+
+        return {**counts, "latency_p50": percentile(0.5), "latency_p95": percentile(0.95), "failures": failures}
+
+
+if __name__ == "__main__":
+    from piazza_api import Piazza
+
+    piazza_creds = PiazzaBotConfig()
+
+    p = Piazza()
+    p.user_login(email=piazza_creds.PIAZZA_USER_EMAIL, password=piazza_creds.PIAZZA_USER_PASSWORD)
+    network_id = "lurzv0qdtfm55d"
+
+    publisher = AnswerPublisher(p._rpc_api)
+    publisher.submit(cid="luz5g88xy27xx", content="This is an new answer for this question?", nid=network_id)
+    publisher.close()
+
+    logger.info(publisher.stats())
@@ -0,0 +1,239 @@
+import json
+import re
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# Mersenne prime 2^61 - 1, the modulus of the universal hash family simulating permutations
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, k: int = 3) -> List[str]:
+    """
+    Word k-shingles of the normalized text, none when it is shorter than k words: one or two words (e.g. the title
+    of an image-only post) say too little to tell duplicates apart.
+    """
+    words = WORD.findall(text.lower())
+    return [" ".join(words[i : i + k]) for i in range(len(words) - k + 1)]
+
+
+def post_text(post: dict) -> str:
+    return f"{post.get('title') or ''}\n{post.get('content_text') or ''}"
+
+
+def is_answered(post: dict) -> bool:
+    answers = post.get("answers", {})
+    return bool(answers.get("i_answer", {}).get("text") or answers.get("s_answer", {}).get("text"))
+
+
+class MinHasher:
+    """
+    MinHash signatures over mmh3 hashes of word shingles, with `num_perm` permutations simulated by
+    (a * h + b) mod p hash functions computed for all shingles at once.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        import mmh3
+
+        self._hash = mmh3.hash
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Returns None for a text without shingles, which is similar to nothing rather than to every other such text.
+        """
+        tokens = set(shingles(text, self.shingle_size))
+        if not tokens:
+            return None
+        hashes = np.fromiter((self._hash(token, signed=False) for token in tokens), dtype=np.uint64, count=len(tokens))
+        permuted = ((np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index of Piazza posts (title and content text) for finding near-duplicate questions.
+
+    Signatures are split into `bands` bands of `rows` values; posts sharing any band are candidates, which are then
+    kept only when their estimated Jaccard similarity reaches `threshold`. Posts are added one at a time as they are
+    parsed, and a post added again replaces its previous version. Posts with too little text for a signature are not
+    indexed and have no near-duplicates.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 128, bands: int = 32, shingle_size: int = 3):
+        """
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity of word shingles for two posts to be duplicates.
+            num_perm (int): MinHash permutations.
+            bands (int): LSH bands, must divide `num_perm`. More bands find less similar candidates.
+            shingle_size (int): Words per shingle.
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+
+        self._lock = threading.Lock()
+        self._tables: List[Dict[bytes, set]] = [{} for _ in range(bands)]
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.meta: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.signatures
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows : (i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _insert(self, key: str, signature: np.ndarray, meta: dict):
+        if key in self.signatures:
+            self._remove(key)
+        for table, band in zip(self._tables, self._band_keys(signature)):
+            table.setdefault(band, set()).add(key)
+        self.signatures[key] = signature
+        self.meta[key] = meta
+
+    def _remove(self, key: str):
+        for table, band in zip(self._tables, self._band_keys(self.signatures.pop(key))):
+            bucket = table.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[band]
+        self.meta.pop(key, None)
+
+    def add(self, key: str, text: str, meta: dict = None) -> np.ndarray:
+        signature = self.hasher.signature(text)
+        with self._lock:
+            if signature is not None:
+                self._insert(key, signature, meta or {})
+            elif key in self.signatures:
+                self._remove(key)
+        return signature
+
+    def add_post(self, post: dict) -> np.ndarray:
+        """
+        Indexes a parsed post from `PiazzaBot.parse_post_data`, keyed by its uid.
+        """
+        meta = {"post_id": post.get("post_id"), "title": post.get("title"), "answered": is_answered(post)}
+        return self.add(str(post["uid"]), post_text(post), meta)
+
+    def remove(self, key: str):
+        with self._lock:
+            if key in self.signatures:
+                self._remove(key)
+
+    def query(self, text: str = None, signature: np.ndarray = None, exclude: str = None, answered: bool = None):
+        """
+        Returns the indexed posts similar to a text or signature.
+
+        Args:
+            exclude (str): Key left out of the results, usually the queried post itself.
+            answered (bool): Only answered (True) or unanswered (False) posts, both when None.
+
+        Returns:
+            list: (key, estimated similarity) pairs, most similar first.
+        """
+        if signature is None and text is not None:
+            signature = self.hasher.signature(text)
+        if signature is None:
+            return []
+        with self._lock:
+            candidates = set()
+            for table, band in zip(self._tables, self._band_keys(signature)):
+                candidates.update(table.get(band, ()))
+            candidates.discard(exclude)
+            if answered is not None:
+                candidates = {key for key in candidates if self.meta[key].get("answered") == answered}
+            if not candidates:
+                return []
+            keys = list(candidates)
+            matrix = np.stack([self.signatures[key] for key in keys])
+        similarity = (matrix == signature).mean(axis=1)
+        results = [(key, float(s)) for key, s in zip(keys, similarity) if s >= self.threshold]
+        return sorted(results, key=lambda pair: pair[1], reverse=True)
+
+    def cluster(self, posts: Iterable[dict], indexed: bool = False) -> List[dict]:
+        """
+        Indexes a batch of parsed posts and groups near-duplicates among them.
+
+        Args:
+            indexed (bool): The posts were already added (e.g. by `PiazzaBot.parse_post_data`), reuse their
+                signatures instead of hashing them again.
+
+        Returns:
+            list: One dict per cluster, in the order of their first post: "post" (the representative, the first post
+            of the cluster), "duplicates" (the other posts) and "answered" (similar answered threads already in the
+            index, as (uid, similarity) pairs).
+        """
+        posts = list(posts)
+        keys = [str(post["uid"]) for post in posts]
+        parent = list(range(len(posts)))
+        position = {key: i for i, key in enumerate(keys)}
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        if indexed:
+            signatures = [self.signatures.get(key) for key in keys]
+        else:
+            signatures = [self.add_post(post) for post in posts]
+        answered = {}
+        for i, signature in enumerate(signatures):
+            for key, similarity in self.query(signature=signature, exclude=keys[i]):
+                if key in position:
+                    a, b = find(i), find(position[key])
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+                elif self.meta[key].get("answered"):
+                    answered.setdefault(i, []).append((key, similarity))
+
+        clusters = {}
+        for i in range(len(posts)):
+            clusters.setdefault(find(i), []).append(i)
+        result = []
+        for members in clusters.values():
+            links = {}
+            for i in members:
+                for key, similarity in answered.get(i, []):
+                    links[key] = max(similarity, links.get(key, 0.0))
+            result.append(
+                {
+                    "post": posts[members[0]],
+                    "duplicates": [posts[i] for i in members[1:]],
+                    "answered": sorted(links.items(), key=lambda pair: pair[1], reverse=True),
+                }
+            )
+        return result
+
+    def save(self, path: str):
+        with self._lock:
+            keys = list(self.signatures)
+            np.savez(
+                path,
+                keys=np.array(keys),
+                signatures=np.stack([self.signatures[key] for key in keys]) if keys else np.empty((0, 0)),
+                meta=np.array(json.dumps([self.meta[key] for key in keys])),
+            )
+
+    def load(self, path: str) -> "NearDuplicateIndex":
+        with np.load(path) as data:
+            metas = json.loads(str(data["meta"]))
+            with self._lock:
+                for key, signature, meta in zip(data["keys"].tolist(), data["signatures"], metas):
+                    self._insert(key, signature.astype(np.uint32), meta)
+        return self
@@ -0,0 +1,181 @@
+import itertools
+import threading
+import time
+
+
+def make_post(
+    nr: int,
+    subject: str,
+    content: str,
+    created: str = "2024-04-01T00:00:00Z",
+    folders: list = None,
+    children: list = None,
+    tags: list = None,
+) -> dict:
+    """
+    Builds a post payload shaped like the `content.get` response of the Piazza RPC API.
+
+    Args:
+        nr (int): The post number within the course.
+        subject (str): The post title.
+        content (str): The HTML body of the post.
+        created (str): ISO creation timestamp.
+        folders (list): Folder names of the post.
+        children (list): Answers and follow-ups, see `make_child`.
+        tags (list): Post tags, e.g. "instructor-question".
+
+    Returns:
+        dict: The post payload.
+    """
+    return {
+        "id": f"cid{nr:08d}",
+        "nr": nr,
+        "type": "question",
+        "created": created,
+        "folders": folders or [],
+        "tags": tags or [],
+        "history": [{"subject": subject, "content": content, "created": created}],
+        "children": children or [],
+    }
+
+
+def make_child(ctype: str, content: str = "", subject: str = "", children: list = None, uid: str = None) -> dict:
+    """
+    Builds a child entry of a post: an "i_answer", "s_answer" or "followup" (with "feedback" children).
+
+    Args:
+        ctype (str): The child type.
+        content (str): The HTML body for answers.
+        subject (str): The text of follow-ups and feedback.
+        children (list): Nested feedback entries of a follow-up.
+        uid (str): The author ID.
+
+    Returns:
+        dict: The child payload.
+    """
+    child = {"type": ctype, "subject": subject, "uid": uid, "children": children or []}
+    if content:
+        child["history"] = [{"content": content}]
+    return child
+
+
+class FakePiazzaRPC:
+    """
+    In-memory stand-in for `piazza_api.rpc.PiazzaRPC` that serves the calls made by the agents.
+    """
+
+    def __init__(self, backend: "FakePiazza"):
+        self.backend = backend
+
+    def request(self, method: str, data: dict = None, nid: str = None, api_type: str = "logic", **kwargs):
+        """
+        Dispatches a raw RPC call and returns a `{"result": ..., "error": ...}` envelope like the live API.
+        """
+        data = data or {}
+        self.backend.record_call(method)
+
+        if method == "network.filter_feed":
+            # Posts may be added while the feed is read, e.g. by a load simulation
+            with self.backend.lock:
+                posts = self.backend.posts.get(data.get("nid"))
+                posts = None if posts is None else list(posts.values())
+            if posts is None:
+                return {"result": None, "error": "Network not found"}
+            feed = [self.backend.feed_item(post) for post in posts]
+            if data.get("unresolved"):
+                feed = [item for item in feed if item["no_answer"]]
+            return {"result": {"feed": feed}, "error": None}
+
+        if method == "content.get":
+            return {"result": self.content_get(cid=data.get("cid"), nid=data.get("nid")), "error": None}
+
+        return {"result": None, "error": f"Unsupported method {method}"}
+
+    def content_get(self, cid, nid: str = None) -> dict:
+        self.backend.record_call("content.get")
+        with self.backend.lock:
+            posts = list(self.backend.posts[nid].values())
+        for post in posts:
+            if post["id"] == cid or str(post["nr"]) == str(cid):
+                return post
+        raise KeyError(f"Post {cid} not found in {nid}")
+
+    def content_instructor_answer(self, params: dict) -> dict:
+        self.backend.record_call("content.answer")
+        with self.backend.lock:
+            for posts in self.backend.posts.values():
+                for post in posts.values():
+                    if post["id"] == params["cid"]:
+                        answers = [c for c in post["children"] if c["type"] == params["type"]]
+                        if answers and params.get("revision", 0) < len(answers[0].get("history", [])):
+                            raise Exception("The post has been edited since the revision you are replying to")
+                        if answers:
+                            answers[0].setdefault("history", []).insert(0, {"content": params["content"]})
+                        else:
+                            post["children"].append(make_child(params["type"], content=params["content"]))
+                        return {"id": post["id"], "type": params["type"]}
+        raise KeyError(f"Post {params['cid']} not found")
+
+
+class FakeNetwork:
+    def __init__(self, backend: "FakePiazza", network_id: str):
+        self.backend = backend
+        self._nid = network_id
+
+    def iter_all_posts(self, limit: int = None, sleep: float = 0):
+        posts = list(self.backend.posts.get(self._nid, {}).values())
+        yield from itertools.islice(posts, limit)
+
+
+class FakePiazza:
+    """
+    Local fake of the `piazza_api.Piazza` client. Holds posts per course network in memory and counts logins and
+    RPC calls so callers can assert on how the live API would have been used.
+
+    Args:
+        latency (float): Seconds to sleep on every RPC call, to emulate network round trips.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.posts = {}
+        self.logins = 0
+        self.calls = {}
+        self.lock = threading.Lock()
+        self._rpc_api = FakePiazzaRPC(self)
+
+    def user_login(self, email: str = None, password: str = None):
+        self.logins += 1
+
+    def network(self, network_id: str) -> FakeNetwork:
+        self.posts.setdefault(network_id, {})
+        return FakeNetwork(self, network_id)
+
+    def add_post(self, network_id: str, post: dict):
+        with self.lock:
+            self.posts.setdefault(network_id, {})[post["nr"]] = post
+
+    def record_call(self, method: str):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def feed_item(post: dict) -> dict:
+        """
+        Returns the `network.filter_feed` entry for a post.
+        """
+        answered = any(child["type"] == "i_answer" for child in post["children"])
+        return {
+            "id": post["id"],
+            "nr": post["nr"],
+            "type": post["type"],
+            "subject": post["history"][0]["subject"],
+            "created": post["created"],
+            "updated": post["created"],
+            "folders": post["folders"],
+            "tags": post["tags"],
+            "no_answer": 0 if answered else 1,
+            "no_answer_followup": sum(1 for child in post["children"] if child["type"] == "followup"),
+        }
@@ -0,0 +1,86 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_png(width: int = 1600, height: int = 1200, seed: int = 0) -> bytes:
+    """
+    Generates a PNG with some structure so that resizing and compression do real work.
+    """
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, 40):
+        draw.line([(i, 0), (width - i, height)], fill=((i * 7 + seed) % 255, (i * 3) % 255, 120), width=3)
+    draw.text((20, 20), f"Screenshot {seed}: Traceback (most recent call last)", fill=(0, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class LocalHTTPStub:
+    """
+    Threaded local HTTP server serving fixed payloads by path, with an optional artificial latency per request.
+    Stands in for cdn-uploads.piazza.com in tests and benchmarks.
+
+    Usage:
+        with LocalHTTPStub({"/a.png": make_png()}, latency=0.05) as stub:
+            requests.get(stub.url("/a.png"))
+    """
+
+    def __init__(self, routes: dict, latency: float = 0.0, content_type: str = "image/png"):
+        self.routes = routes
+        self.latency = latency
+        self.content_type = content_type
+        self.hits = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.hits[self.path] = stub.hits.get(self.path, 0) + 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = stub.routes.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", stub.content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "LocalHTTPStub":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path: str) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{path}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
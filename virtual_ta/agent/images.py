@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from settings import Path, config, get_logger
+
+logger = get_logger(__name__)
+
+SUMMARY_PROMPT = """You are a teaching assistant reading an image attached to a student's question on a course forum. \
+Transcribe any text, code or error messages exactly, then briefly describe diagrams, plots or equations so the \
+description can be used to search course material."""
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def default_summarizer(credentials=None) -> Callable[[str, str], str]:
+    """
+    Returns a summarizer backed by `data_ingestion.utils.image_summarize`, sharing one vision model between calls and
+    the "vertex-gemini" quota with the other processes. Calls go through the process `CallRecorder` when one is
+    configured.
+
+    The GCP project, location and credentials are passed from this process's `settings.config`.
+    """
+    if Path.repo_dir not in sys.path:
+        sys.path.append(Path.repo_dir)
+    from data_ingestion.utils import get_vision_model, image_summarize
+    from quota import get_coordinator
+    from recorder import recorded
+
+    model = get_vision_model(
+        project=config.PROJECT_ID, location=config.PROJECT_LOCATION, credentials=credentials or config.CREDENTIALS
+    )
+    quota = get_coordinator()
+
+    def summarize(img_base64: str, prompt: str) -> str:
+        return quota.call("vertex-gemini", image_summarize, img_base64, prompt, model=model)
+
+    return lambda img_base64, prompt: recorded("vertex-gemini:image_summarize", summarize, img_base64, prompt)
+
+
+class ImageCache:
+    """
+    On-disk cache of downsized images and their summaries, keyed by the hash of the source URL.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or os.path.join(Path.cache_dir, "images")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def image_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, f"{url_key(url)}.jpg")
+
+    def summary_path(self, url: str, prompt: str) -> str:
+        prompt_key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{url_key(url)}.{prompt_key}.txt")
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get_image(self, url: str):
+        path = self.image_path(url)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    def put_image(self, url: str, data: bytes):
+        self._atomic_write(self.image_path(url), data)
+
+    def get_summary(self, url: str, prompt: str):
+        path = self.summary_path(url, prompt)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        return None
+
+    def put_summary(self, url: str, prompt: str, summary: str):
+        self._atomic_write(self.summary_path(url, prompt), summary.encode("utf-8"))
+
+
+def downsize(data: bytes, max_side: int = 1024, quality: int = 85) -> bytes:
+    """
+    Fits an image inside `max_side` x `max_side` and re-encodes it as JPEG.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((max_side, max_side))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+class PostImagePipeline:
+    """
+    Downloads the images of Piazza posts concurrently over a pooled HTTP session, caches them downsized on disk and
+    summarizes them with the vision model, so that image text can be added to the retrieval query.
+    """
+
+    def __init__(
+        self,
+        summarizer: Callable[[str, str], str] = None,
+        cache: ImageCache = None,
+        download_workers: int = 8,
+        summarize_workers: int = 2,
+        timeout: float = 10.0,
+        max_side: int = 1024,
+        prompt: str = SUMMARY_PROMPT,
+    ):
+        """
+        Args:
+            summarizer (Callable): Called with (base64 JPEG, prompt), returns the summary. Defaults to
+                `default_summarizer()`, created on first use.
+            cache (ImageCache): Disk cache of images and summaries.
+            download_workers (int): Concurrent downloads, also the size of the HTTP connection pool.
+            summarize_workers (int): Concurrent vision model calls.
+            timeout (float): Per-request timeout in seconds.
+            max_side (int): Longest side of cached images, in pixels.
+            prompt (str): Prompt given to the summarizer.
+        """
+        self._summarizer = summarizer
+        self.cache = cache or ImageCache()
+        self.timeout = timeout
+        self.max_side = max_side
+        self.prompt = prompt
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=download_workers, pool_maxsize=download_workers, max_retries=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._download_pool = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="image-download")
+        self._summarize_pool = ThreadPoolExecutor(max_workers=summarize_workers, thread_name_prefix="image-summary")
+
+    @property
+    def summarizer(self) -> Callable[[str, str], str]:
+        if self._summarizer is None:
+            self._summarizer = default_summarizer()
+        return self._summarizer
+
+    def fetch(self, url: str):
+        """
+        Returns the downsized JPEG bytes of an image, from cache when possible. None when the download fails.
+        """
+        data = self.cache.get_image(url)
+        if data is not None:
+            return data
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = downsize(response.content, max_side=self.max_side)
+        except Exception as e:
+            logger.warning("Could not fetch image %s: %s", url, e)
+            return None
+        self.cache.put_image(url, data)
+        return data
+
+    def fetch_many(self, urls: List[str]) -> List:
+        return list(self._download_pool.map(self.fetch, urls))
+
+    def summarize(self, url: str, data: bytes):
+        summary = self.cache.get_summary(url, self.prompt)
+        if summary is not None:
+            return summary
+        try:
+            summary = self.summarizer(base64.b64encode(data).decode("utf-8"), self.prompt)
+        except Exception as e:
+            logger.warning("Could not summarize image %s: %s", url, e)
+            return None
+        self.cache.put_summary(url, self.prompt, summary)
+        return summary
+
+    def summarize_urls(self, urls: List[str]) -> List:
+        """
+        Downloads and summarizes images, in URL order. Summaries are queued while later downloads are still running,
+        failed images give None.
+        """
+        downloads = [self._download_pool.submit(self.fetch, url) for url in urls]
+        summaries = []
+        for url, download in zip(urls, downloads):
+            data = download.result()
+            summaries.append(None if data is None else self._summarize_pool.submit(self.summarize, url, data))
+        return [summary if summary is None else summary.result() for summary in summaries]
+
+    def enrich(self, post: dict) -> dict:
+        """
+        Returns a copy of a parsed post whose "content_text" ends with the text of its images, and the summaries under
+        "image_text". Error messages in screenshots then reach `query_prep.extract_subqueries` like typed ones. Posts
+        without images are returned as they are.
+        """
+        urls = post.get("image_urls") or []
+        if not urls:
+            return post
+        summaries = [s for s in self.summarize_urls(urls) if s]
+        if not summaries:
+            return post
+        # One summary per line, unmarked, so error lines in them still start their line
+        images = "\n".join(summaries)
+        return {
+            **post,
+            "content_text": f"{post['content_text']}\n\nAttached images:\n{images}",
+            "image_text": summaries,
+        }
+
+    def build_query(self, post: dict) -> str:
+        """
+        Builds the retrieval query of a parsed post with the text of its images appended.
+        """
+        post = self.enrich(post)
+        return f"{post['title']}\n{post['content_text']}"
+
+    def close(self):
+        self._download_pool.shutdown()
+        self._summarize_pool.shutdown()
+        self.session.close()
@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from settings import Path, get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_MODEL = "textembedding-gecko@003"
+
+
+def default_embedding(credentials=None):
+    """
+    Returns the Vertex AI embedding model used for the course material, so lecture windows and questions share the
+    embedding space of the knowledge base.
+    """
+    from langchain_google_vertexai import VertexAIEmbeddings
+
+    return VertexAIEmbeddings(model_name=EMBEDDING_MODEL, credentials=credentials)
+
+
+class LectureIndex:
+    """
+    Local index of embedded caption windows, one `.npz` file per video under the cache directory, searched by brute
+    force cosine similarity in memory.
+    """
+
+    def __init__(self, index_dir: str = None):
+        self.index_dir = index_dir or os.path.join(Path.cache_dir, "lectures")
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        self.videos = {}
+        self._lock = threading.Lock()
+        self._parts = []
+        self._matrix = None
+        self._search_parts = []
+        self._row_part = self._row_offset = None
+        self.load()
+
+    def path(self, video_id: str) -> str:
+        return os.path.join(self.index_dir, f"{video_id}.npz")
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.videos
+
+    def __len__(self) -> int:
+        return sum(len(part["starts"]) for part in self._parts)
+
+    def load(self):
+        for name in sorted(os.listdir(self.index_dir)):
+            if not name.endswith(".npz") or name.endswith(".tmp.npz"):
+                continue
+            with np.load(os.path.join(self.index_dir, name)) as data:
+                self._add_part(
+                    json.loads(str(data["video"])),
+                    data["starts"],
+                    data["ends"],
+                    data["texts"].tolist(),
+                    data["vectors"],
+                )
+
+    def _add_part(self, video: dict, starts, ends, texts: List[str], vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        part = {
+            "video": video,
+            "starts": np.asarray(starts, dtype=np.float32),
+            "ends": np.asarray(ends, dtype=np.float32),
+            "texts": texts,
+            "vectors": vectors / np.where(norms == 0, 1, norms),
+        }
+        with self._lock:
+            self._parts = [p for p in self._parts if p["video"]["videoId"] != video["videoId"]] + [part]
+            self.videos[video["videoId"]] = video
+            self._matrix = None
+
+    def add(self, video: dict, windows: List[dict], vectors):
+        """
+        Adds or replaces the windows of a video and persists them atomically.
+        """
+        starts = [window["start"] for window in windows]
+        ends = [window["end"] for window in windows]
+        texts = [window["text"] for window in windows]
+        tmp_path = f"{self.path(video['videoId'])}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            video=np.array(json.dumps(video)),
+            starts=np.asarray(starts, dtype=np.float32),
+            ends=np.asarray(ends, dtype=np.float32),
+            texts=np.array(texts),
+            vectors=np.asarray(vectors, dtype=np.float32),
+        )
+        os.replace(tmp_path, self.path(video["videoId"]))
+        self._add_part(video, starts, ends, texts, vectors)
+
+    def _ensure_matrix(self):
+        with self._lock:
+            if self._matrix is None:
+                self._search_parts = [part for part in self._parts if len(part["starts"])]
+                lengths = [len(part["starts"]) for part in self._search_parts]
+                if lengths:
+                    self._matrix = np.concatenate([part["vectors"] for part in self._search_parts])
+                    self._row_part = np.repeat(np.arange(len(lengths)), lengths)
+                    self._row_offset = np.concatenate([np.arange(length) for length in lengths])
+            return self._matrix, self._search_parts, self._row_part, self._row_offset
+
+    def search(self, vector, k: int = 3, per_video: int = 1) -> List[dict]:
+        """
+        Returns the best matching caption windows, at most `per_video` of them for each video.
+
+        Returns:
+            list: Dicts with "video", "start", "end", "text" and "score", best first.
+        """
+        matrix, parts, row_part, row_offset = self._ensure_matrix()
+        if matrix is None:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+
+        results, taken = [], {}
+        for row in np.argsort(-scores):
+            part, i = parts[row_part[row]], row_offset[row]
+            video_id = part["video"]["videoId"]
+            if taken.get(video_id, 0) >= per_video:
+                continue
+            taken[video_id] = taken.get(video_id, 0) + 1
+            results.append(
+                {
+                    "video": part["video"],
+                    "start": float(part["starts"][i]),
+                    "end": float(part["ends"][i]),
+                    "text": part["texts"][i],
+                    "score": float(scores[row]),
+                }
+            )
+            if len(results) == k:
+                break
+        return results
+
+
+class LectureWarmup:
+    """
+    Prefetches the transcripts of a course's lecture videos, embeds their caption windows and stores them in a
+    `LectureIndex`, so questions are matched against lecture segments without a live YouTube search.
+
+    Answers come from `match`, which only embeds the question. `match_live` is the on-demand path (search, transcript
+    download and window embedding per question), kept as a fallback and for comparison.
+    """
+
+    def __init__(
+        self,
+        youtube,
+        index: LectureIndex = None,
+        embedding=None,
+        download_workers: int = 4,
+        embed_batch_size: int = 5,
+        window_seconds: float = 30.0,
+        stride_seconds: float = 15.0,
+    ):
+        """
+        Args:
+            youtube (RelatedYouTubeVideos): YouTube client.
+            index (LectureIndex): Local index, defaults to the one under `Path.cache_dir`.
+            embedding: Object with `embed_documents` and `embed_query`, defaults to `default_embedding()`.
+            download_workers (int): Concurrent transcript downloads.
+            embed_batch_size (int): Caption windows per embedding request.
+            window_seconds (float): Length of a caption window.
+            stride_seconds (float): Time between the starts of two windows.
+        """
+        self.youtube = youtube
+        self.index = index if index is not None else LectureIndex()
+        self._embedding = embedding
+        self.download_workers = download_workers
+        self.embed_batch_size = embed_batch_size
+        self.window_seconds = window_seconds
+        self.stride_seconds = stride_seconds
+
+    @property
+    def embedding(self):
+        if self._embedding is None:
+            self._embedding = default_embedding(getattr(self.youtube, "credentials", None))
+        return self._embedding
+
+    def windows(self, video_id: str) -> List[dict]:
+        """
+        Downloads the transcript of a video and groups its captions into overlapping windows, so that an answer
+        spanning a few captions is embedded as one passage.
+        """
+        transcript = self.youtube.download_and_parse_captions(video_id)
+        if transcript is None:
+            return []
+        return [window._asdict() for window in transcript.windows(self.window_seconds, self.stride_seconds)]
+
+    def embed_windows(self, windows: List[dict]):
+        vectors = []
+        for i in range(0, len(windows), self.embed_batch_size):
+            batch = [window["text"] for window in windows[i : i + self.embed_batch_size]]
+            vectors.extend(self.embedding.embed_documents(batch))
+        return vectors
+
+    def resolve_videos(self, video_ids: List[str] = None, playlist_id: str = None, channel_id: str = None):
+        videos = [
+            {"videoId": video_id, "title": video_id, "link": f"https://www.youtube.com/watch?v={video_id}"}
+            for video_id in video_ids or []
+        ]
+        if playlist_id:
+            videos += self.youtube.get_playlist_videos(playlist_id) or []
+        if channel_id:
+            videos += self.youtube.get_channel_videos(channel_id) or []
+        return list({video["videoId"]: video for video in videos}.values())
+
+    def warm(
+        self, video_ids: List[str] = None, playlist_id: str = None, channel_id: str = None, force: bool = False
+    ) -> dict:
+        """
+        Indexes the given videos, skipping the ones already indexed unless `force` is set.
+
+        Transcripts are downloaded concurrently while windows of earlier videos are embedded.
+
+        Returns:
+            dict: Number of videos indexed, skipped and failed, windows embedded and elapsed seconds.
+        """
+        start = time.perf_counter()
+        stats = {"videos": 0, "skipped": 0, "failed": 0, "windows": 0}
+        videos = self.resolve_videos(video_ids, playlist_id, channel_id)
+        pending = []
+        for video in videos:
+            if video["videoId"] in self.index and not force:
+                stats["skipped"] += 1
+            else:
+                pending.append(video)
+
+        with ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix="transcripts") as executor:
+            downloads = [(video, executor.submit(self.windows, video["videoId"])) for video in pending]
+            for video, download in downloads:
+                try:
+                    windows = download.result()
+                    if not windows:
+                        raise ValueError("no captions")
+                    self.index.add(video, windows, self.embed_windows(windows))
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.warning("Could not index video %s: %s", video["videoId"], e)
+                    continue
+                stats["videos"] += 1
+                stats["windows"] += len(windows)
+
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info("Lecture warmup: %s", stats)
+        return stats
+
+    def match(self, query: str, k: int = 1, min_score: float = 0.0) -> List[dict]:
+        """
+        Matches a question against the indexed lecture segments.
+
+        Returns:
+            list: Results of `LectureIndex.search` scoring at least `min_score`.
+        """
+        vector = self.embedding.embed_query(query)
+        return [result for result in self.index.search(vector, k=k) if result["score"] >= min_score]
+
+    def match_live(self, query: str, max_results: int = 1) -> List[dict]:
+        """
+        Cold path: searches YouTube, downloads the transcripts of the results and embeds their windows.
+        """
+        vector = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        results = []
+        for video in self.youtube.get_top_videos(query, max_results=max_results) or []:
+            try:
+                windows = self.windows(video["videoId"])
+            except Exception as e:
+                logger.warning("No transcript for video %s: %s", video["videoId"], e)
+                continue
+            if not windows:
+                continue
+            vectors = np.asarray(self.embed_windows(windows), dtype=np.float32)
+            scores = vectors @ vector / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(vector) + 1e-12)
+            best = int(np.argmax(scores))
+            results.append({"video": video, **windows[best], "score": float(scores[best])})
+        return sorted(results, key=lambda result: result["score"], reverse=True)
+
+    def answer_html(self, query: str, min_score: float = 0.0):
+        """
+        Returns the embed HTML of the best matching lecture segment, from the local index when it has a match and
+        from a live search otherwise. None when nothing matches.
+        """
+        results = self.match(query, min_score=min_score) or self.match_live(query)
+        if not results:
+            return None
+        return self.youtube.generate_iframe(results[0]["video"], start=results[0]["start"])
+
+
+if __name__ == "__main__":
+    import sys
+
+    from settings import APIKeys
+    from youtube import RelatedYouTubeVideos
+
+    api_key = APIKeys()
+    youtube_api = RelatedYouTubeVideos(
+        api_key=api_key.YOUTUBE_API_KEY,
+        sa_credentials_file=os.path.join(Path.secrets_dir, api_key.GCLOUD_SERVICE_ACCOUNT_KEY_PATH),
+    )
+
+    # python lecture_index.py <playlist id>
+    warmup = LectureWarmup(youtube_api)
+    logger.info(warmup.warm(playlist_id=sys.argv[1]))
+    logger.info(warmup.match("How are the transition and emission matrices of an HMM computed?"))
@@ -0,0 +1,258 @@
+import asyncio
+import inspect
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from settings import Path, get_logger
+
+logger = get_logger(__name__)
+
+
+def question_text(post: dict) -> str:
+    return f"{post['title']}\n{post['content_text']}".strip()
+
+
+def knowledge_base_retriever(**kwargs):
+    """
+    `query_prep.SubQueryRetriever` over the knowledge base of the data_ingestion side, for the `retrieve` argument of
+    `AnswerOrchestrator`. Its modules import each other by their bare names, so their directory goes on the path.
+    """
+    if Path.ingestion_dir not in sys.path:
+        sys.path.append(Path.ingestion_dir)
+    from query_prep import SubQueryRetriever
+
+    return SubQueryRetriever(**kwargs)
+
+
+def gemini_generate(credentials=None, model: str = "gemini-pro", temperature: float = 0.2) -> Callable:
+    """
+    `generate` callable answering a question from the retrieved documents, with one chat client shared by every call.
+    """
+    from langchain_google_vertexai import ChatVertexAI
+
+    llm = ChatVertexAI(model=model, credentials=credentials, temperature=temperature)
+
+    def generate(question: str, documents: list) -> str:
+        context = "\n\n".join(doc.get("text", "") for doc in documents)
+        return llm.invoke(
+            f"Use the following context to answer the question.\n\n{context}\n\nQuestion: {question}"
+        ).content
+
+    return generate
+
+
+class AnswerOrchestrator:
+    """
+    Builds a full reply to a parsed Piazza post by running the knowledge-base and lecture-video branches
+    concurrently:
+
+        KB:     images.enrich(post) -> post with its image text, then retrieve(post) -> documents, then
+                generate(question, documents) -> answer
+        video:  local lecture index match, else a live YouTube search, then `generate_iframe`
+
+    Generation starts as soon as retrieval finishes, while the video branch may still be running. Every step has its
+    own timeout: a branch that times out or fails is cancelled and reported in "errors", and the reply is built from
+    whatever finished. Blocking clients run in a bounded thread pool. Their threads cannot be interrupted, so a
+    timed-out call finishes in the background and its result is discarded.
+    """
+
+    def __init__(
+        self,
+        retrieve: Callable = None,
+        generate: Callable = None,
+        youtube=None,
+        lectures=None,
+        images=None,
+        images_timeout: float = 10.0,
+        retrieve_timeout: float = 5.0,
+        generate_timeout: float = 30.0,
+        video_timeout: float = 8.0,
+        min_video_score: float = 0.0,
+        max_workers: int = 8,
+    ):
+        """
+        Args:
+            retrieve (Callable): Called with the parsed post, returns the retrieved documents, e.g.
+                `query_prep.SubQueryRetriever.retrieve`. May be a coroutine function.
+            generate (Callable): Called with (question, documents), returns the answer text. May be a coroutine
+                function. Without it the result only has the documents.
+            youtube (RelatedYouTubeVideos): Used for live video search and to render the iframe.
+            lectures (LectureWarmup): Local lecture index, tried before the live search.
+            images (PostImagePipeline): Adds the text of the post's images to the question before retrieval. Without
+                it, or when it fails or times out, the question is used as posted.
+            images_timeout (float): Seconds allowed for downloading and summarizing the images.
+            retrieve_timeout (float): Seconds allowed for retrieval.
+            generate_timeout (float): Seconds allowed for generation.
+            video_timeout (float): Seconds allowed for the whole video branch.
+            min_video_score (float): Minimum score of a lecture index match.
+            max_workers (int): Threads running blocking clients.
+        """
+        self.retrieve = retrieve
+        self.generate = generate
+        self.youtube = youtube if youtube is not None else getattr(lectures, "youtube", None)
+        self.lectures = lectures
+        self.images = images
+        self.images_timeout = images_timeout
+        self.retrieve_timeout = retrieve_timeout
+        self.generate_timeout = generate_timeout
+        self.video_timeout = video_timeout
+        self.min_video_score = min_video_score
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orchestrator")
+
+    async def _call(self, fn: Callable, *args):
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _timed(self, name: str, coro, timeout: float, timings: dict, errors: dict):
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            errors[name] = f"timed out after {timeout}s"
+        except Exception as e:
+            logger.warning("Branch %s failed: %s", name, e)
+            errors[name] = str(e)
+        finally:
+            timings[name] = time.perf_counter() - start
+        return None
+
+    async def _enrich(self, post: dict, timings: dict, errors: dict) -> dict:
+        if self.images is None or not post.get("image_urls"):
+            return post
+        enriched = await self._timed(
+            "images", self._call(self.images.enrich, post), self.images_timeout, timings, errors
+        )
+        return enriched or post
+
+    async def _kb_branch(self, post: dict, timings: dict, errors: dict):
+        if self.retrieve is None:
+            return None, None
+        post = await self._enrich(post, timings, errors)
+        documents = await self._timed(
+            "retrieve", self._call(self.retrieve, post), self.retrieve_timeout, timings, errors
+        )
+        if documents is None or self.generate is None:
+            return documents, None
+        answer = await self._timed(
+            "generate",
+            self._call(self.generate, question_text(post), documents),
+            self.generate_timeout,
+            timings,
+            errors,
+        )
+        return documents, answer
+
+    def _find_video(self, query: str):
+        if self.lectures is not None:
+            matches = self.lectures.match(query, min_score=self.min_video_score)
+            if not matches:
+                matches = self.lectures.match_live(query)
+            return (matches[0]["video"], matches[0]["start"]) if matches else (None, None)
+        videos = self.youtube.get_top_videos(query, max_results=1)
+        return (videos[0], None) if videos else (None, None)
+
+    async def _video_branch(self, post: dict, timings: dict, errors: dict):
+        if self.youtube is None:
+            return None, None, None
+        found = await self._timed(
+            "video", self._call(self._find_video, question_text(post)), self.video_timeout, timings, errors
+        )
+        video, start = found or (None, None)
+        if video is None:
+            return None, None, None
+        return video, start, self.youtube.generate_iframe(video, start=start)
+
+    async def documents(self, post: dict) -> dict:
+        """
+        Runs retrieval alone.
+
+        Returns:
+            dict: "documents" (None when retrieval did not finish), "timings" and "errors".
+        """
+        timings, errors = {}, {}
+        documents = None
+        if self.retrieve is not None:
+            post = await self._enrich(post, timings, errors)
+            documents = await self._timed(
+                "retrieve", self._call(self.retrieve, post), self.retrieve_timeout, timings, errors
+            )
+        return {"documents": documents, "timings": timings, "errors": errors}
+
+    async def video(self, query: str) -> dict:
+        """
+        Runs the video branch alone for a free-text query.
+
+        Returns:
+            dict: "video", "start" and "html", None when nothing was found, plus "errors".
+        """
+        timings, errors = {}, {}
+        video, start, html = await self._video_branch({"title": query, "content_text": ""}, timings, errors)
+        return {"video": video, "start": start, "html": html, "timings": timings, "errors": errors}
+
+    async def answer(self, post: dict) -> dict:
+        """
+        Returns:
+            dict: "answer", "documents", "video", "start" and "html" (None for the parts that did not finish),
+            "timings" in seconds per step plus "total", and "errors" per failed step.
+        """
+        start = time.perf_counter()
+        timings, errors = {}, {}
+        kb = asyncio.ensure_future(self._kb_branch(post, timings, errors))
+        video = asyncio.ensure_future(self._video_branch(post, timings, errors))
+        try:
+            (documents, answer), (video_info, video_start, html) = await asyncio.gather(kb, video)
+        finally:
+            # Cancelling the caller cancels both branches
+            for task in (kb, video):
+                task.cancel()
+        timings["total"] = time.perf_counter() - start
+        logger.debug("Answered %s in %s", post.get("uid"), timings)
+        return {
+            "answer": answer,
+            "documents": documents,
+            "video": video_info,
+            "start": video_start,
+            "html": html,
+            "timings": timings,
+            "errors": errors,
+        }
+
+    def answer_sync(self, post: dict) -> dict:
+        return asyncio.run(self.answer(post))
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import os
+
+    from images import PostImagePipeline
+    from lecture_index import LectureWarmup
+    from piazza import PiazzaBot
+    from rich.pretty import pretty_repr
+    from settings import APIKeys
+    from youtube import RelatedYouTubeVideos
+
+    api_key = APIKeys()
+    youtube_api = RelatedYouTubeVideos(
+        api_key=api_key.YOUTUBE_API_KEY,
+        sa_credentials_file=os.path.join(Path.secrets_dir, api_key.GCLOUD_SERVICE_ACCOUNT_KEY_PATH),
+    )
+
+    # python orchestrator.py <network id> <post id>
+    bot = PiazzaBot(network_id=sys.argv[1])
+    post, _ = bot.process_post(sys.argv[2])
+    retriever = knowledge_base_retriever()
+    orchestrator = AnswerOrchestrator(
+        retrieve=retriever.retrieve,
+        generate=gemini_generate(credentials=youtube_api.credentials),
+        lectures=LectureWarmup(youtube_api),
+        images=PostImagePipeline(),
+    )
+    logger.info(pretty_repr(orchestrator.answer_sync(post)))
+    orchestrator.close()
+    retriever.close()
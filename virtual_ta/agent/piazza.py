@@ -1,9 +1,12 @@
+import logging
 from pprint import pformat
 from urllib.parse import parse_qs, urlparse
 
 from bs4 import BeautifulSoup
 from piazza_api import Piazza
+from recorder import recorded
 from settings import PiazzaBotConfig, get_logger
+from thread_builder import ConversationThreadBuilder
 
 
 class PiazzaBot:
@@ -11,20 +14,29 @@ class PiazzaBot:
     A bot to interact with Piazza, retrieve unresolved posts, and process them to extract relevant information.
     """
 
-    def __init__(self, network_id: str, creds: PiazzaBotConfig):
+    def __init__(self, network_id: str, creds: PiazzaBotConfig = None, piazza: Piazza = None, dedup_index=None):
         """
         Initializes the PiazzaBot with the given network ID and credentials.
 
         Args:
             network_id (str): The network ID of the Piazza class.
-            creds (PiazzaBotConfig): The configuration object containing Piazza login credentials.
+            creds (PiazzaBotConfig): The configuration object containing Piazza login credentials. Defaults to the
+                credentials of the environment.
+            piazza (Piazza): An already logged-in Piazza client to share between bots. When given, `creds` is not
+                used and no new login is made.
+            dedup_index (NearDuplicateIndex): Index of the posts seen so far, updated by `parse_post_data`. When given,
+                near-duplicate unresolved posts are answered once and linked to similar answered threads.
         """
         self.network_id = network_id
-        self.piazza = Piazza()
+        self.dedup_index = dedup_index
         self.logger = get_logger(name="PiazzaBot")
 
-        # Login to Piazza client
-        self.login(creds)
+        if piazza is None:
+            # Login to Piazza client
+            self.piazza = Piazza()
+            self.login(creds or PiazzaBotConfig())
+        else:
+            self.piazza = piazza
 
         self.course = self.piazza.network(network_id=network_id)
         self.piazza_rpc = self.piazza._rpc_api
@@ -45,7 +57,9 @@ class PiazzaBot:
         Returns:
             list: A list of unresolved posts, or an error message if retrieval fails.
         """
-        response = self.piazza_rpc.request(
+        response = recorded(
+            "piazza:filter_feed",
+            self.piazza_rpc.request,
             method="network.filter_feed",
             data={"nid": self.network_id, "unresolved": 1},
             api_type="logic",
@@ -53,7 +67,7 @@ class PiazzaBot:
         if response["result"] is not None:
             return response["result"]["feed"]
 
-        self.logger.error(f"{response['error']}: '{self.network_id}'")
+        self.logger.error("%s: '%s'", response["error"], self.network_id)
         return {"error": response["error"]}
 
     def get_post_data(self, post_id: str):
@@ -66,7 +80,7 @@ class PiazzaBot:
         Returns:
             dict: The data of the specified post.
         """
-        return self.piazza_rpc.content_get(cid=post_id, nid=self.network_id)
+        return recorded("piazza:content_get", self.piazza_rpc.content_get, cid=post_id, nid=self.network_id)
 
     def parse_s3_url(self, url):
         """
@@ -160,62 +174,110 @@ class PiazzaBot:
                 parsed_data["answers"][atype] = self.parse_answer_data(child)
             elif atype == "followup":
                 parsed_data["answers"]["followup"].append(self.parse_followup_data(child))
+
+        if self.dedup_index is not None:
+            self.dedup_index.add_post(parsed_data)
         return parsed_data
 
-    def create_conversation_thread(self, data: dict, include_followup: bool = True):
+    def create_conversation_thread(self, data: dict, include_followup: bool = True, max_tokens: int = None):
         """
         Creates a conversation thread from the parsed post data.
 
         Args:
             data (dict): The parsed post data.
             include_followup (bool): Whether to include follow-up data in the conversation thread.
+            max_tokens (int): Token budget of the conversation. When exceeded, the question and instructor answer are
+                kept and the newest follow-ups that fit are included. None keeps everything.
 
         Returns:
-            dict: The conversation thread containing UID and conversation text.
+            dict: The conversation thread containing UID, conversation text and its structured segments.
         """
-        thread = {"uid": data["uid"], "conversation": ""}
+        builder = ConversationThreadBuilder(max_tokens=max_tokens)
+        return builder.build(data, include_followup=include_followup)
 
-        conversation = f"""Title: {data["title"]}\n"""
-        conversation += f"Content: {data['content_text']}\n\n"
+    def process_post(self, post_id: str):
+        """
+        Fetches and parses a single post and builds its conversation thread.
 
-        # Add initial answers
-        conversation += "Initial Answers:\n"
-        if data["answers"]["i_answer"]["text"]:
-            conversation += f"Instructor Answer: {data['answers']['i_answer']['text']}\n"
-        if data["answers"]["s_answer"]["text"]:
-            conversation += f"Student Answer: {data['answers']['s_answer']['text']}\n"
-        conversation += "\n"
+        Args:
+            post_id (str): The ID of the post to process.
 
-        if include_followup:
-            # Add follow-ups and feedback
-            conversation += "Follow-ups and Feedback:\n"
-            for followup in data["answers"]["followup"]:
-                conversation += f"Follow-up: {followup['subject']}\n"
-                if followup["feedback"]:
-                    conversation += "Feedback:\n"
-                    for feedback in followup["feedback"]:
-                        conversation += f"- {feedback}\n"
+        Returns:
+            tuple: The parsed post data and its conversation thread.
+        """
+        resp = self.get_post_data(post_id=post_id)
+        resp = self.parse_post_data(resp)
+        conv = self.create_conversation_thread(resp)
+        return resp, conv
 
-        thread["conversation"] = conversation
+    def enqueue_unattended_posts(self, work_queue) -> int:
+        """
+        Adds the unresolved posts of the feed to a persistent work queue instead of processing them inline.
 
-        return thread
+        Args:
+            work_queue (PostWorkQueue): The queue to add the posts to.
 
-    def get_unattended_posts(self):
+        Returns:
+            int: The number of newly queued posts.
         """
-        Retrieves unattended posts and logs their parsed data and conversation threads.
+        feeds = self.get_unattended_feeds()
+        if isinstance(feeds, dict):
+            return 0
+        return work_queue.put_many(self.network_id, feeds)
+
+    def index_posts(self, post_ids) -> int:
+        """
+        Parses posts, typically resolved ones, only to add them to the near-duplicate index.
+
+        Returns:
+            int: The number of indexed posts, 0 without a dedup index.
+        """
+        if self.dedup_index is None:
+            return 0
+        for post_id in post_ids:
+            self.parse_post_data(self.get_post_data(post_id=post_id))
+        return len(self.dedup_index)
+
+    def process_unattended_posts(self) -> list:
+        """
+        Fetches and parses the unresolved posts and groups near-duplicates, so that each group is answered once.
+
+        Returns:
+            list: One dict per group: "post" and "conversation" of the post to answer, "duplicates" (the other parsed
+            posts of the group) and "answered" (uid and similarity of similar answered threads). Without a dedup index
+            every post is its own group.
         """
         feeds = self.get_unattended_feeds()
+        if isinstance(feeds, dict):
+            return []
+        posts = [self.parse_post_data(self.get_post_data(post_id=post["nr"])) for post in feeds]
+        if self.dedup_index is None:
+            groups = [{"post": post, "duplicates": [], "answered": []} for post in posts]
+        else:
+            groups = self.dedup_index.cluster(posts, indexed=True)
+            self.logger.info("%d unresolved posts in %d groups", len(posts), len(groups))
+        for group in groups:
+            group["conversation"] = self.create_conversation_thread(group["post"])
+        return groups
 
-        for post in feeds:
-            resp = self.get_post_data(post_id=post["nr"])
-            resp = self.parse_post_data(resp)
-            self.logger.info(pformat(resp))
-            conv = self.create_conversation_thread(resp)
-            self.logger.info(pformat(conv))
+    def get_unattended_posts(self):
+        """
+        Retrieves unattended posts and logs their parsed data and conversation threads.
+        """
+        for group in self.process_unattended_posts():
+            # pformat is expensive on large posts, only pay for it when the record will be emitted
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(pformat(group["post"]))
+                self.logger.info(pformat(group["conversation"]))
+                if group["duplicates"] or group["answered"]:
+                    duplicates = [post["post_id"] for post in group["duplicates"]]
+                    self.logger.info("Duplicates: %s, similar answered threads: %s", duplicates, group["answered"])
 
 
 if __name__ == "__main__":
+    from dedup import NearDuplicateIndex
+
     piazza_creds = PiazzaBotConfig()
 
-    bot = PiazzaBot(network_id="lurzv0qdtfm55d", creds=piazza_creds)
+    bot = PiazzaBot(network_id="lurzv0qdtfm55d", creds=piazza_creds, dedup_index=NearDuplicateIndex())
     bot.get_unattended_posts()
@@ -0,0 +1,365 @@
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict
+from zoneinfo import ZoneInfo
+
+from pydantic import BaseModel
+
+# Shared with data_ingestion, so it does not import either side's settings module
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    quota_rate REAL NOT NULL,
+    capacity REAL NOT NULL,
+    rate REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    exhausted_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS grants (
+    name TEXT NOT NULL,
+    granted_at REAL NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS grants_by_time ON grants (name, granted_at);
+"""
+
+
+class Quota(BaseModel):
+    # Quota of the external service, in cost units per second
+    per_second: float
+    # Largest burst allowed after an idle period, in cost units
+    burst: float = 1.0
+    # Fraction of the quota targeted, so that clients stay just under it
+    headroom: float = 0.9
+
+
+DEFAULT_QUOTAS: Dict[str, Quota] = {
+    # textembedding-gecko online predictions, see EMBEDDING_QPM in vector_search.py
+    "vertex-embedding": Quota(per_second=1200 / 60, burst=5),
+    "vertex-gemini": Quota(per_second=300 / 60, burst=2),
+    # YouTube Data API: 10,000 units per day, a search costs 100 units and other reads 1
+    "youtube": Quota(per_second=10_000 / 86_400, burst=300),
+    # Piazza has no published limit, the scraper always used one request per second
+    "piazza": Quota(per_second=1.0, burst=1),
+}
+
+YOUTUBE_COSTS = {"search": 100}
+
+# Daily quotas of Google APIs reset at midnight Pacific time
+QUOTA_RESET_TZ = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExhausted(Exception):
+    """
+    Raised instead of waiting when the daily quota of a bucket is spent, since waiting would take hours.
+    """
+
+    def __init__(self, name: str, until: float):
+        super().__init__(f"Daily quota {name} exhausted until {datetime.fromtimestamp(until, QUOTA_RESET_TZ)}")
+        self.name = name
+        self.until = until
+
+
+def is_rate_limited(error: Exception) -> bool:
+    message = str(error).lower()
+    return (
+        "429" in message
+        or "too many" in message
+        or "rate limit" in message
+        or "ratelimitexceeded" in message
+        or "quotaexceeded" in message
+        or "resource exhausted" in message
+        or "resourceexhausted" in message
+    )
+
+
+def is_quota_exhausted(error: Exception) -> bool:
+    """
+    Whether the error is a spent daily quota (the "quotaExceeded" reason of Google APIs) rather than a short-term
+    rate limit: it lasts until the quota resets, so retrying only burns requests.
+    """
+    return "quotaexceeded" in str(error).lower()
+
+
+def next_quota_reset(now: float = None) -> float:
+    """
+    Timestamp of the next daily quota reset.
+    """
+    today = datetime.fromtimestamp(time.time() if now is None else now, QUOTA_RESET_TZ).date()
+    return datetime.combine(today + timedelta(days=1), datetime.min.time(), QUOTA_RESET_TZ).timestamp()
+
+
+def retry_after(response) -> float:
+    """
+    Seconds asked for by the Retry-After header of a `requests` response, None when absent or an HTTP date.
+    """
+    value = getattr(response, "headers", {}).get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class QuotaCoordinator:
+    """
+    Token buckets shared by every process using the same SQLite file, so ingestion, the bot and warmup jobs draw
+    from one budget per external service instead of each limiting itself.
+
+    Each bucket refills at a fraction (`headroom`) of the service quota. The rate adapts to feedback: a 429 blocks
+    the bucket for the Retry-After delay and cuts the rate, successes raise it back in small steps up to the target,
+    so throughput settles just under the quota instead of oscillating around it.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        quotas: Dict[str, Quota] = None,
+        decrease: float = 0.8,
+        recovery_seconds: float = 20.0,
+        min_fraction: float = 0.1,
+        window: float = 60.0,
+    ):
+        """
+        Args:
+            path (str): SQLite database file. Defaults to `.cache/quota.sqlite3` in the repository.
+            quotas (dict): Quota per bucket name, registered on first use. Defaults to `DEFAULT_QUOTAS`.
+            decrease (float): Factor applied to the rate on a 429.
+            recovery_seconds (float): Time for the rate to climb back from the floor to the target under success.
+            min_fraction (float): Lowest rate, as a fraction of the target.
+            window (float): Seconds over which utilization is measured.
+        """
+        if path is None:
+            os.makedirs(DEFAULT_PATH, exist_ok=True)
+            path = os.path.join(DEFAULT_PATH, "quota.sqlite3")
+        self.path = path
+        self.quotas = dict(DEFAULT_QUOTAS if quotas is None else quotas)
+        self.decrease = decrease
+        self.recovery_seconds = recovery_seconds
+        self.min_fraction = min_fraction
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._known = set()
+        self._grants = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Databases created before daily quotas were tracked
+        if "exhausted_until" not in {row[1] for row in self._conn.execute("PRAGMA table_info(buckets)")}:
+            self._conn.execute("ALTER TABLE buckets ADD COLUMN exhausted_until REAL NOT NULL DEFAULT 0")
+
+    def _quota(self, name: str) -> Quota:
+        try:
+            return self.quotas[name]
+        except KeyError:
+            raise KeyError(f"No quota configured for {name!r}") from None
+
+    def _register(self, name: str):
+        if name in self._known:
+            return
+        quota = self._quota(name)
+        target = quota.per_second * quota.headroom
+        # Another process may have registered it with the same quota, keep its state
+        self._conn.execute(
+            "INSERT INTO buckets (name, quota_rate, capacity, rate, tokens, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET quota_rate = excluded.quota_rate, capacity = excluded.capacity,"
+            " rate = MIN(rate, excluded.rate)",
+            (name, target, quota.burst, target, quota.burst, time.time()),
+        )
+        self._known.add(name)
+
+    def _try_acquire(self, name: str, cost: float) -> float:
+        """
+        Takes `cost` tokens if available. Returns 0 on success, otherwise the seconds to wait before trying again.
+        Raises `QuotaExhausted` while the daily quota is spent.
+        """
+        with self._lock:
+            self._register(name)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rate, capacity, tokens, updated_at, blocked_until, exhausted_until = self._conn.execute(
+                    "SELECT rate, capacity, tokens, updated_at, blocked_until, exhausted_until FROM buckets"
+                    " WHERE name = ?",
+                    (name,),
+                ).fetchone()
+                now = time.time()
+                if now < exhausted_until:
+                    raise QuotaExhausted(name, exhausted_until)
+                tokens = min(max(capacity, cost), tokens + max(0.0, now - updated_at) * rate)
+                if now < blocked_until:
+                    wait = blocked_until - now
+                elif tokens >= cost:
+                    tokens -= cost
+                    wait = 0.0
+                    self._conn.execute(
+                        "INSERT INTO grants (name, granted_at, cost) VALUES (?, ?, ?)", (name, now, cost)
+                    )
+                    self._grants += 1
+                    if self._grants % 1000 == 0:
+                        self._conn.execute("DELETE FROM grants WHERE granted_at < ?", (now - 10 * self.window,))
+                else:
+                    wait = (cost - tokens) / rate
+                self._conn.execute("UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, name))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def acquire(self, name: str, cost: float = 1.0, timeout: float = None) -> bool:
+        """
+        Blocks until `cost` units of the `name` quota are available.
+
+        Returns:
+            bool: False when `timeout` seconds passed without getting them.
+
+        Raises:
+            QuotaExhausted: The daily quota is spent, see `report_exhausted`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._try_acquire(name, cost)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            # Capped so that a raised rate or a lifted block is noticed, jittered so processes do not wake together
+            time.sleep(min(wait, 1.0) * (1 + 0.1 * random.random()))
+
+    def report_throttled(self, name: str, delay: float = None):
+        """
+        Records a 429 from the service: blocks the bucket for `delay` seconds (the Retry-After value when given, one
+        refill interval otherwise) and lowers its rate for every process.
+        """
+        with self._lock:
+            self._register(name)
+            now = time.time()
+            self._conn.execute(
+                "UPDATE buckets SET rate = MAX(quota_rate * ?, rate * ?), tokens = 0, updated_at = ?,"
+                " blocked_until = MAX(blocked_until, ? + COALESCE(?, 1.0 / rate)), throttled = throttled + 1"
+                " WHERE name = ?",
+                (self.min_fraction, self.decrease, now, now, delay, name),
+            )
+        logger.warning("Quota %s throttled by the service, backing off %s", name, delay)
+
+    def report_exhausted(self, name: str, until: float = None):
+        """
+        Records that the daily quota is spent: until `until` (the next reset by default) `acquire` raises
+        `QuotaExhausted` in every process instead of letting calls through to be refused.
+        """
+        until = next_quota_reset() if until is None else until
+        with self._lock:
+            self._register(name)
+            self._conn.execute(
+                "UPDATE buckets SET tokens = 0, updated_at = ?, exhausted_until = MAX(exhausted_until, ?)"
+                " WHERE name = ?",
+                (time.time(), until, name),
+            )
+        logger.warning("Daily quota %s exhausted until %s", name, datetime.fromtimestamp(until, QUOTA_RESET_TZ))
+
+    def report_success(self, name: str):
+        """
+        Records a successful call: raises the rate of the bucket by one step towards its target.
+        """
+        with self._lock:
+            self._register(name)
+            self._conn.execute(
+                "UPDATE buckets SET rate = MIN(quota_rate, rate + quota_rate * ?) WHERE name = ? AND rate < quota_rate",
+                ((1 - self.min_fraction) / max(1.0, self.recovery_seconds * self._quota(name).per_second), name),
+            )
+
+    def call(self, name: str, fn: Callable, *args, cost: float = 1.0, max_retries: int = 5, **kwargs):
+        """
+        Calls `fn` under the `name` quota, retrying with backoff when it raises a rate-limit error. A spent daily
+        quota is not retried, it marks the bucket exhausted until the reset.
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire(name, cost)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if is_quota_exhausted(e):
+                    self.report_exhausted(name)
+                    raise
+                if attempt == max_retries or not is_rate_limited(e):
+                    raise
+                self.report_throttled(name, getattr(e, "retry_after", None) or 2**attempt)
+            else:
+                self.report_success(name)
+                return result
+
+    def limiter(self, name: str) -> "QuotaLimiter":
+        return QuotaLimiter(self, name)
+
+    def utilization(self) -> dict:
+        """
+        Returns, per bucket: the quota, the current adaptive rate, the rate actually granted over the last `window`
+        seconds, utilization (granted rate / quota), seconds left blocked, seconds left until a spent daily quota
+        resets and 429s seen.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM grants WHERE granted_at < ?", (now - 10 * self.window,))
+            rows = self._conn.execute(
+                "SELECT b.name, b.quota_rate, b.rate, b.blocked_until, b.exhausted_until, b.throttled,"
+                " COALESCE(SUM(g.cost), 0),"
+                " MIN(g.granted_at) FROM buckets b LEFT JOIN grants g ON g.name = b.name AND g.granted_at >= ?"
+                " GROUP BY b.name",
+                (now - self.window,),
+            ).fetchall()
+        stats = {}
+        for name, target, rate, blocked_until, exhausted_until, throttled, granted, first_grant in rows:
+            quota = self.quotas[name].per_second if name in self.quotas else target
+            # A bucket used for less than the window is measured over the time it has been used
+            span = min(self.window, max(1.0, now - first_grant)) if first_grant else self.window
+            stats[name] = {
+                "quota_per_sec": quota,
+                "rate_per_sec": rate,
+                "granted_per_sec": granted / span,
+                "utilization": granted / span / quota if quota else None,
+                "blocked_for": max(0.0, blocked_until - now),
+                "exhausted_for": max(0.0, exhausted_until - now),
+                "throttled": throttled,
+            }
+        return stats
+
+    def close(self):
+        self._conn.close()
+
+
+class QuotaLimiter:
+    """
+    Adapter with the `wait`/`penalize` interface of `answer_post.RateLimiter`, drawing from a shared bucket.
+    """
+
+    def __init__(self, coordinator: QuotaCoordinator, name: str):
+        self.coordinator = coordinator
+        self.name = name
+
+    def wait(self, cost: float = 1.0):
+        self.coordinator.acquire(self.name, cost)
+
+    def penalize(self, delay: float):
+        self.coordinator.report_throttled(self.name, delay)
+
+
+@lru_cache(maxsize=1)
+def get_coordinator() -> QuotaCoordinator:
+    """
+    The coordinator of this process, on the database named by the QUOTA_DB environment variable or the default one.
+    """
+    return QuotaCoordinator(path=os.environ.get("QUOTA_DB"))
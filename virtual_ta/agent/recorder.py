@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache, wraps
+from typing import Callable
+
+# Shared with data_ingestion, so it does not import either side's settings module
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".cache")
+
+MODES = ("off", "record", "replay", "auto")
+TIMINGS = ("instant", "recorded")
+
+# Request fields holding credentials: left out of the key so recordings replay with other (or no) credentials
+REDACTED = {"key", "api_key", "access_token", "authorization", "password", "credentials"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    latency REAL NOT NULL,
+    error INTEGER NOT NULL DEFAULT 0,
+    payload BLOB NOT NULL
+);
+"""
+
+
+class ReplayMiss(KeyError):
+    """
+    Raised in replay mode for a call that was never recorded.
+    """
+
+
+def canonical(value):
+    """
+    JSON-serializable form of request arguments, independent of dict ordering. Clients, models and other objects
+    without a data form are reduced to their type, since they do not change what is asked.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {
+            str(k): canonical(v)
+            for k, v in sorted(value.items(), key=lambda item: str(item[0]))
+            if str(k).lower() not in REDACTED
+        }
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(json.dumps(canonical(v), sort_keys=True) for v in value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if hasattr(value, "model_dump"):
+        return canonical(value.model_dump())
+    if hasattr(value, "page_content"):
+        return {"page_content": value.page_content, "metadata": canonical(getattr(value, "metadata", {}))}
+    if hasattr(value, "tolist"):
+        return canonical(value.tolist())
+    return {"type": type(value).__qualname__}
+
+
+def request_key(namespace: str, args: tuple = (), kwargs: dict = None) -> str:
+    payload = json.dumps([namespace, canonical(list(args)), canonical(kwargs or {})], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CallRecorder:
+    """
+    Records the responses of external calls (LLM, embeddings, YouTube, Piazza) with their latency, and replays them
+    so that benchmarks and dev runs are reproducible and work without network access.
+
+    Calls are keyed by a hash of their namespace and canonicalized arguments, credentials excluded. Responses are
+    pickled, compressed and stored in a SQLite file that several processes can share. Errors raised by the live call
+    are only recorded in "record" mode, and raised again on replay; "auto" never serves them, so that a transient
+    failure does not become permanent.
+
+    Modes:
+        record  always call the live service and store the response or error, replacing an older recording
+        replay  only serve recordings, raise `ReplayMiss` for anything else
+        auto    serve recorded responses, call and record what is missing or was recorded as an error
+        off     call the live service, store nothing
+    """
+
+    def __init__(self, path: str = None, mode: str = "auto", timing: str = "instant", speed: float = 1.0):
+        """
+        Args:
+            path (str): SQLite database file. Defaults to `.cache/recordings.sqlite3` in the repository.
+            mode (str): One of `MODES`.
+            timing (str): "instant" returns replayed responses immediately, "recorded" waits for the recorded
+                latency, so that timings in replay match the live run.
+            speed (float): Divides the recorded latency in "recorded" timing.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if timing not in TIMINGS:
+            raise ValueError(f"timing must be one of {TIMINGS}")
+        if path is None:
+            os.makedirs(DEFAULT_PATH, exist_ok=True)
+            path = os.path.join(DEFAULT_PATH, "recordings.sqlite3")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.speed = speed
+
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "recorded": 0, "live_seconds": 0.0, "replayed_seconds": 0.0}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _load(self, key: str):
+        with self._lock:
+            return self._conn.execute("SELECT latency, error, payload FROM calls WHERE key = ?", (key,)).fetchone()
+
+    def _store(self, key: str, namespace: str, latency: float, error: bool, value):
+        try:
+            payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            logger.warning("Cannot record %s response: %s", namespace, e)
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO calls (key, namespace, recorded_at, latency, error, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, time.time(), latency, int(error), payload),
+            )
+            self._stats["recorded"] += 1
+
+    def _replay(self, row):
+        latency, error, payload = row
+        if self.timing == "recorded":
+            time.sleep(latency / self.speed)
+        value = pickle.loads(zlib.decompress(payload))
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["replayed_seconds"] += latency
+        if error:
+            raise value
+        return value
+
+    def _live(self, key: str, namespace: str, fn: Callable, args: tuple, kwargs: dict):
+        start = time.perf_counter()
+        try:
+            value = fn(*args, **kwargs)
+        except Exception as e:
+            if self.mode == "record":
+                self._store(key, namespace, time.perf_counter() - start, True, e)
+            raise
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._stats["live_seconds"] += latency
+        self._store(key, namespace, latency, False, value)
+        return value
+
+    def call(self, namespace: str, fn: Callable, *args, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` through the recorder. `namespace` names the service and operation, e.g.
+        "youtube:search", and must change when the same arguments would get a different response.
+        """
+        if self.mode == "off":
+            return fn(*args, **kwargs)
+        key = request_key(namespace, args, kwargs)
+        if self.mode != "record":
+            row = self._load(key)
+            # row[1] is the error flag: "auto" calls again instead of replaying a failure
+            if row is not None and not (row[1] and self.mode == "auto"):
+                return self._replay(row)
+            with self._lock:
+                self._stats["misses"] += 1
+            if self.mode == "replay":
+                raise ReplayMiss(f"No recording of {namespace} call {key[:12]}")
+        return self._live(key, namespace, fn, args, kwargs)
+
+    def wrap(self, namespace: str, fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(namespace, fn, *args, **kwargs)
+
+        return wrapper
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses and recorded calls, seconds spent in live calls and seconds of recorded latency
+        replayed, plus the number of recordings and their stored size per namespace.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*), SUM(LENGTH(payload)) FROM calls GROUP BY namespace"
+            ).fetchall()
+        stats["namespaces"] = {namespace: {"calls": count, "bytes": size} for namespace, count, size in rows}
+        return stats
+
+    def clear(self, namespace: str = None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM calls")
+            else:
+                self._conn.execute("DELETE FROM calls WHERE namespace = ?", (namespace,))
+
+    def close(self):
+        self._conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_recorder():
+    """
+    The recorder of this process, configured by the RECORD_MODE ("off" by default), RECORD_TIMING and RECORD_DB
+    environment variables. None when recording is off, so that call sites pay nothing.
+    """
+    mode = os.environ.get("RECORD_MODE", "off")
+    if mode == "off":
+        return None
+    return CallRecorder(path=os.environ.get("RECORD_DB"), mode=mode, timing=os.environ.get("RECORD_TIMING", "instant"))
+
+
+def recorded(namespace: str, fn: Callable, *args, **kwargs):
+    """
+    Calls `fn` through the process recorder when one is configured, directly otherwise.
+    """
+    recorder = get_recorder()
+    if recorder is None:
+        return fn(*args, **kwargs)
+    return recorder.call(namespace, fn, *args, **kwargs)
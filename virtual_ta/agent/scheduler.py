@@ -0,0 +1,342 @@
+import heapq
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from dedup import NearDuplicateIndex
+from piazza import PiazzaBot
+from pydantic import BaseModel, Field
+from settings import PiazzaBotConfig, get_logger
+
+logger = get_logger(__name__)
+
+
+class CourseConfig(BaseModel):
+    network_id: str
+    # Seconds between two polls of the course feed
+    poll_interval: float = Field(default=60.0, gt=0)
+    # Upper bound on posts waiting in the course queue, new posts are dropped until it drains
+    max_queue_size: int = Field(default=500, gt=0)
+    # Skip posts that are near-duplicates of a post already handled in the course
+    dedup: bool = False
+
+
+class CourseMetrics:
+    """
+    Counters for a single course network.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.polls = 0
+        self.poll_errors = 0
+        self.discovered = 0
+        self.dropped = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.last_poll_at = None
+
+    def snapshot(self, queue_depth: int, in_flight: int) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "discovered": self.discovered,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "queue_depth": queue_depth,
+            "in_flight": in_flight,
+            "throughput_per_min": self.processed / elapsed * 60,
+            "last_poll_at": self.last_poll_at,
+        }
+
+
+class _Course:
+    def __init__(self, config: CourseConfig, bot: PiazzaBot):
+        self.config = config
+        self.bot = bot
+        self.queue = deque()
+        # Posts queued or being processed, so that repeated polls do not enqueue them twice
+        self.pending = set()
+        # Posts handled successfully, they stay in the unresolved feed until the answer is published
+        self.done = set()
+        # Uids of the posts passed to the handler, matched against the near-duplicate index
+        self.handled = set()
+        self.in_flight = 0
+        self.metrics = CourseMetrics()
+
+
+class BotScheduler:
+    """
+    Runs TA bots for many Piazza course networks in one process.
+
+    All courses share a single logged-in Piazza session. Each course is polled on its own interval and discovered
+    posts go to a per-course queue. Workers pull from the queues round-robin, one post per course per turn, so a
+    busy course cannot starve the others.
+
+    The `handler` is called as `handler(bot, parsed_post, conversation)` for every post. Build it once around the
+    embedding/LLM clients so they are shared by all courses. For a near-duplicate of a post already handled in a
+    dedup course, the conversation has a "duplicate_of" key with the uid of that post, so the handler can reply with
+    a link to it instead of generating a new answer.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[PiazzaBot, dict, dict], None],
+        piazza=None,
+        creds: PiazzaBotConfig = None,
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            handler (Callable): Called with the bot, the parsed post and its conversation thread.
+            piazza (Piazza): A logged-in Piazza client. When omitted, one is created and logged in with `creds`.
+            creds (PiazzaBotConfig): Login credentials, used only when `piazza` is not given.
+            max_workers (int): Maximum number of posts processed concurrently across all courses.
+        """
+        if piazza is None:
+            from piazza_api import Piazza
+
+            creds = creds or PiazzaBotConfig()
+            piazza = Piazza()
+            piazza.user_login(email=creds.PIAZZA_USER_EMAIL, password=creds.PIAZZA_USER_PASSWORD)
+
+        self.piazza = piazza
+        self.handler = handler
+        self.max_workers = max_workers
+
+        self._courses: Dict[str, _Course] = {}
+        self._poll_heap = []
+        self._rr = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_workers)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+
+    def add_course(self, network_id: str, poll_interval: float = 60.0, max_queue_size: int = 500, dedup: bool = False):
+        """
+        Registers a course network. It is polled on the next scheduler tick.
+
+        With `dedup`, the course bot gets its own `NearDuplicateIndex` and a post similar to one already handled is
+        passed to the handler with the uid of that post as "duplicate_of" and counted as a duplicate.
+        """
+        config = CourseConfig(
+            network_id=network_id, poll_interval=poll_interval, max_queue_size=max_queue_size, dedup=dedup
+        )
+        with self._lock:
+            if network_id in self._courses:
+                raise ValueError(f"Course {network_id} is already scheduled")
+            bot = PiazzaBot(
+                network_id=network_id, piazza=self.piazza, dedup_index=NearDuplicateIndex() if dedup else None
+            )
+            self._courses[network_id] = _Course(config, bot)
+            heapq.heappush(self._poll_heap, (time.monotonic(), network_id))
+            self._rr.append(network_id)
+        self._wakeup.set()
+
+    def poll_due(self, now: float = None) -> int:
+        """
+        Polls every course whose interval has elapsed and enqueues newly discovered posts.
+
+        Returns:
+            int: The number of courses polled.
+        """
+        now = time.monotonic() if now is None else now
+        polled = 0
+        while True:
+            with self._lock:
+                if not self._poll_heap or self._poll_heap[0][0] > now:
+                    break
+                _, network_id = heapq.heappop(self._poll_heap)
+                course = self._courses[network_id]
+                heapq.heappush(self._poll_heap, (now + course.config.poll_interval, network_id))
+            self._poll(course)
+            polled += 1
+        return polled
+
+    def _poll(self, course: _Course):
+        metrics = course.metrics
+        metrics.polls += 1
+        metrics.last_poll_at = time.time()
+        try:
+            feed = course.bot.get_unattended_feeds()
+        except Exception as e:
+            metrics.poll_errors += 1
+            logger.error("Polling %s failed: %s", course.config.network_id, e)
+            return
+
+        if isinstance(feed, dict):
+            # get_unattended_feeds returns {"error": ...} when the RPC fails
+            metrics.poll_errors += 1
+            return
+
+        with self._lock:
+            for item in feed:
+                post_id = item["nr"]
+                if post_id in course.pending or post_id in course.done:
+                    continue
+                if len(course.queue) >= course.config.max_queue_size:
+                    metrics.dropped += 1
+                    continue
+                course.queue.append(post_id)
+                course.pending.add(post_id)
+                metrics.discovered += 1
+
+    def _next_job(self):
+        """
+        Picks the next post round-robin across courses with queued work.
+        """
+        with self._lock:
+            for _ in range(len(self._rr)):
+                network_id = self._rr[0]
+                self._rr.rotate(-1)
+                course = self._courses[network_id]
+                if course.queue:
+                    course.in_flight += 1
+                    return course, course.queue.popleft()
+        return None
+
+    def _handled_duplicate(self, course: _Course, post: dict):
+        """
+        Returns the uid of an already handled post that `post` is a near-duplicate of, None when there is none.
+        """
+        index = course.bot.dedup_index
+        if index is None:
+            return None
+        uid = str(post["uid"])
+        for key, _ in index.query(signature=index.signatures.get(uid), exclude=uid):
+            with self._lock:
+                if key in course.handled:
+                    return key
+        return None
+
+    def _process(self, course: _Course, post_id):
+        try:
+            post, conversation = course.bot.process_post(post_id=post_id)
+            original = self._handled_duplicate(course, post)
+            if original is not None:
+                conversation = {**conversation, "duplicate_of": original}
+            self.handler(course.bot, post, conversation)
+        except Exception as e:
+            logger.error("Processing post %s of %s failed: %s", post_id, course.config.network_id, e)
+            with self._lock:
+                course.metrics.failed += 1
+        else:
+            with self._lock:
+                if original is None:
+                    course.metrics.processed += 1
+                    course.handled.add(str(post["uid"]))
+                else:
+                    course.metrics.duplicates += 1
+                    logger.info("Post %s of %s duplicates %s", post_id, course.config.network_id, original)
+                course.done.add(post_id)
+        finally:
+            with self._lock:
+                course.in_flight -= 1
+                course.pending.discard(post_id)
+            self._slots.release()
+            self._wakeup.set()
+
+    def dispatch(self, executor=None, block: bool = False) -> int:
+        """
+        Hands queued posts to worker threads while there are free worker slots.
+
+        Args:
+            executor: The executor to submit to. When None, posts are processed inline.
+            block (bool): Wait for a free slot instead of returning when all workers are busy.
+
+        Returns:
+            int: The number of posts dispatched.
+        """
+        dispatched = 0
+        while True:
+            if not self._slots.acquire(blocking=block and dispatched == 0):
+                break
+            job = self._next_job()
+            if job is None:
+                self._slots.release()
+                break
+            if executor is None:
+                self._process(*job)
+            else:
+                executor.submit(self._process, *job)
+            dispatched += 1
+        return dispatched
+
+    def run_once(self) -> int:
+        """
+        Polls due courses and processes everything queued inline. Useful for cron-style runs and tests.
+
+        Returns:
+            int: The number of posts processed.
+        """
+        self.poll_due()
+        total = 0
+        while True:
+            dispatched = self.dispatch()
+            if not dispatched:
+                return total
+            total += dispatched
+
+    def run(self):
+        """
+        Runs the scheduler until `stop` is called.
+        """
+        self._stop.clear()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="piazza-bot") as executor:
+            self._executor = executor
+            while not self._stop.is_set():
+                self._wakeup.clear()
+                self.poll_due()
+                self.dispatch(executor)
+                self._wakeup.wait(timeout=self._seconds_to_next_poll())
+            self._executor = None
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _seconds_to_next_poll(self) -> float:
+        with self._lock:
+            if not self._poll_heap:
+                return 1.0
+            return max(0.0, self._poll_heap[0][0] - time.monotonic())
+
+    def metrics(self) -> dict:
+        """
+        Returns per-course throughput and queue depth metrics keyed by network ID.
+        """
+        with self._lock:
+            return {
+                network_id: course.metrics.snapshot(queue_depth=len(course.queue), in_flight=course.in_flight)
+                for network_id, course in self._courses.items()
+            }
+
+
+if __name__ == "__main__":
+    from fake_piazza import FakePiazza, make_post
+    from rich.pretty import pretty_repr
+
+    # Demo against the local fake backend: one busy course and two quiet ones
+    fake = FakePiazza(latency=0.002)
+    for i in range(200):
+        fake.add_post("busy", make_post(i, f"Question {i}", "<p>How do I compute the gradient?</p>"))
+    for nid in ("quiet-a", "quiet-b"):
+        for i in range(5):
+            fake.add_post(nid, make_post(i, f"Question {i}", "<p>When is the midterm?</p>"))
+
+    order = []
+    scheduler = BotScheduler(handler=lambda bot, post, conv: order.append(bot.network_id), piazza=fake)
+    for nid in ("busy", "quiet-a", "quiet-b"):
+        scheduler.add_course(nid, poll_interval=30)
+
+    scheduler.run_once()
+    logger.info("Quiet courses finished within the first %d posts", max(i for i, n in enumerate(order) if n != "busy"))
+    logger.info(pretty_repr(scheduler.metrics()))
+    logger.info("Piazza logins: %d", fake.logins)
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict
+
+from bson import ObjectId
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from orchestrator import AnswerOrchestrator
+from pydantic import BaseModel, Field
+from settings import ServiceConfig, get_logger
+
+logger = get_logger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+def request_key(*parts) -> str:
+    return hashlib.sha256("\x00".join(normalize(str(part)) for part in parts).encode("utf-8")).hexdigest()
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the work, later callers await its result
+    instead of starting their own. The key is forgotten as soon as the work finishes, so results are not cached.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so that a follower giving up does not cancel the work for the others
+            return await asyncio.shield(future)
+
+        self.leaders += 1
+        future = asyncio.ensure_future(fn())
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+class AdmissionControl:
+    """
+    Bounds the requests running at once. Up to `max_queue` requests wait for a slot, for at most `queue_timeout`
+    seconds; beyond that they are rejected with `Overloaded`, carrying a Retry-After estimated from the queue length
+    and the recent service time.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, queue_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Exponentially weighted average of the service time, seeded with one second
+        self.service_time = 1.0
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.waiting + 1) * self.service_time / self.max_concurrency))
+
+    async def run(self, fn: Callable[[], Awaitable]):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.retry_after()) from None
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            return await fn()
+        finally:
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.perf_counter() - start)
+            self.running -= 1
+            self._semaphore.release()
+
+
+class AnswerRequest(BaseModel):
+    title: str
+    content_text: str = ""
+    uid: str = None
+
+
+class RetrieveRequest(BaseModel):
+    question: str
+    k: int = Field(default=4, gt=0)
+
+
+def create_app(
+    orchestrator: AnswerOrchestrator,
+    max_concurrency: int = None,
+    max_queue: int = None,
+    queue_timeout: float = None,
+    coalesce: bool = True,
+) -> FastAPI:
+    """
+    HTTP service in front of an `AnswerOrchestrator`, whose clients are created once and shared by every request.
+
+    Endpoints:
+        POST /answer    {"title", "content_text", "uid"} -> reply with answer, documents and video
+        POST /retrieve  {"question", "k"} -> documents
+        GET  /video?q=  -> lecture video and start time
+        GET  /health    -> load and coalescing counters
+
+    Identical in-flight requests (same normalized question) share one pipeline run. Pipeline runs are bounded by
+    `AdmissionControl`, and requests over its limits get a 503 with Retry-After.
+
+    Args:
+        orchestrator (AnswerOrchestrator): Runs retrieval, generation and video lookup. Closed on shutdown.
+        max_concurrency (int): Pipeline runs at once. Defaults to `SERVICE_MAX_CONCURRENCY`.
+        max_queue (int): Runs waiting for a slot. Defaults to `SERVICE_MAX_QUEUE`.
+        queue_timeout (float): Seconds a run may wait for a slot. Defaults to `SERVICE_QUEUE_TIMEOUT`.
+        coalesce (bool): Share runs between identical concurrent requests.
+    """
+    config = ServiceConfig()
+    limits = {
+        "max_concurrency": max_concurrency or config.SERVICE_MAX_CONCURRENCY,
+        "max_queue": config.SERVICE_MAX_QUEUE if max_queue is None else max_queue,
+        "queue_timeout": queue_timeout or config.SERVICE_QUEUE_TIMEOUT,
+    }
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Created on the server's event loop
+        app.state.admission = AdmissionControl(**limits)
+        app.state.flights = SingleFlight()
+        yield
+        orchestrator.close()
+
+    app = FastAPI(title="Virtual TA", lifespan=lifespan)
+
+    async def run(key: str, fn: Callable[[], Awaitable]):
+        # Coalescing happens before admission, so requests joining a run in flight never take a slot or get a 503
+        def admitted():
+            return app.state.admission.run(fn)
+
+        if not coalesce:
+            return await admitted()
+        return await app.state.flights.do(key, admitted)
+
+    def encode(result: dict) -> dict:
+        # Retrieved documents come straight from MongoDB, with ObjectId values FastAPI cannot serialize
+        return jsonable_encoder(result, custom_encoder={ObjectId: str})
+
+    @app.exception_handler(Overloaded)
+    async def overloaded(request: Request, error: Overloaded):
+        return JSONResponse(
+            status_code=503, content={"detail": str(error)}, headers={"Retry-After": str(error.retry_after)}
+        )
+
+    @app.post("/answer")
+    async def answer(body: AnswerRequest):
+        post = {"uid": body.uid, "title": body.title, "content_text": body.content_text}
+        return encode(
+            await run(request_key("answer", body.title, body.content_text), lambda: orchestrator.answer(post))
+        )
+
+    @app.post("/retrieve")
+    async def retrieve(body: RetrieveRequest):
+        post = {"title": body.question, "content_text": ""}
+        result = await run(request_key("retrieve", body.question), lambda: orchestrator.documents(post))
+        return encode(dict(result, documents=(result["documents"] or [])[: body.k]))
+
+    @app.get("/video")
+    async def video(q: str):
+        return await run(request_key("video", q), lambda: orchestrator.video(q))
+
+    @app.get("/health")
+    async def health():
+        admission, flights = app.state.admission, app.state.flights
+        return {
+            "running": admission.running,
+            "waiting": admission.waiting,
+            "rejected": admission.rejected,
+            "service_time": admission.service_time,
+            "leaders": flights.leaders,
+            "coalesced": flights.coalesced,
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import os
+
+    import uvicorn
+    from images import PostImagePipeline
+    from lecture_index import LectureWarmup
+    from orchestrator import gemini_generate, knowledge_base_retriever
+    from settings import APIKeys, Path
+    from youtube import RelatedYouTubeVideos
+
+    api_key = APIKeys()
+    youtube_api = RelatedYouTubeVideos(
+        api_key=api_key.YOUTUBE_API_KEY,
+        sa_credentials_file=os.path.join(Path.secrets_dir, api_key.GCLOUD_SERVICE_ACCOUNT_KEY_PATH),
+    )
+
+    # Clients built once and shared by every request
+    service_config = ServiceConfig()
+    retriever = knowledge_base_retriever()
+    orchestrator = AnswerOrchestrator(
+        retrieve=retriever.retrieve,
+        generate=gemini_generate(credentials=youtube_api.credentials),
+        lectures=LectureWarmup(youtube_api),
+        images=PostImagePipeline(),
+    )
+    uvicorn.run(create_app(orchestrator), host=service_config.SERVICE_HOST, port=service_config.SERVICE_PORT)
+    retriever.close()
@@ -0,0 +1,153 @@
+from typing import Callable, List
+
+
+def approx_token_count(text: str) -> int:
+    """
+    Cheap token estimate of roughly four characters per token, close enough for budgeting Gemini prompts.
+    """
+    return (len(text) + 3) // 4
+
+
+class ConversationThreadBuilder:
+    """
+    Builds the conversation text of a parsed Piazza post in a single pass and, when a token budget is set, truncates
+    it by priority:
+
+    1. title and content of the question
+    2. the instructor answer
+    3. the student answer
+    4. follow-ups with their feedback, newest first
+
+    The question and instructor answer are always kept. Follow-ups that do not fit are dropped from the oldest end
+    and replaced by a single marker line, whose tokens count against the budget; the kept ones stay in chronological
+    order.
+
+    Without a budget, every segment is kept.
+    """
+
+    def __init__(self, max_tokens: int = None, token_counter: Callable[[str], int] = approx_token_count):
+        """
+        Args:
+            max_tokens (int): Token budget of the conversation text. None disables truncation.
+            token_counter (Callable): Function returning the number of tokens of a string.
+        """
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter
+
+    @staticmethod
+    def _followup_text(followup: dict) -> str:
+        if not followup["feedback"]:
+            return f"Follow-up: {followup['subject']}\n"
+        feedback = "".join([f"- {feedback}\n" for feedback in followup["feedback"]])
+        return f"Follow-up: {followup['subject']}\nFeedback:\n{feedback}"
+
+    def _segment(self, kind: str, text: str, **extra) -> dict:
+        return {"kind": kind, "text": text, "tokens": self.token_counter(text), **extra}
+
+    def _followup_segment(self, index: int, followup: dict) -> dict:
+        return self._segment("followup", self._followup_text(followup), index=index, fid=followup.get("fid"))
+
+    def _head_segments(self, data: dict, include_followup: bool) -> List[dict]:
+        answers = data["answers"]
+        segments = [
+            self._segment("question", f"Title: {data['title']}\nContent: {data['content_text']}\n\n"),
+            self._segment("header", "Initial Answers:\n"),
+        ]
+        if answers["i_answer"]["text"]:
+            segments.append(self._segment("i_answer", f"Instructor Answer: {answers['i_answer']['text']}\n"))
+        if answers["s_answer"]["text"]:
+            segments.append(self._segment("s_answer", f"Student Answer: {answers['s_answer']['text']}\n"))
+        segments.append(self._segment("header", "\n"))
+        if include_followup:
+            segments.append(self._segment("header", "Follow-ups and Feedback:\n"))
+        return segments
+
+    def build_segments(self, data: dict, include_followup: bool = True) -> List[dict]:
+        """
+        Splits a parsed post into ordered segments, each a dict with "kind", "text", "tokens" and, for follow-ups,
+        "index" and "fid". Truncation is applied when a token budget is set.
+
+        Args:
+            data (dict): The parsed post data from `PiazzaBot.parse_post_data`.
+            include_followup (bool): Whether to include follow-up segments.
+
+        Returns:
+            list: The kept segments, in output order.
+        """
+        segments = self._head_segments(data, include_followup)
+        followups = data["answers"]["followup"] if include_followup else []
+
+        if self.max_tokens is None:
+            segments.extend(self._followup_segment(index, followup) for index, followup in enumerate(followups))
+            return segments
+
+        budget = self.max_tokens - sum(s["tokens"] for s in segments if s["kind"] != "s_answer")
+        student = [s for s in segments if s["kind"] == "s_answer"]
+        if student and student[0]["tokens"] > budget:
+            segments.remove(student[0])
+        elif student:
+            budget -= student[0]["tokens"]
+
+        # Walk follow-ups newest first and stop at the first one that does not fit, so older follow-ups are never
+        # rendered and the kept ones stay contiguous
+        kept = []
+        for index in range(len(followups) - 1, -1, -1):
+            segment = self._followup_segment(index, followups[index])
+            if segment["tokens"] > budget:
+                break
+            budget -= segment["tokens"]
+            kept.append(segment)
+
+        # The marker needs room too: give up the oldest kept follow-ups until it fits, or leave it out when even
+        # dropping every follow-up is not enough
+        while len(kept) < len(followups):
+            omitted = len(followups) - len(kept)
+            marker = self._segment("omitted", f"[{omitted} earlier follow-up(s) omitted]\n", count=omitted)
+            if marker["tokens"] <= budget:
+                segments.append(marker)
+                break
+            if not kept:
+                break
+            budget += kept.pop()["tokens"]
+        segments.extend(reversed(kept))
+        return segments
+
+    def render(self, data: dict, include_followup: bool = True) -> str:
+        """
+        The full conversation text of a parsed post, without budget or segments.
+        """
+        answers = data["answers"]
+        parts = [f"Title: {data['title']}\nContent: {data['content_text']}\n\nInitial Answers:\n"]
+        if answers["i_answer"]["text"]:
+            parts.append(f"Instructor Answer: {answers['i_answer']['text']}\n")
+        if answers["s_answer"]["text"]:
+            parts.append(f"Student Answer: {answers['s_answer']['text']}\n")
+        parts.append("\n")
+        if include_followup:
+            parts.append("Follow-ups and Feedback:\n")
+            parts.extend(map(self._followup_text, answers["followup"]))
+        return "".join(parts)
+
+    def build(self, data: dict, include_followup: bool = True) -> dict:
+        """
+        Creates the conversation thread of a parsed post.
+
+        Args:
+            data (dict): The parsed post data from `PiazzaBot.parse_post_data`.
+            include_followup (bool): Whether to include follow-up data in the conversation thread.
+
+        Returns:
+            dict: The thread with "uid", "conversation", the kept "segments", their total "tokens" and whether
+            anything was "truncated".
+        """
+        segments = self.build_segments(data, include_followup=include_followup)
+        followups = len(data["answers"]["followup"]) if include_followup else 0
+        kept_followups = sum(1 for s in segments if s["kind"] == "followup")
+        dropped_student = data["answers"]["s_answer"]["text"] and not any(s["kind"] == "s_answer" for s in segments)
+        return {
+            "uid": data["uid"],
+            "conversation": "".join([segment["text"] for segment in segments]),
+            "segments": segments,
+            "tokens": sum(segment["tokens"] for segment in segments),
+            "truncated": bool(kept_followups < followups or dropped_student),
+        }
@@ -0,0 +1,210 @@
+import bisect
+import struct
+from typing import Iterator, List, NamedTuple
+
+import numpy as np
+
+MAGIC = b"VTTR"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIQ")
+
+
+class Segment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+class Transcript:
+    """
+    Compact, read-only transcript of a video.
+
+    Times are kept in two parallel float32 arrays and the caption texts in one joined string addressed by an offsets
+    array, instead of one Python string or dict per caption. A multi-hour lecture takes a few hundred kilobytes,
+    looking up the caption at a time is a binary search, and the whole structure round-trips through a small binary
+    file.
+    """
+
+    __slots__ = ("starts", "ends", "offsets", "buffer")
+
+    def __init__(self, starts, ends, offsets, buffer: str):
+        """
+        Args:
+            starts: Start time of each caption in seconds, sorted.
+            ends: End time of each caption in seconds.
+            offsets: n + 1 character offsets of the captions into `buffer`.
+            buffer (str): The caption texts joined without separators.
+        """
+        self.starts = np.asarray(starts, dtype=np.float32)
+        self.ends = np.asarray(ends, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.buffer = buffer
+
+    @classmethod
+    def from_captions(cls, captions: List[dict]) -> "Transcript":
+        """
+        Builds a transcript from the caption dicts of `YouTubeTranscriptApi.get_transcript` ("start", "duration",
+        "text"), or dicts with "start", "end" and "text".
+        """
+        captions = sorted(captions, key=lambda caption: caption["start"])
+        texts = [(caption["text"] or "").replace("\n", " ") for caption in captions]
+        starts = [caption["start"] for caption in captions]
+        ends = [caption["end"] if "end" in caption else caption["start"] + caption["duration"] for caption in captions]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        return cls(starts, ends, offsets, "".join(texts))
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> "Transcript":
+        """
+        Builds a transcript from "start - end: text" lines, the format `download_and_parse_captions` used to return.
+        """
+        captions = []
+        for line in lines:
+            times, _, text = line.partition(": ")
+            start, _, end = times.partition(" - ")
+            captions.append({"start": float(start), "end": float(end), "text": text})
+        return cls.from_captions(captions)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def text(self, i: int) -> str:
+        return self.buffer[self.offsets[i] : self.offsets[i + 1]]
+
+    def __getitem__(self, i: int) -> Segment:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Segment(float(self.starts[i]), float(self.ends[i]), self.text(i))
+
+    def __iter__(self) -> Iterator[Segment]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def duration(self) -> float:
+        return float(self.ends.max()) if len(self) else 0.0
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the arrays and the text buffer.
+        """
+        # Compact str objects store 1, 2 or 4 bytes per character
+        char_size = 1 if self.buffer.isascii() else 4
+        return self.starts.nbytes + self.ends.nbytes + self.offsets.nbytes + len(self.buffer) * char_size
+
+    def index_at(self, seconds: float) -> int:
+        """
+        Returns the index of the last caption starting at or before `seconds`, -1 before the first caption.
+        """
+        # bisect on the array beats np.searchsorted for a single value, which pays for a scalar conversion
+        return bisect.bisect_right(self.starts, seconds) - 1
+
+    def segment_at(self, seconds: float):
+        """
+        Returns the caption being spoken at `seconds`, or None when it falls in a gap or outside the video.
+        """
+        i = self.index_at(seconds)
+        if i < 0 or seconds >= self.ends[i]:
+            return None
+        return self[i]
+
+    def between(self, start: float, end: float) -> "Transcript":
+        """
+        Returns the captions starting in [start, end), sharing the text buffer of this transcript.
+        """
+        first = int(np.searchsorted(self.starts, start, side="left"))
+        last = max(first, int(np.searchsorted(self.starts, end, side="left")))
+        return Transcript(self.starts[first:last], self.ends[first:last], self.offsets[first : last + 1], self.buffer)
+
+    def window_bounds(self, window_seconds: float = 30.0, stride_seconds: float = 15.0) -> np.ndarray:
+        """
+        Returns (first, last) caption index pairs of windows of `window_seconds` starting every `stride_seconds`.
+        Empty windows are skipped.
+        """
+        if not len(self):
+            return np.empty((0, 2), dtype=np.int64)
+        window_starts = np.arange(float(self.starts[0]), float(self.starts[-1]) + stride_seconds, stride_seconds)
+        firsts = np.searchsorted(self.starts, window_starts, side="left")
+        lasts = np.searchsorted(self.starts, window_starts + window_seconds, side="left")
+        bounds = np.stack([firsts, lasts], axis=1)
+        bounds = bounds[bounds[:, 0] < bounds[:, 1]]
+        # Consecutive windows inside a long gap select the same captions
+        keep = np.ones(len(bounds), dtype=bool)
+        keep[1:] = np.any(bounds[1:] != bounds[:-1], axis=1)
+        return bounds[keep]
+
+    def windows(self, window_seconds: float = 30.0, stride_seconds: float = 15.0) -> Iterator[Segment]:
+        """
+        Iterates over overlapping windows of captions, each as one segment with the joined caption texts.
+        """
+        for first, last in self.window_bounds(window_seconds, stride_seconds):
+            texts = [self.text(i) for i in range(first, last)]
+            yield Segment(float(self.starts[first]), float(self.ends[first:last].max()), " ".join(texts))
+
+    def to_lines(self) -> List[str]:
+        """
+        Returns "start - end: text" lines.
+        """
+        return [f"{round(segment.start, 2)} - {round(segment.end, 2)}: {segment.text}" for segment in self]
+
+    def to_prompt(self, max_chars: int = None) -> str:
+        """
+        Renders the transcript for an LLM prompt as "<start seconds>: text" lines, dropping end times to save tokens.
+        """
+        lines, size = [], 0
+        for segment in self:
+            line = f"{int(segment.start)}: {segment.text}"
+            size += len(line) + 1
+            if max_chars is not None and size > max_chars:
+                break
+            lines.append(line)
+        return "\n".join(lines)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the transcript: a header, the float32 start and end arrays, the int32 offsets and the UTF-8 text.
+
+        Offsets are character offsets, so the buffer is decoded as a whole on load.
+        """
+        text = self.buffer.encode("utf-8")
+        header = HEADER.pack(MAGIC, VERSION, len(self), len(text))
+        return b"".join(
+            [
+                header,
+                self.starts.astype("<f4").tobytes(),
+                self.ends.astype("<f4").tobytes(),
+                self.offsets.astype("<i4").tobytes(),
+                text,
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Transcript":
+        magic, version, n, text_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} transcript file")
+        position = HEADER.size
+        starts = np.frombuffer(data, dtype="<f4", count=n, offset=position)
+        position += 4 * n
+        ends = np.frombuffer(data, dtype="<f4", count=n, offset=position)
+        position += 4 * n
+        offsets = np.frombuffer(data, dtype="<i4", count=n + 1, offset=position)
+        position += 4 * (n + 1)
+        buffer = data[position : position + text_size].decode("utf-8")
+        return cls(starts, ends, offsets, buffer)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "Transcript":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def __repr__(self) -> str:
+        return f"Transcript({len(self)} captions, {self.duration:.0f}s, {self.nbytes} bytes)"
@@ -0,0 +1,374 @@
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List
+
+from pydantic import BaseModel, Field
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+READY = "ready"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    network_id TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    priority REAL NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    first_leased_at REAL,
+    done_at REAL,
+    last_error TEXT,
+    payload TEXT,
+    PRIMARY KEY (network_id, post_id)
+);
+CREATE INDEX IF NOT EXISTS work_items_ready ON work_items (state, priority DESC, enqueued_at);
+"""
+
+
+class PriorityWeights(BaseModel):
+    # Points per hour the post has been waiting, capped at `max_age_hours`
+    age_per_hour: float = 1.0
+    max_age_hours: float = 72.0
+    # Points when the post is flagged or asked by an instructor
+    instructor_flag: float = 24.0
+    # Points per unresolved follow-up on the post
+    followup: float = 6.0
+
+
+class WorkItem(BaseModel):
+    network_id: str
+    post_id: str
+    priority: float
+    attempts: int
+    enqueued_at: float
+    payload: dict = Field(default_factory=dict)
+    # Identifies the lease: acks and nacks only apply while the item is still leased until this time
+    lease_until: float = None
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Converts a Piazza ISO timestamp (e.g. "2024-04-01T17:03:22Z") to epoch seconds.
+    """
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def compute_priority(feed_item: dict, weights: PriorityWeights = None, now: float = None) -> float:
+    """
+    Scores a `network.filter_feed` entry, higher is more urgent.
+
+    Args:
+        feed_item (dict): The feed entry of the post.
+        weights (PriorityWeights): Weights of the age, instructor-flag and follow-up signals.
+        now (float): Current epoch time.
+
+    Returns:
+        float: The priority score.
+    """
+    weights = weights or PriorityWeights()
+    now = time.time() if now is None else now
+
+    score = 0.0
+    created = feed_item.get("created")
+    if created:
+        age_hours = max(0.0, (now - parse_timestamp(created)) / 3600)
+        score += weights.age_per_hour * min(age_hours, weights.max_age_hours)
+
+    tags = feed_item.get("tags") or []
+    if any(tag.startswith("instructor") for tag in tags) or feed_item.get("is_bookmarked"):
+        score += weights.instructor_flag
+
+    score += weights.followup * (feed_item.get("no_answer_followup") or 0)
+    return score
+
+
+class PostWorkQueue:
+    """
+    Persistent SQLite-backed priority queue between post discovery and answer generation.
+
+    Items are leased rather than popped: a lease that is neither acked nor nacked before `visibility_timeout` expires
+    makes the item available again, so every post is processed at least once even if a worker dies. Items that fail
+    `max_attempts` times, or whose last of `max_attempts` leases expired, are moved to the dead-letter state and kept
+    for inspection. Acks and nacks of a worker whose lease expired are ignored, the item belongs to its new lease.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = 5,
+        visibility_timeout: float = 300.0,
+        retry_backoff: float = 30.0,
+        weights: PriorityWeights = None,
+    ):
+        """
+        Args:
+            path (str): Path of the SQLite database file, ":memory:" for a throwaway queue.
+            max_attempts (int): Attempts before an item is dead-lettered.
+            visibility_timeout (float): Seconds a leased item stays invisible to other workers.
+            retry_backoff (float): Base delay in seconds before a failed item is retried, doubled per attempt.
+            weights (PriorityWeights): Weights used by `compute_priority`.
+        """
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.retry_backoff = retry_backoff
+        self.weights = weights or PriorityWeights()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def put(self, network_id: str, feed_item: dict) -> bool:
+        """
+        Adds a post from the feed or refreshes the priority of a queued one. Completed and dead posts are ignored.
+
+        Returns:
+            bool: Whether the post was newly added.
+        """
+        now = time.time()
+        post_id = str(feed_item["nr"])
+        priority = compute_priority(feed_item, self.weights, now)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM work_items WHERE network_id = ? AND post_id = ?", (network_id, post_id)
+            ).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO work_items (network_id, post_id, priority, state, enqueued_at, available_at, payload)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (network_id, post_id, priority, READY, now, now, json.dumps(feed_item)),
+                )
+                return True
+            if row[0] == READY:
+                self._conn.execute(
+                    "UPDATE work_items SET priority = ?, payload = ? WHERE network_id = ? AND post_id = ?",
+                    (priority, json.dumps(feed_item), network_id, post_id),
+                )
+            return False
+
+    def put_many(self, network_id: str, feed: List[dict]) -> int:
+        """
+        Adds every post of a feed.
+
+        Returns:
+            int: The number of newly added posts.
+        """
+        return sum(self.put(network_id, item) for item in feed)
+
+    def lease(self, limit: int = 1) -> List[WorkItem]:
+        """
+        Leases up to `limit` of the highest-priority available items. Items whose lease expired on their last attempt,
+        e.g. because the post kills the worker, are dead-lettered instead.
+        """
+        now = time.time()
+        lease_until = now + self.visibility_timeout
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._conn.execute(
+                    "SELECT network_id, post_id FROM work_items WHERE state = ? AND lease_until <= ? AND attempts >= ?",
+                    (LEASED, now, self.max_attempts),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE work_items SET state = ?, done_at = ?, lease_until = NULL,"
+                    " last_error = COALESCE(last_error, 'lease expired') WHERE network_id = ? AND post_id = ?",
+                    [(DEAD, now, network_id, post_id) for network_id, post_id in expired],
+                )
+                rows = self._conn.execute(
+                    "SELECT network_id, post_id, priority, attempts, enqueued_at, payload FROM work_items"
+                    " WHERE (state = ? AND available_at <= ?) OR (state = ? AND lease_until <= ?)"
+                    " ORDER BY priority DESC, enqueued_at LIMIT ?",
+                    (READY, now, LEASED, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE work_items SET state = ?, attempts = attempts + 1, lease_until = ?,"
+                    " first_leased_at = COALESCE(first_leased_at, ?) WHERE network_id = ? AND post_id = ?",
+                    [(LEASED, lease_until, now, row[0], row[1]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        for network_id, post_id in expired:
+            logger.warning("Dead-lettering post %s of %s: lease expired on its last attempt", post_id, network_id)
+        return [
+            WorkItem(
+                network_id=row[0],
+                post_id=row[1],
+                priority=row[2],
+                attempts=row[3] + 1,
+                enqueued_at=row[4],
+                payload=json.loads(row[5] or "{}"),
+                lease_until=lease_until,
+            )
+            for row in rows
+        ]
+
+    def _release(self, item: WorkItem, assignments: str, params: tuple) -> bool:
+        # Only the current lease may settle the item
+        cursor = self._conn.execute(
+            f"UPDATE work_items SET {assignments}, lease_until = NULL"
+            " WHERE network_id = ? AND post_id = ? AND state = ? AND lease_until = ?",
+            (*params, item.network_id, item.post_id, LEASED, item.lease_until),
+        )
+        if cursor.rowcount == 0:
+            logger.warning("Lease of post %s of %s was lost, ignoring its outcome", item.post_id, item.network_id)
+            return False
+        return True
+
+    def ack(self, item: WorkItem) -> bool:
+        """
+        Marks a leased item as processed.
+
+        Returns:
+            bool: False when the lease had expired and the item was leased again or dead-lettered meanwhile.
+        """
+        with self._lock:
+            return self._release(item, "state = ?, done_at = ?", (DONE, time.time()))
+
+    def nack(self, item: WorkItem, error: str = None) -> bool:
+        """
+        Returns a failed item to the queue with exponential backoff, or dead-letters it after `max_attempts`.
+
+        Returns:
+            bool: False when the lease had expired and the item was leased again or dead-lettered meanwhile.
+        """
+        now = time.time()
+        with self._lock:
+            if item.attempts >= self.max_attempts:
+                released = self._release(item, "state = ?, done_at = ?, last_error = ?", (DEAD, now, error))
+                if released:
+                    logger.warning("Dead-lettering post %s of %s: %s", item.post_id, item.network_id, error)
+                return released
+            delay = self.retry_backoff * 2 ** (item.attempts - 1)
+            return self._release(item, "state = ?, available_at = ?, last_error = ?", (READY, now + delay, error))
+
+    def dead_letters(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT network_id, post_id, attempts, last_error FROM work_items WHERE state = ?", (DEAD,)
+            ).fetchall()
+        return [{"network_id": r[0], "post_id": r[1], "attempts": r[2], "last_error": r[3]} for r in rows]
+
+    def requeue_dead(self, network_id: str, post_id: str):
+        """
+        Moves a dead-lettered item back to the queue with a fresh attempt budget.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE work_items SET state = ?, attempts = 0, available_at = ?, last_error = NULL"
+                " WHERE network_id = ? AND post_id = ? AND state = ?",
+                (READY, time.time(), network_id, str(post_id), DEAD),
+            )
+
+    def stats(self, window: float = 600.0) -> dict:
+        """
+        Reports queue depth per state, queue latency (enqueue to first lease) and drain rate.
+
+        Args:
+            window (float): Seconds of history used for latency percentiles and drain rate.
+        """
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM work_items GROUP BY state").fetchall())
+            latencies = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT first_leased_at - enqueued_at FROM work_items WHERE first_leased_at >= ? ORDER BY 1",
+                    (now - window,),
+                )
+            ]
+            drained, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(first_leased_at) FROM work_items WHERE state = ? AND done_at >= ?",
+                (DONE, now - window),
+            ).fetchone()
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "depth": {state: counts.get(state, 0) for state in (READY, LEASED, DONE, DEAD)},
+            "queue_latency_p50": percentile(0.5),
+            "queue_latency_p95": percentile(0.95),
+            # Rate over the active part of the window, so a short burst is not diluted by idle time before it
+            "drain_rate_per_min": drained / max(1.0, min(window, now - (oldest or now))) * 60,
+        }
+
+    def drain(self, handler: Callable[[WorkItem], None], concurrency: int = 4, batch_size: int = None) -> int:
+        """
+        Processes available items with at most `concurrency` handlers running at once, until nothing is available.
+
+        Args:
+            handler (Callable): Called with each leased item. Raising nacks the item, returning acks it.
+            concurrency (int): Maximum number of concurrent handlers.
+            batch_size (int): Items leased per round, defaults to `concurrency`.
+
+        Returns:
+            int: The number of items processed successfully.
+        """
+        batch_size = batch_size or concurrency
+        succeeded = 0
+
+        def run(item: WorkItem) -> bool:
+            try:
+                handler(item)
+            except Exception as e:
+                logger.error("Handling post %s of %s failed: %s", item.post_id, item.network_id, e)
+                self.nack(item, error=str(e))
+                return False
+            return self.ack(item)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="work-queue") as executor:
+            while True:
+                items = self.lease(limit=batch_size)
+                if not items:
+                    return succeeded
+                succeeded += sum(executor.map(run, items))
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    from fake_piazza import FakePiazza, make_child, make_post
+    from piazza import PiazzaBot
+    from rich.pretty import pretty_repr
+
+    # Demo against the local fake backend
+    fake = FakePiazza()
+    fake.add_post("demo", make_post(1, "Old question", "<p>Is the quiz open book?</p>", created="2024-04-01T00:00:00Z"))
+    fake.add_post("demo", make_post(2, "Urgent", "<p>HW2 link is broken</p>", tags=["instructor-question"]))
+    fake.add_post(
+        "demo",
+        make_post(3, "Busy thread", "<p>Gradient sign?</p>", children=[make_child("followup", subject="Still stuck")]),
+    )
+    fake.add_post("demo", make_post(4, "Flaky", "<p>This one always fails</p>"))
+
+    work_queue = PostWorkQueue(":memory:", max_attempts=2, retry_backoff=0)
+    bot = PiazzaBot(network_id="demo", piazza=fake)
+    bot.enqueue_unattended_posts(work_queue)
+
+    def handle(item: WorkItem):
+        if item.post_id == "4":
+            raise RuntimeError("LLM timed out")
+        post, conversation = bot.process_post(post_id=item.post_id)
+        logger.info("Answering %s (priority %.1f)", post["title"], item.priority)
+
+    work_queue.drain(handle, concurrency=2)
+    logger.info(pretty_repr(work_queue.stats()))
+    logger.info(pretty_repr(work_queue.dead_letters()))
@@ -2,14 +2,11 @@ import os
 import xml.etree.ElementTree as ET
 
 import requests
-from google.auth.transport.requests import Request
-from google.oauth2.service_account import Credentials
 from jinja2 import Template
-from langchain_core.prompts import PromptTemplate
-from langchain_google_vertexai import ChatVertexAI
-from rich.pretty import pretty_repr
+from quota import YOUTUBE_COSTS, QuotaExhausted, get_coordinator, retry_after
+from recorder import recorded
 from settings import APIKeys, Path, get_logger
-from youtube_transcript_api import YouTubeTranscriptApi
+from transcript import Transcript
 
 logger = get_logger(__name__)
 
@@ -26,11 +23,28 @@ class Endpoints:
         The URL endpoint for the YouTube search API.
     CAPTIONS : str
         The URL endpoint for the YouTube captions API.
+    PLAYLIST_ITEMS : str
+        The URL endpoint for the YouTube playlist items API.
+    CHANNELS : str
+        The URL endpoint for the YouTube channels API.
     """
 
     BASE_URL = "https://www.googleapis.com/youtube/v3"
     SEARCH = f"{BASE_URL}/search"
     CAPTIONS = f"{BASE_URL}/captions"
+    PLAYLIST_ITEMS = f"{BASE_URL}/playlistItems"
+    CHANNELS = f"{BASE_URL}/channels"
+
+
+class FailedResponse(Exception):
+    """
+    Carries a non-200 response out of a recorded request, so that the recorder handles it as an error: only stored
+    in "record" mode, never frozen by "auto" mode.
+    """
+
+    def __init__(self, response):
+        super().__init__(response)
+        self.response = response
 
 
 class RelatedYouTubeVideos:
@@ -60,6 +74,12 @@ class RelatedYouTubeVideos:
     get_top_videos(query, max_results=3):
         Fetches the top videos related to a given query.
 
+    get_playlist_videos(playlist_id, max_results=200):
+        Lists the videos of a playlist.
+
+    get_channel_videos(channel_id, max_results=200):
+        Lists the uploads of a channel.
+
     get_captions(video_id):
         Fetches caption metadata for a given video ID.
 
@@ -74,6 +94,7 @@ class RelatedYouTubeVideos:
         self,
         api_key: str,
         sa_credentials_file: str = None,
+        quota=None,
     ):
         """
         Initializes the RelatedYouTubeVideos class with the provided API key.
@@ -82,10 +103,18 @@ class RelatedYouTubeVideos:
         ----------
         api_key : str
             The API key to authenticate requests to the YouTube Data API.
+        sa_credentials_file : str, optional
+            Service account key file, needed for OAuth requests and Gemini calls.
+        quota : QuotaCoordinator, optional
+            Shared quota the Data API requests draw from, in quota units (default is the process coordinator,
+            False for no limit).
         """
         self.api_key = api_key
+        self.quota = (get_coordinator() if quota is None else quota) or None
 
         if sa_credentials_file:
+            from google.oauth2.service_account import Credentials
+
             self.credentials = Credentials.from_service_account_file(
                 sa_credentials_file,
                 scopes=[
@@ -100,6 +129,8 @@ class RelatedYouTubeVideos:
         """
         Refreshes and retrieves the access token.
         """
+        from google.auth.transport.requests import Request
+
         if not self.credentials.valid:
             self.credentials.refresh(Request())
         self.token = self.credentials.token
@@ -123,13 +154,56 @@ class RelatedYouTubeVideos:
             The JSON response as a dictionary if the request is successful (status code 200),
             or None if the request fails.
         """
-        response = requests.get(url, params=params, headers=headers)
+        try:
+            response = self._get(url, params=params, headers=headers)
+        except QuotaExhausted as e:
+            logger.error("An error occurred: %s", e)
+            return None
         if response.status_code == 200:
             return response.json()
         else:
             logger.error("An error occurred: %s %s", response.status_code, response.text)
             return None
 
+    def _get(self, url: str, params: dict = None, headers: dict = None, max_retries: int = 3):
+        """
+        GET request drawing from the shared "youtube" quota, retried when the API reports a rate limit. Raises
+        `QuotaExhausted` once the daily quota is spent.
+        """
+        try:
+            return recorded(
+                f"youtube:{url}", self._get_live, url, params=params, headers=headers, max_retries=max_retries
+            )
+        except FailedResponse as e:
+            return e.response
+
+    def _get_live(self, url: str, params: dict = None, headers: dict = None, max_retries: int = 3):
+        if self.quota is None:
+            response = requests.get(url, params=params, headers=headers)
+        else:
+            response = self._get_within_quota(url, params=params, headers=headers, max_retries=max_retries)
+        if response.status_code != 200:
+            raise FailedResponse(response)
+        return response
+
+    def _get_within_quota(self, url: str, params: dict = None, headers: dict = None, max_retries: int = 3):
+        cost = YOUTUBE_COSTS.get(url.rsplit("/", 1)[-1], 1)
+        for attempt in range(max_retries + 1):
+            self.quota.acquire("youtube", cost)
+            response = requests.get(url, params=params, headers=headers)
+            if response.status_code == 403 and "quotaExceeded" in response.text:
+                # The daily quota is spent: no retry gets through before it resets
+                self.quota.report_exhausted("youtube")
+                return response
+            limited = response.status_code == 429 or (
+                response.status_code == 403 and "rateLimitExceeded" in response.text
+            )
+            if not limited:
+                self.quota.report_success("youtube")
+                return response
+            self.quota.report_throttled("youtube", retry_after(response) or 2**attempt)
+        return response
+
     def make_oauth_request(self, url, params=None, headers=None):
         """
         Makes an HTTP GET request to the specified URL with the given parameters and optional headers.
@@ -155,7 +229,11 @@ class RelatedYouTubeVideos:
         headers = headers or {}
         headers["Authorization"] = f"Bearer {self.token}"
 
-        response = requests.get(url, params=params, headers=headers)
+        try:
+            response = self._get(url, params=params, headers=headers)
+        except QuotaExhausted as e:
+            logger.error("An error occurred: %s", e)
+            return None
 
         if response.status_code == 200:
             return response
@@ -208,6 +286,73 @@ class RelatedYouTubeVideos:
         else:
             return None
 
+    def get_playlist_videos(self, playlist_id: str, max_results: int = 200):
+        """
+        Lists the videos of a playlist, following result pages.
+
+        Parameters
+        ----------
+        playlist_id : str
+            The ID of the playlist, e.g. a course lecture playlist.
+        max_results : int, optional
+            The maximum number of videos to return (default is 200).
+
+        Returns
+        -------
+        list of dict or None
+            Video information in the format of `get_top_videos`, or None if the first request fails.
+        """
+        params = {"part": "snippet", "playlistId": playlist_id, "maxResults": 50, "key": self.api_key}
+        videos = []
+        while len(videos) < max_results:
+            data = self.make_request(Endpoints.PLAYLIST_ITEMS, params)
+            if not data:
+                return videos or None
+
+            for item in data["items"]:
+                snippet = item["snippet"]
+                video_id = snippet["resourceId"]["videoId"]
+                videos.append(
+                    {
+                        "title": snippet["title"],
+                        "description": snippet["description"],
+                        "channelTitle": snippet.get("videoOwnerChannelTitle", snippet["channelTitle"]),
+                        "publishTime": snippet["publishedAt"],
+                        "videoId": video_id,
+                        "link": f"https://www.youtube.com/watch?v={video_id}",
+                    }
+                )
+
+            if "nextPageToken" not in data:
+                break
+            params["pageToken"] = data["nextPageToken"]
+        return videos[:max_results]
+
+    def get_channel_videos(self, channel_id: str, max_results: int = 200):
+        """
+        Lists the uploads of a channel through its uploads playlist.
+
+        Parameters
+        ----------
+        channel_id : str
+            The ID of the channel.
+        max_results : int, optional
+            The maximum number of videos to return (default is 200).
+
+        Returns
+        -------
+        list of dict or None
+            Video information in the format of `get_top_videos`, or None if the request fails.
+        """
+        params = {"part": "contentDetails", "id": channel_id, "key": self.api_key}
+        data = self.make_request(Endpoints.CHANNELS, params)
+        if not data or not data.get("items"):
+            logger.info(f"No channel found for {channel_id}")
+            return None
+
+        uploads = data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+        return self.get_playlist_videos(uploads, max_results=max_results)
+
     def get_captions(self, video_id: str):
         """
         Fetches caption metadata for a given video ID.
@@ -283,7 +428,7 @@ class RelatedYouTubeVideos:
 
     def download_and_parse_captions(self, video_id: str):
         """
-        Downloads and parses captions in XML format for a given caption ID.
+        Downloads the English transcript of a video.
 
         Parameters
         ----------
@@ -292,18 +437,14 @@ class RelatedYouTubeVideos:
 
         Returns
         -------
-        list of dict or None
-            A list of dictionaries containing parsed caption data, or None if the request fails.
+        Transcript or None
+            The captions with their start and end times, or None if the video has no transcript.
         """
-        captions = YouTubeTranscriptApi.get_transcript(video_id, languages=["en"])
-        captions_text = []
+        from youtube_transcript_api import YouTubeTranscriptApi
 
+        captions = YouTubeTranscriptApi.get_transcript(video_id, languages=["en"])
         if captions:
-            for cap in captions:
-                cap["end"] = round(cap["start"] + cap["duration"], 2)
-                captions_text.append(f"{cap['start']} - {cap['end']}: {cap['text']}")
-
-            return captions_text
+            return Transcript.from_captions(captions)
         return None
 
     def hhmmss_to_seconds(self, time_str: str) -> int:
@@ -357,18 +498,22 @@ class RelatedYouTubeVideos:
         html = template.render(url=url, video=video)
         return html
 
-    def find_start_time(self, query: str, captions: str) -> int:
+    def find_start_time(self, query: str, captions, max_chars: int = 60000) -> int:
         """
         Finds the start timestamp (in seconds) where the answer to the given question can be found in the YouTube video
         captions.
 
         Args:
             query (str): The question for which the start timestamp needs to be determined.
-            captions (str): The YouTube video captions.
+            captions (Transcript | str): The YouTube video captions.
+            max_chars (int): Maximum length of the captions in the prompt.
 
         Returns:
             int: The start timestamp (in seconds) where the answer to the question can be found.
         """
+        from langchain_core.prompts import PromptTemplate
+        from langchain_google_vertexai import ChatVertexAI
+
         prompt_template = PromptTemplate(
             input_variables=["question", "captions"],
             template="""Given the following YouTube video captions and the question, determine the start timestamp
@@ -386,10 +531,20 @@ class RelatedYouTubeVideos:
         )
         chain = prompt_template | llm_text
 
-        return chain.invoke({"question": query, "captions": captions}).content
+        if isinstance(captions, Transcript):
+            captions = captions.to_prompt(max_chars=max_chars)
+
+        return recorded(
+            "vertex-gemini:find_start_time",
+            lambda question, captions: chain.invoke({"question": question, "captions": captions}).content,
+            query,
+            captions,
+        )
 
 
 if __name__ == "__main__":
+    from rich.pretty import pretty_repr
+
     api_key = APIKeys()
 
     # Initialize RelatedYouTubeVideos instance with API key